@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Compare ``Client.read`` of a GDS report with and without compression.
+
+  python benchmarks/bench_compression.py --rows 50000 --bandwidth 2000000
+
+"""
+import os
+import sys
+import time
+import argparse
+
+_PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+[sys.path.insert(0, path) for path in (_PROJECT_DIR,
+                                       os.path.join(_PROJECT_DIR, 'lib'))]
+
+from odesk import Client
+from benchmarks.stub import StubServer
+
+
+def run(server, compress, repeat):
+    client = Client('public', 'secret', 'token', 'token secret',
+                    compress=compress)
+    timings = []
+    for i in xrange(repeat):
+        start = time.time()
+        client.read(server.url())
+        timings.append(time.time() - start)
+    client.http.clear()
+    return min(timings), client.bytes_received, client.bytes_decoded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--bandwidth', type=int, default=None,
+                        help='throttle stub to bytes per second')
+    options = parser.parse_args(argv)
+
+    server = StubServer(rows=options.rows,
+                        bandwidth=options.bandwidth).start()
+    try:
+        print '{0:<10} {1:>10} {2:>14} {3:>14}'.format(
+            'mode', 'best, s', 'wire bytes', 'decoded bytes')
+        for compress in (False, True):
+            best, received, decoded = run(server, compress, options.repeat)
+            print '{0:<10} {1:>10.4f} {2:>14} {3:>14}'.format(
+                'gzip' if compress else 'identity', best,
+                received // options.repeat, decoded // options.repeat)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""Compare cold start of the headless odesk_meter with the Gtk one.
+
+Each run imports the meter in a fresh interpreter, the Gtk path also
+imports the toolkit as ``Base`` does before opening the window::
+
+  python benchmarks/bench_meter_startup.py --repeat 10
+
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+_PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODES = (
+    ('headless', 'import odesk_meter'),
+    ('gtk', 'import odesk_meter; odesk_meter.import_gtk()'),
+)
+
+
+def run(code, repeat):
+    timings = []
+    for i in xrange(repeat):
+        start = time.time()
+        process = subprocess.Popen([sys.executable, '-c', code],
+                                   cwd=_PROJECT_DIR, stderr=subprocess.PIPE)
+        _, error = process.communicate()
+        if process.returncode:
+            return None, error.strip().split('\n')[-1]
+        timings.append(time.time() - start)
+    return min(timings), None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args(argv)
+
+    print '{0:<10} {1:>10}'.format('mode', 'best, s')
+    for name, code in MODES:
+        best, error = run(code, options.repeat)
+        if best is None:
+            print '{0:<10} {1:>10}  ({2})'.format(name, 'n/a', error)
+        else:
+            print '{0:<10} {1:>10.4f}'.format(name, best)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Local stub of the oDesk API serving GDS report payloads.
+
+Used by the benchmarks to measure the client without the network::
+
+  server = StubServer(rows=10000)
+  server.start()
+  client.read(server.url('/gds/timereports/v1/companies/test'))
+  server.stop()
+
+"""
+import json
+import gzip
+import time
+import random
+import threading
+from StringIO import StringIO
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+
+def make_report(rows, seed=0):
+    """Return GDS time report table with ``rows`` rows."""
+    generator = random.Random(seed)
+    cols = [{'type': 'date', 'label': 'worked_on'},
+            {'type': 'string', 'label': 'team_id'},
+            {'type': 'string', 'label': 'team_name'},
+            {'type': 'string', 'label': 'task'},
+            {'type': 'string', 'label': 'memo'},
+            {'type': 'number', 'label': 'hours'}]
+    table_rows = []
+    for i in xrange(rows):
+        team = generator.randint(1, 20)
+        table_rows.append({'c': [
+            {'v': '201305{0:02d}'.format(i % 28 + 1)},
+            {'v': 'company:team{0}'.format(team)},
+            {'v': 'Team {0}'.format(team)},
+            {'v': 'Task {0}'.format(generator.randint(1, 200))},
+            {'v': 'Working on issue #{0}'.format(generator.randint(1, 10 ** 5))},
+            {'v': '{0:.2f}'.format(generator.random() * 8)}]})
+    return {'table': {'cols': cols, 'rows': table_rows}}
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubServer(object):
+    """Threaded HTTP server answering every GET with the same payload.
+
+    *Parameters:*
+      :rows:          Number of report rows in the payload
+
+      :latency:       (optional) Seconds to wait before answering
+
+      :bandwidth:     (optional) Bytes per second to throttle the body to
+
+    """
+
+    def __init__(self, rows=1000, latency=0, bandwidth=None, payload=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.bytes_sent = 0
+        self.body = json.dumps(payload or make_report(rows))
+        buf = StringIO()
+        f = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6)
+        f.write(self.body)
+        f.close()
+        self.gzip_body = buf.getvalue()
+        self._lock = threading.Lock()
+        self.server = _Server(('127.0.0.1', 0), self._handler())
+        self.port = self.server.server_address[1]
+        self._thread = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers are sent line by line, don't let Nagle's algorithm
+            # and delayed ACKs stall every response
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                accept = self.headers.get('Accept-Encoding', '')
+                body = stub.body
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if 'gzip' in accept:
+                    body = stub.gzip_body
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                stub._write(self.wfile, body)
+
+            do_POST = do_PUT = do_DELETE = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _write(self, wfile, body):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(body)
+        if not self.bandwidth:
+            wfile.write(body)
+            return
+        chunk = max(1, self.bandwidth // 100)
+        for offset in xrange(0, len(body), chunk):
+            wfile.write(body[offset:offset + chunk])
+            time.sleep(float(chunk) / self.bandwidth)
+
+    def url(self, path='/gds/timereports/v1/companies/test'):
+        return 'http://127.0.0.1:{0}{1}'.format(self.port, path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""Benchmarks of the client hot paths with baseline comparison.
+
+  python benchmarks/suite.py --save baseline.json
+  python benchmarks/suite.py --compare baseline.json --threshold 0.1
+
+Comparison exits with status 1 if any benchmark got slower than the
+baseline by more than the threshold.
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+_PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+[sys.path.insert(0, path) for path in (_PROJECT_DIR,
+                                       os.path.join(_PROJECT_DIR, 'lib'))]
+
+from odesk import Client
+from odesk.utils import Q, Query, Table
+from benchmarks.stub import StubServer, make_report
+
+
+BENCHMARKS = []
+
+
+def benchmark(name, quick=True):
+    """Register setup function returning the callable to measure."""
+    def decorator(setup):
+        BENCHMARKS.append((name, setup, quick))
+        return setup
+    return decorator
+
+
+def get_client():
+    return Client('public', 'secret', 'token', 'token secret')
+
+
+@benchmark('oauth_sign')
+def oauth_sign():
+    client = get_client()
+    url = 'https://www.odesk.com/api/hr/v2/users/me.json'
+    data = {'page': '0;20', 'q': 'python'}
+    return lambda: client.auth.get_oauth_params(
+        url, 'token', 'token secret', data, 'GET')
+
+
+@benchmark('query_render')
+def query_render():
+    def render():
+        # New objects each time, rendering of one query is cached
+        query = Query(select=Query.DEFAULT_TIMEREPORT_FIELDS,
+                      where=(Q('worked_on') >= '2013-05-01') &
+                            (Q('worked_on') <= '2013-05-31') &
+                            (Q('team_id') == 'company:team'),
+                      order_by=['worked_on'])
+        return str(query)
+    return render
+
+
+@benchmark('router_call')
+def router_call():
+    client = get_client()
+    # Router overhead only: url building, validation and unwrapping
+    client.read = lambda url, data=None, method='GET', fmt='json': {}
+    team = client.team_v2
+    return lambda: team.get_snapshots('company:team', online='all')
+
+
+@benchmark('table_1k')
+def table_1k():
+    data = make_report(1000)['table']
+
+    def build():
+        table = Table(data)
+        for i in xrange(0, len(table), 10):
+            table[i]
+        return table[100:200]
+    return build
+
+
+def json_decode(rows):
+    payload = json.dumps(make_report(rows))
+    return lambda: json.loads(payload)
+
+
+for _rows, _quick in ((1000, True), (100000, True), (1000000, False)):
+    benchmark('json_decode_{0}'.format(_rows), _quick)(
+        lambda rows=_rows: json_decode(rows))
+
+
+@benchmark('client_read_1k')
+def client_read_1k():
+    server = StubServer(rows=1000).start()
+    client = get_client()
+    url = server.url()
+    read = lambda: client.read(url)
+    read.teardown = lambda: (client.http.clear(), server.stop())
+    return read
+
+
+@benchmark('meter_times_100k')
+def meter_times_100k():
+    from odesk_meter import get_today_and_this_week_times
+    data = make_report(100000)
+    return lambda: get_today_and_this_week_times(data)
+
+
+def measure(func, repeat, min_time):
+    """Return best and median seconds per call."""
+    number = 1
+    while True:
+        start = time.time()
+        for i in xrange(number):
+            func()
+        elapsed = time.time() - start
+        if elapsed >= min_time or number >= 10 ** 6:
+            break
+        number *= 10
+    timings = [elapsed / number]
+    for i in xrange(repeat - 1):
+        start = time.time()
+        for j in xrange(number):
+            func()
+        timings.append((time.time() - start) / number)
+    timings.sort()
+    return timings[0], timings[len(timings) // 2]
+
+
+def run(names=None, quick=False, repeat=5, min_time=0.2):
+    results = {}
+    for name, setup, is_quick in BENCHMARKS:
+        if names and not any(part in name for part in names):
+            continue
+        if quick and not is_quick:
+            continue
+        func = setup()
+        try:
+            best, median = measure(func, repeat, min_time)
+        finally:
+            teardown = getattr(func, 'teardown', None)
+            if teardown is not None:
+                teardown()
+        results[name] = {'best': best, 'median': median}
+        print '{0:<20} {1:>12.6f} {2:>12.6f}'.format(name, best, median)
+        sys.stdout.flush()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print ratios against the baseline, return names of regressions."""
+    regressions = []
+    print
+    print '{0:<20} {1:>12} {2:>12} {3:>8}'.format(
+        'benchmark', 'baseline', 'current', 'ratio')
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old = baseline[name]['best']
+        new = results[name]['best']
+        ratio = new / old if old else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print '{0:<20} {1:>12.6f} {2:>12.6f} {3:>8.2f}{4}'.format(
+            name, old, new, ratio, flag)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('names', nargs='*',
+                        help='run benchmarks with names containing these')
+    parser.add_argument('--quick', action='store_true',
+                        help='skip the slowest benchmarks')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds each repeat runs at least')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save results as the baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare results with the baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='allowed slowdown, 0.1 is 10%%')
+    options = parser.parse_args(argv)
+
+    print '{0:<20} {1:>12} {2:>12}'.format('benchmark', 'best, s', 'median, s')
+    results = run(options.names, options.quick, options.repeat,
+                  options.min_time)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'results': results}, f, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, options.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
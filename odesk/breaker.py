@@ -0,0 +1,236 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Per-router circuit breaker.
+
+When an API area degrades, calls to it fail fast with
+:py:class:`odesk.exceptions.CircuitOpenError` instead of tying up
+threads with retries and timeouts, while other routers keep working.
+
+*Example:*::
+
+  breaker = CircuitBreaker(error_threshold=0.5, reset_timeout=30)
+  client = Client(public_key, secret_key, token, token_secret,
+                  circuit_breaker=breaker)
+  ...
+  breaker.states()   # {'/gds/finreports/v2': 'open', ...}
+
+"""
+
+import time
+import socket
+import logging
+import urllib2
+import threading
+from collections import deque
+
+from urllib3.exceptions import HTTPError as Urllib3Error
+
+from odesk.utils import router_of
+from odesk.exceptions import CircuitOpenError, IncorrectJsonResponseError
+
+
+__all__ = ['CircuitBreaker']
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def is_failure(error):
+    """Whether the error means the endpoint is unhealthy, client errors
+    (4xx except 429) don't count.
+
+    """
+    if isinstance(error, urllib2.HTTPError):
+        return error.code >= 500 or error.code == 429
+    return isinstance(error, (Urllib3Error, socket.error,
+                              IncorrectJsonResponseError))
+
+
+class _Circuit(object):
+
+    def __init__(self, window):
+        self.state = CLOSED
+        self.opened_at = None
+        self.probes = 0
+        self.calls = deque(maxlen=window)   # (failed, slow) pairs
+
+    def stats(self):
+        total = len(self.calls)
+        failed = sum(1 for call in self.calls if call[0])
+        slow = sum(1 for call in self.calls if call[1])
+        return total, failed, slow
+
+
+class CircuitBreaker(object):
+    """Track health of API routers and short-circuit failing ones.
+
+    *Parameters:*
+      :error_threshold:   (optional, default ``0.5``)
+                          Share of failed calls which opens the circuit
+
+      :slow_threshold:    (optional, default ``None``)
+                          Seconds after which a successful call
+                          counts as slow, ``None`` ignores latency
+
+      :slow_ratio:        (optional, default ``0.8``)
+                          Share of slow calls which opens the circuit
+
+      :min_calls:         (optional, default ``10``)
+                          Number of recent calls needed to judge health
+
+      :window:            (optional, default ``50``)
+                          Number of recent calls tracked per router
+
+      :reset_timeout:     (optional, default ``30``)
+                          Seconds the circuit stays open before
+                          probe calls are let through
+
+      :half_open_calls:   (optional, default ``1``)
+                          Number of concurrent probe calls
+
+      :key_func:          (optional, default
+                          :py:func:`odesk.utils.router_of`)
+                          Function mapping url to the circuit key
+
+    """
+
+    def __init__(self, error_threshold=0.5, slow_threshold=None,
+                 slow_ratio=0.8, min_calls=10, window=50, reset_timeout=30,
+                 half_open_calls=1, key_func=router_of):
+        self.error_threshold = error_threshold
+        self.slow_threshold = slow_threshold
+        self.slow_ratio = slow_ratio
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.key_func = key_func
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Circuits start closed in the process it's unpickled in
+        return {'error_threshold': self.error_threshold,
+                'slow_threshold': self.slow_threshold,
+                'slow_ratio': self.slow_ratio, 'min_calls': self.min_calls,
+                'window': self.window, 'reset_timeout': self.reset_timeout,
+                'half_open_calls': self.half_open_calls,
+                'key_func': self.key_func}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def after_fork(self):
+        """Reset the lock possibly held by a thread of the parent
+        process, probe calls of the parent never finish here.
+
+        """
+        self._lock = threading.Lock()
+        for circuit in self._circuits.itervalues():
+            circuit.probes = 0
+
+    def _circuit(self, key):
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = self._circuits[key] = _Circuit(self.window)
+        return circuit
+
+    def _transition(self, key, circuit, state):
+        logger = logging.getLogger('python-odesk')
+        logger.debug('Circuit {0}: {1} -> {2}'.format(
+            key, circuit.state, state))
+        circuit.state = state
+        circuit.probes = 0
+        if state == OPEN:
+            circuit.opened_at = time.time()
+        else:
+            circuit.calls.clear()
+
+    def state(self, url_or_key):
+        """Return state of the circuit: ``closed``, ``open``
+        or ``half_open``.
+
+        """
+        key = url_or_key
+        if '://' in url_or_key:
+            key = self.key_func(url_or_key)
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None:
+                return CLOSED
+            if circuit.state == OPEN and \
+                    time.time() - circuit.opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return circuit.state
+
+    def states(self):
+        """Return mapping of circuit keys to their states."""
+        with self._lock:
+            keys = list(self._circuits)
+        return dict((key, self.state(key)) for key in keys)
+
+    def reset(self, key=None):
+        """Close the circuit of ``key`` or all circuits."""
+        with self._lock:
+            if key is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(key, None)
+
+    def _before(self, key):
+        with self._lock:
+            circuit = self._circuit(key)
+            if circuit.state == OPEN:
+                retry_in = circuit.opened_at + self.reset_timeout - \
+                    time.time()
+                if retry_in > 0:
+                    raise CircuitOpenError(
+                        'Circuit for {0} is open, retry in {1:.1f}s'.format(
+                            key, retry_in))
+                self._transition(key, circuit, HALF_OPEN)
+            if circuit.state == HALF_OPEN:
+                if circuit.probes >= self.half_open_calls:
+                    raise CircuitOpenError(
+                        'Circuit for {0} is half open, probe call is '
+                        'in progress'.format(key))
+                circuit.probes += 1
+
+    def _after(self, key, failed, latency):
+        slow = self.slow_threshold is not None and \
+            latency > self.slow_threshold
+        with self._lock:
+            circuit = self._circuit(key)
+            if circuit.state == HALF_OPEN:
+                if failed or slow:
+                    self._transition(key, circuit, OPEN)
+                else:
+                    self._transition(key, circuit, CLOSED)
+                return
+            circuit.calls.append((failed, slow))
+            total, failures, slow_calls = circuit.stats()
+            if circuit.state == CLOSED and total >= self.min_calls and \
+                    (failures >= total * self.error_threshold or
+                     (self.slow_threshold is not None and
+                      slow_calls >= total * self.slow_ratio)):
+                self._transition(key, circuit, OPEN)
+
+    def call(self, url, func):
+        """Call ``func`` unless the circuit of the ``url`` is open.
+
+        Raises :py:class:`odesk.exceptions.CircuitOpenError` when
+        the call is short-circuited.
+
+        """
+        key = self.key_func(url)
+        self._before(key)
+        start = time.time()
+        try:
+            result = func()
+        except Exception, e:
+            self._after(key, is_failure(e), time.time() - start)
+            raise
+        self._after(key, False, time.time() - start)
+        return result
@@ -0,0 +1,102 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Reusable buffers response bodies are read into.
+
+Decompressed chunks are written straight into a ``bytearray`` instead
+of being collected as a list of string chunks, and the buffer goes back
+to the client's :py:class:`BufferPool` once the body is taken out of
+it. The pool only keeps a few small buffers: bodies beyond ``max_size``
+get buffers of their own, which are freed after the call.
+
+The body still has to be copied out of the buffer once, as the JSON
+decoder of Python 2 only accepts strings.
+
+"""
+
+import threading
+
+
+__all__ = ['BufferPool', 'read_into']
+
+
+class BufferPool(object):
+    """Pool of reusable ``bytearray`` buffers.
+
+    *Parameters:*
+      :size:          (optional, default ``64 KB``)
+                      Minimal size of new buffers, they are allocated
+                      on demand and grow to fit the body
+
+      :max_size:      (optional, default ``256 KB``)
+                      Buffers grown beyond this size are dropped
+                      on release instead of being kept
+
+      :max_bytes:     (optional, default ``1 MB``)
+                      Total size of idle buffers kept
+
+    Counters ``allocated`` and ``reused`` show how many buffers were
+    created and how many times idle ones were handed out again.
+
+    """
+
+    def __init__(self, size=2 ** 16, max_size=2 ** 18, max_bytes=2 ** 20):
+        self.size = size
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.allocated = 0
+        self.reused = 0
+        self._idle = []
+        self._idle_bytes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, size=0):
+        """Return buffer of at least ``size`` bytes."""
+        with self._lock:
+            for i, buf in enumerate(self._idle):
+                if len(buf) >= size:
+                    self.reused += 1
+                    self._idle_bytes -= len(buf)
+                    return self._idle.pop(i)
+            self.allocated += 1
+        return bytearray(max(size, self.size))
+
+    def after_fork(self):
+        """Reset the lock possibly held by a thread of the parent
+        process.
+
+        """
+        self._lock = threading.Lock()
+
+    def release(self, buf):
+        """Return the buffer to the pool."""
+        if len(buf) > self.max_size:
+            return
+        with self._lock:
+            if self._idle_bytes + len(buf) <= self.max_bytes:
+                self._idle.append(buf)
+                self._idle_bytes += len(buf)
+
+
+def read_into(response, buf, decoder=None, chunk_size=2 ** 16):
+    """Read the body of the streamed ``urllib3`` response into ``buf``,
+    decoding chunks with ``decoder`` if given. The buffer grows as needed.
+
+    Returns ``(received, length)``: number of bytes transferred and
+    length of the body in the buffer.
+
+    """
+    received = 0
+    position = 0
+    for chunk in response.stream(chunk_size, decode_content=False):
+        received += len(chunk)
+        if decoder is not None:
+            chunk = decoder.decompress(chunk)
+        # Slice assignment past the end grows the buffer
+        buf[position:position + len(chunk)] = chunk
+        position += len(chunk)
+    if decoder is not None:
+        chunk = decoder.flush()
+        buf[position:position + len(chunk)] = chunk
+        position += len(chunk)
+    return received, position
@@ -0,0 +1,293 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Range-subsuming result cache for GDS reports.
+
+Overlapping report queries (this week, this month, last 30 days) differ
+only in their date range, so the cache stores rows per day partition and
+answers any query whose range is covered locally, fetching only the
+missing days from the API.
+
+*Example:*::
+
+  cache = ReportCache(settle_days=2)
+  data = cache.get_report(client.timereport.get_team_report,
+                          'company', 'team', query)
+
+"""
+
+import time
+import inspect
+import threading
+from datetime import date, datetime, timedelta
+
+from odesk.utils import Q, Query
+
+
+__all__ = ['ReportCache']
+
+
+GDS_DATE_FORMAT = '%Y%m%d'
+
+
+def _parse_date(value):
+    """Convert a query operand or a GDS cell value to ``date``."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, basestring):
+        for fmt in ('%Y-%m-%d', GDS_DATE_FORMAT):
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                pass
+    return None
+
+
+def _conjuncts(where):
+    """Split a predicate into a list of ``AND``-ed predicates."""
+    if isinstance(where, Q) and where.operator == 'AND':
+        return where.operands()
+    return [where]
+
+
+def _query_position(method, args, kwargs):
+    """Return keyword or index of the query among the arguments
+    of the report ``method``.
+
+    """
+    if 'query' in kwargs:
+        return 'query'
+    try:
+        names = inspect.getargspec(method).args
+    except TypeError:
+        names = []
+    if getattr(method, 'im_self', None) is not None:
+        names = names[1:]
+    if 'query' in names and names.index('query') < len(args):
+        return names.index('query')
+    return len(args) - 1
+
+
+def _call(method, args, kwargs, position, query):
+    """Call the report ``method`` with ``query`` put at ``position``."""
+    args = list(args)
+    kwargs = dict(kwargs)
+    if position == 'query':
+        kwargs['query'] = query
+    else:
+        args.insert(position, query)
+    return method(*args, **kwargs)
+
+
+def _mentions(predicate, field):
+    """Whether ``field`` is referenced anywhere in the ``predicate``."""
+    if not isinstance(predicate, Q):
+        return False
+    if not predicate.operator:
+        return predicate.arg1 == field
+    return _mentions(predicate.arg1, field) or \
+        _mentions(predicate.arg2, field)
+
+
+class ReportCache(object):
+    """Cache GDS report rows per day and merge them into query results.
+
+    *Parameters:*
+      :settle_days:   (optional, default ``2``)
+                      Partitions older than this number of days are
+                      considered immutable and never refetched
+
+      :ttl:           (optional, default ``300``)
+                      Seconds after which a recent (not yet settled)
+                      partition is fetched again
+
+    Queries which can't be split by day (no closed date range on
+    ``worked_on``/``date``, date column not selected, or an ``ORDER BY``
+    on other columns) are passed to the API unchanged.
+
+    """
+
+    DATE_FIELDS = ('worked_on', 'date')
+
+    def __init__(self, settle_days=2, ttl=300):
+        self.settle_days = settle_days
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._cols = {}
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+    def _split_query(self, query):
+        """Return ``(date_field, start, end, other_predicates)`` or ``None``
+        if the query has no closed date range.
+
+        """
+        if not isinstance(query, Query) or not isinstance(query.where, Q):
+            return None
+        date_field = None
+        start = end = None
+        others = []
+        for predicate in _conjuncts(query.where.normalize()):
+            field = predicate.field
+            if field not in self.DATE_FIELDS or \
+                    (date_field and field != date_field):
+                others.append(predicate)
+                continue
+            value = _parse_date(predicate.arg2)
+            if value is None:
+                return None
+            date_field = field
+            operator = predicate.operator
+            if operator in ('>=', '>', '='):
+                if operator == '>':
+                    value += timedelta(days=1)
+                start = value if start is None else max(start, value)
+            if operator in ('<=', '<', '='):
+                if operator == '<':
+                    value -= timedelta(days=1)
+                end = value if end is None else min(end, value)
+            if operator not in ('>=', '>', '=', '<=', '<'):
+                return None
+        if start is None or end is None:
+            return None
+        for predicate in others:
+            if _mentions(predicate, date_field):
+                return None
+        return date_field, start, end, others
+
+    def _key(self, method, args, kwargs, query, date_field, others):
+        router = getattr(method, 'im_self', None)
+        endpoint = (getattr(router, 'api_url', None),
+                    getattr(router, 'version', None),
+                    getattr(method, '__name__', repr(method)))
+        where = None
+        if others:
+            where = others[0]
+            for predicate in others[1:]:
+                where = where & predicate
+        # Query without the date range, it is the same for all partitions
+        return (endpoint,
+                tuple(args),
+                tuple(sorted(kwargs.items())),
+                date_field,
+                Query(query.select, where=where).fingerprint())
+
+    def _is_fresh(self, day, fetched_at, now):
+        if (date.fromtimestamp(fetched_at) - day).days > self.settle_days:
+            # Partition was already settled when fetched, it won't change
+            return True
+        return now - fetched_at < self.ttl
+
+    def _missing_ranges(self, partitions, start, end, now=None):
+        """Group days absent from the cache, or stale ones if ``now``
+        is given, into contiguous ranges.
+
+        """
+        ranges = []
+        day = start
+        while day <= end:
+            cached = partitions.get(day)
+            if cached is None or (now is not None and
+                                  not self._is_fresh(day, cached[0], now)):
+                if ranges and ranges[-1][1] == day - timedelta(days=1):
+                    ranges[-1][1] = day
+                else:
+                    ranges.append([day, day])
+            day += timedelta(days=1)
+        return ranges
+
+    def _fetch(self, method, args, kwargs, position, query, date_field,
+               others, start, end):
+        where = (Q(date_field) >= start) & (Q(date_field) <= end)
+        for predicate in others:
+            where = where & predicate
+        return _call(method, args, kwargs, position,
+                     Query(query.select, where=where,
+                           order_by=query.order_by))
+
+    def get_report(self, method, *args, **kwargs):
+        """Call a report ``method`` of a GDS router using the cache.
+
+        *Parameters:*
+          :method:    Bound router method, e.g.
+                      ``client.timereport.get_team_report``
+
+          :args:      Positional arguments of the method, including
+                      the :py:class:`odesk.utils.Query`
+
+          :kwargs:    Keyword arguments of the method, the query may be
+                      passed as ``query``
+
+        """
+        position = _query_position(method, args, kwargs)
+        args = list(args)
+        kwargs = dict(kwargs)
+        if position == 'query':
+            query = kwargs.pop('query')
+        else:
+            query = args.pop(position)
+        split = self._split_query(query)
+        if split is None or split[0] not in query.select or \
+                (query.order_by and list(query.order_by) != [split[0]]):
+            with self._lock:
+                self.misses += 1
+            return _call(method, args, kwargs, position, query)
+
+        date_field, start, end, others = split
+        key = self._key(method, args, kwargs, query, date_field, others)
+        now = time.time()
+        with self._lock:
+            missing = self._missing_ranges(self._partitions.get(key, {}),
+                                           start, end, now)
+            if not missing:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        while True:
+            for range_start, range_end in missing:
+                data = self._fetch(method, args, kwargs, position, query,
+                                   date_field, others, range_start,
+                                   range_end)
+                self._store(key, data, date_field, range_start, range_end,
+                            now)
+            with self._lock:
+                partitions = self._partitions.get(key, {})
+                # Partitions dropped by clear() meanwhile are fetched again
+                missing = self._missing_ranges(partitions, start, end)
+                if not missing:
+                    rows = []
+                    day = start
+                    while day <= end:
+                        rows.extend(partitions[day][1])
+                        day += timedelta(days=1)
+                    return {'table': {'cols': self._cols.get(key, []),
+                                      'rows': rows}}
+
+    def _store(self, key, data, date_field, start, end, fetched_at):
+        table = data['table']
+        cols = table['cols']
+        date_idx = [col['label'] for col in cols].index(date_field)
+        by_day = {}
+        for row in table.get('rows') or []:
+            if row == '':   # Empty response
+                continue
+            day = _parse_date(row['c'][date_idx]['v'])
+            by_day.setdefault(day, []).append(row)
+
+        with self._lock:
+            self._cols[key] = cols
+            partitions = self._partitions.setdefault(key, {})
+            day = start
+            while day <= end:
+                partitions[day] = (fetched_at, by_day.get(day, []))
+                day += timedelta(days=1)
+
+    def clear(self):
+        """Drop all cached partitions."""
+        with self._lock:
+            self._cols.clear()
+            self._partitions.clear()
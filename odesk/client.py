@@ -4,17 +4,31 @@
 
 import os
 import json
+import zlib
+import time
 import logging
-import urllib3
+import threading
+from urllib3.exceptions import DecodeError
+from urllib3.response import DeflateDecoder
 
 
+from odesk.config import BASE_URL
 from odesk.oauth import OAuth
+from odesk.transport import PoolManager, start_prewarm, start_reaper
+from odesk.resolver import DNSCache
+from odesk import profiling
 from odesk.http import raise_http_error
-from odesk.utils import decimal_default
-from odesk.exceptions import IncorrectJsonResponseError
+from odesk.utils import decimal_default, route_of
+from odesk.memory import count_rows
+from odesk.buffers import BufferPool, read_into
+from odesk.exceptions import IncorrectJsonResponseError, MemoryCeilingError
 
 
-__all__ = ["Client"]
+__all__ = ["Client", "RequestContext"]
+
+
+ROUTER_FLAGS = ('finreport', 'hr', 'mc', 'provider', 'task', 'team',
+                'timereport', 'job')
 
 
 logger = logging.getLogger('python-odesk')
@@ -34,11 +48,79 @@ else:
     ch.setLevel(logging.CRITICAL)
     logger.addHandler(ch)
 
+profiler = profiling.from_environ(os.environ)
+
+
+def _after_fork(component):
+    """Call ``after_fork`` of the component once per process, it may be
+    shared by several clients.
+
+    """
+    if component is None or \
+            getattr(component, '_after_fork_pid', None) == os.getpid():
+        return
+    component._after_fork_pid = os.getpid()
+    component.after_fork()
+
+
+class RequestContext(object):
+    """Method, url and data of one API call.
+
+    Attached as ``request`` attribute to errors raised by
+    :py:meth:`Client.read`.
+
+    """
+
+    __slots__ = ('method', 'url', 'data', 'started')
+
+    def __init__(self, method, url, data=None):
+        self.method = method
+        self.url = url
+        self.data = data
+        self.started = time.time()
+
+    def __repr__(self):
+        return '<RequestContext {0} {1}>'.format(self.method, self.url)
+
+
+class _Router(object):
+    """Router attached to the client on first access."""
+
+    def __init__(self, attr, flag, module, cls):
+        self.attr = attr
+        self.flag = flag
+        self.module = module
+        self.cls = cls
+
+    def __get__(self, client, owner):
+        if client is None:
+            return self
+        if self.flag not in client._routers:
+            raise AttributeError(
+                "'Client' object has no attribute '{0}'".format(self.attr))
+        client._check_fork()
+        with client._lock:
+            router = client.__dict__.get(self.attr)
+            if router is None:
+                module = __import__(self.module, fromlist=[self.cls])
+                router = getattr(module, self.cls)(client)
+                # Later lookups find the router in the instance __dict__
+                client.__dict__[self.attr] = router
+        return router
+
 
 class Client(object):
     """
     Main API client with oAuth v1 authorization.
 
+    A client can be shared by many threads: requests keep their state
+    in a :py:class:`RequestContext` of their own, routers are created
+    under a lock on first access and counters are updated atomically.
+
+    A client survives ``fork``, the child process opens connections of
+    its own. Pickled client carries only credentials and configuration,
+    see :py:func:`odesk.parallel.process_map`.
+
     *Parameters:*
       :public_key:                Public API key
 
@@ -84,59 +166,191 @@ class Client(object):
                                   Whether to attach
                                   :py:mod:`odesk.routers.job` router
 
+      :compress:                  (optional, default ``True``)
+                                  Whether to ask the server for gzip/deflate
+                                  compressed responses
+
+      :hedging:                   (optional, default ``None``)
+                                  :py:class:`odesk.hedging.HedgingPolicy`
+                                  used to hedge slow ``GET`` requests
+
+      :circuit_breaker:           (optional, default ``None``)
+                                  :py:class:`odesk.breaker.CircuitBreaker`
+                                  used to fail fast on unhealthy routers
+
+      :pool_maxsize:              (optional, default ``1``)
+                                  Number of connections kept open per host
+
+      :prewarm:                   (optional, default ``0``)
+                                  Number of connections to the API host
+                                  opened in background on start, limited
+                                  by ``pool_maxsize``
+
+      :idle_timeout:              (optional, default ``None``)
+                                  Seconds after which idle pooled
+                                  connections are closed in background
+
+      :dns_cache:                 (optional, default ``None``)
+                                  :py:class:`odesk.resolver.DNSCache`
+                                  caching host lookups of new connections,
+                                  ``True`` creates one with default TTLs
+
+      :http:                      (optional, default ``None``)
+                                  :py:class:`odesk.transport.PoolManager`
+                                  shared with other clients, when given
+                                  ``pool_maxsize`` and ``dns_cache``
+                                  are ignored
+
+      :scheduler:                 (optional, default ``None``)
+                                  :py:class:`odesk.pool.FairScheduler`
+                                  each request waits for, see
+                                  :py:class:`odesk.pool.ClientPool`
+
+      :memory:                    (optional, default ``None``)
+                                  :py:class:`odesk.memory.MemoryMonitor`
+                                  recording memory used by each call and
+                                  enforcing its ceiling
+
+      :buffers:                   (optional, default ``None``)
+                                  :py:class:`odesk.buffers.BufferPool`
+                                  compressed bodies are decoded into,
+                                  share one between clients of the
+                                  same process
+
+    Counters ``bytes_received`` and ``bytes_decoded`` show the amount of
+    response body data as transferred and after decompression.
+
     """
 
+    ACCEPT_ENCODING = 'gzip, deflate'
+    CHUNK_SIZE = 2 ** 16
+    ERROR_BODY_SIZE = 2 ** 12
+
+    # :py:class:`odesk.profiling.RequestProfiler` wrapping every ``read``,
+    # set up by ``PYTHON_ODESK_PROFILE`` environment variable
+    profiler = profiler
+
+    finreport = _Router('finreport', 'finreport', 'odesk.routers.finreport',
+                        'Finreports')
+    hr_v1 = _Router('hr_v1', 'hr', 'odesk.routers.hr', 'HR_V1')
+    hr = _Router('hr', 'hr', 'odesk.routers.hr', 'HR')
+    mc = _Router('mc', 'mc', 'odesk.routers.mc', 'MC')
+    provider = _Router('provider', 'provider', 'odesk.routers.provider',
+                       'Provider')
+    provider_v2 = _Router('provider_v2', 'provider', 'odesk.routers.provider',
+                          'Provider_V2')
+    task = _Router('task', 'task', 'odesk.routers.task', 'Task')
+    team = _Router('team', 'team', 'odesk.routers.team', 'Team')
+    team_v2 = _Router('team_v2', 'team', 'odesk.routers.team', 'Team_V2')
+    timereport = _Router('timereport', 'timereport',
+                         'odesk.routers.timereport', 'TimeReport')
+    job = _Router('job', 'job', 'odesk.routers.job', 'Job')
+
+    @property
+    def last_request(self):
+        """:py:class:`RequestContext` of the latest request made
+        by the current thread.
+
+        """
+        return getattr(self._local, 'last_request', None)
+
+    @property
+    def last_method(self):
+        """HTTP method of :py:attr:`last_request`."""
+        request = self.last_request
+        return request and request.method
+
+    @property
+    def last_url(self):
+        """Url of :py:attr:`last_request`."""
+        request = self.last_request
+        return request and request.url
+
+    @property
+    def last_data(self):
+        """Data of :py:attr:`last_request`."""
+        request = self.last_request
+        return request and request.data
+
     def __init__(self, public_key, secret_key,
                  oauth_access_token=None, oauth_access_token_secret=None,
                  fmt='json', finreport=True, hr=True, mc=True,
                  provider=True, task=True, team=True,
-                 timereport=True, job=True):
+                 timereport=True, job=True, compress=True, hedging=None,
+                 circuit_breaker=None, pool_maxsize=1, prewarm=0,
+                 idle_timeout=None, dns_cache=None, http=None,
+                 scheduler=None, memory=None, buffers=None):
 
         self.public_key = public_key
         self.secret_key = secret_key
         self.fmt = fmt
-        self.http = urllib3.PoolManager()
+        self.compress = compress
+        self.hedging = hedging
+        self.circuit_breaker = circuit_breaker
+        self.scheduler = scheduler
+        self.memory = memory
+        self.pool_maxsize = pool_maxsize
+        self.prewarm = prewarm
+        self.idle_timeout = idle_timeout
+        if http is None:
+            if dns_cache is True:
+                dns_cache = DNSCache()
+            http = PoolManager(maxsize=pool_maxsize,
+                               resolver=dns_cache or None)
+        self.http = http
+        if prewarm:
+            start_prewarm(self.http, BASE_URL, prewarm)
+        if idle_timeout is not None:
+            start_reaper(self.http, idle_timeout)
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self.buffers = buffers if buffers is not None else BufferPool()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._pid = os.getpid()
 
         self.oauth_access_token = oauth_access_token
         self.oauth_access_token_secret = oauth_access_token_secret
 
         #Namespaces
         self.auth = OAuth(self)
-
-        if finreport:
-            from odesk.routers.finreport import Finreports
-            self.finreport = Finreports(self)
-
-        if hr:
-            from odesk.routers.hr import HR_V1, HR
-            self.hr_v1 = HR_V1(self)
-            self.hr = HR(self)
-
-        if mc:
-            from odesk.routers.mc import MC
-            self.mc = MC(self)
-
-        if provider:
-            from odesk.routers.provider import Provider, Provider_V2
-            self.provider = Provider(self)
-            self.provider_v2 = Provider_V2(self)
-
-        if task:
-            from odesk.routers.task import Task
-            self.task = Task(self)
-
-        if team:
-            from odesk.routers.team import Team, Team_V2
-            self.team = Team(self)
-            self.team_v2 = Team_V2(self)
-
-        if timereport:
-            from odesk.routers.timereport import TimeReport
-            self.timereport = TimeReport(self)
-
-        if job:
-            from odesk.routers.job import Job
-            self.job = Job(self)
+        self._routers = set(flag for flag, enabled in zip(
+            ROUTER_FLAGS, (finreport, hr, mc, provider, task, team,
+                           timereport, job)) if enabled)
+
+    def __getstate__(self):
+        # Connections, scheduler and per-thread state stay
+        # in this process
+        state = {'public_key': self.public_key,
+                 'secret_key': self.secret_key,
+                 'oauth_access_token': self.oauth_access_token,
+                 'oauth_access_token_secret': self.oauth_access_token_secret,
+                 'fmt': self.fmt, 'compress': self.compress,
+                 'hedging': self.hedging,
+                 'circuit_breaker': self.circuit_breaker,
+                 'pool_maxsize': self.pool_maxsize, 'prewarm': self.prewarm,
+                 'idle_timeout': self.idle_timeout, 'memory': self.memory,
+                 'dns_cache': getattr(self.http, 'resolver', None)}
+        for flag in ROUTER_FLAGS:
+            state[flag] = flag in self._routers
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+        # Threads holding the locks in the parent don't exist here
+        self._pid = os.getpid()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        for component in (self.buffers, self.scheduler, self.memory,
+                          self.hedging, self.circuit_breaker,
+                          self.profiler):
+            _after_fork(component)
+        if self.idle_timeout is not None:
+            start_reaper(self.http, self.idle_timeout)
 
     #Shortcuts for HTTP methods
     def get(self, url, data=None):
@@ -152,7 +366,8 @@ class Client(object):
         return self.read(url, data, method='DELETE', fmt=self.fmt)
 
     # The method that actually makes HTTP requests
-    def urlopen(self, url, data=None, method='GET', headers=None):
+    def urlopen(self, url, data=None, method='GET', headers=None,
+                preload_content=True):
         """Perform oAuth v1 signed HTTP request.
 
         *Parameters:*
@@ -170,14 +385,21 @@ class Client(object):
           :headers:     (optional, default ``{}``)
                         Dictionary with header values
 
-        """
+          :preload_content: (optional, default ``True``)
+                        Whether to read the whole response body at once,
+                        if ``False`` the body can be consumed with
+                        ``response.stream()``
 
-        if headers is None:
-            headers = {}
+        """
+        self._local.last_request = RequestContext(method, url, data)
+        return self._urlopen(url, data, method, headers, preload_content)
 
-        self.last_method = method
-        self.last_url = url
-        self.last_data = data
+    def _urlopen(self, url, data, method, headers, preload_content):
+        self._check_fork()
+        # Copy, the caller's dict may be shared between threads
+        headers = dict(headers or {})
+        if self.compress:
+            headers.setdefault('Accept-Encoding', self.ACCEPT_ENCODING)
 
         # TODO: Headers are not supported fully yet
         # instead we pass oauth parameters in querystring
@@ -196,12 +418,14 @@ class Client(object):
 
         if method == 'GET':
             url = '{0}?{1}'.format(url, post_data)
-            return self.http.urlopen(method, url)
+            return self.http.urlopen(method, url, headers=headers,
+                                     preload_content=preload_content)
         elif method == 'POST':
+            headers['Content-Type'] = \
+                'application/x-www-form-urlencoded;charset=UTF-8'
             return self.http.urlopen(
-                method, url, body=post_data,
-                headers={'Content-Type':
-                         'application/x-www-form-urlencoded;charset=UTF-8'})
+                method, url, body=post_data, headers=headers,
+                preload_content=preload_content)
         elif method in ('PUT', 'DELETE'):
             url = '{0}?{1}'.format(url, post_data)
             headers['Content-Type'] = 'application/json'
@@ -210,7 +434,8 @@ class Client(object):
             else:
                 data_json = ''
             return self.http.urlopen(
-                method, url, body=data_json, headers=headers)
+                method, url, body=data_json, headers=headers,
+                preload_content=preload_content)
 
         else:
             raise Exception('Wrong http method: {0}. Supported'
@@ -239,6 +464,8 @@ class Client(object):
 
         """
         assert fmt == 'json', "Only JSON format is supported at the moment"
+        # Before any lock of the client's components is taken
+        self._check_fork()
 
         if '/gds/' not in url:
             url = '{0}.{1}'.format(url, fmt)
@@ -253,27 +480,155 @@ class Client(object):
         except TypeError:
             logger.debug('Data: {0}'.format(str(data)))
         logger.debug('Method: {0}'.format(method))
-        response = self.urlopen(url, data, method)
+        # Recorded here, hedged requests run in other threads
+        request = self._local.last_request = RequestContext(method, url,
+                                                            data)
+        call = lambda: self._read(url, data, method, fmt)
+        if self.hedging is not None and self.hedging.applies(url, method):
+            hedged = call
+            call = lambda: self.hedging.run(url, hedged)
+        if self.circuit_breaker is not None:
+            breaker_call = call
+            call = lambda: self.circuit_breaker.call(url, breaker_call)
+        profiler = self.profiler
+        if profiler is not None and profiler.sampled():
+            # The stack is walked for sampled calls only
+            key = profiling.caller_method() or route_of(url)
+            profiled = call
+            call = lambda: profiler.profile(key, profiled)
+        try:
+            return call()
+        except Exception, e:
+            if getattr(e, 'request', None) is None:
+                try:
+                    e.request = request
+                except AttributeError:
+                    pass
+            raise
+
+    def _read(self, url, data, method, fmt):
+        logger = logging.getLogger('python-odesk')
+        scheduler = self.scheduler
+        memory = self.memory
+        if memory is not None:
+            record = memory.start(url)
+        if scheduler is not None:
+            scheduler.acquire(self.oauth_access_token)
+        try:
+            response = self._urlopen(url, data, method, None,
+                                     preload_content=False)
+            if memory is not None:
+                self._check_memory(memory, url, response)
+            # Error bodies are drained too, so the connection
+            # goes back to the pool
+            result = self.read_body(response)
+        finally:
+            if scheduler is not None:
+                scheduler.release()
+        if memory is not None:
+            record.stage('body', size=len(result))
 
         if response.status != 200:
             logger.debug('Error: {0}'.format(response))
             raise_http_error(url, response)
 
-        result = response.data
-        logger.debug('Response: {0}'.format(result))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Response: {0}'.format(result))
 
         if fmt == 'json':
+            if memory is not None:
+                # Body of unknown length is checked once it's read
+                memory.check(len(result) * memory.json_expansion,
+                             route_of(url))
             try:
                 result = json.loads(result)
             except ValueError:
                 # Not a valid json string
                 logger.debug('Response is not a valid json string')
+                # Head of the body is enough to tell what went wrong
                 raise IncorrectJsonResponseError(
-                    json.dumps({'status': response.status, 'body': result},
+                    json.dumps({'status': response.status,
+                                'body': result[:self.ERROR_BODY_SIZE]},
                                default=decimal_default)
                 )
+            if memory is not None:
+                record.stage('json', rows=count_rows(result))
         return result
 
+    def _check_memory(self, memory, url, response):
+        """Fail before reading the body if it wouldn't fit the ceiling."""
+        if getattr(response, 'stream', None) is None:
+            # Preloaded response, checked once it's read
+            return
+        length = response.headers.get('content-length')
+        if not length or response.status != 200:
+            return
+        length = int(length)
+        if response.headers.get('content-encoding'):
+            # Size of compressed body is a lower bound only
+            length *= memory.compression_ratio
+        try:
+            memory.check(memory.body_estimate(length), route_of(url))
+        except MemoryCeilingError:
+            # The body is left unread, the connection can't be reused
+            if response._connection is not None:
+                response._connection.close()
+            response.release_conn()
+            raise
+
+    def read_body(self, response):
+        """Read the response body decompressing it chunk by chunk.
+
+        Plain bodies are read as a single string. Compressed chunks are
+        decoded as they arrive into a buffer taken from
+        :py:attr:`buffers` pool, so only the decoded body is held
+        in memory as a whole. Updates ``bytes_received`` and
+        ``bytes_decoded`` counters.
+
+        *Parameters:*
+          :response:    ``urllib3`` response object
+
+        """
+        if getattr(response, 'stream', None) is None:
+            # Preloaded response
+            body = response.data or ''
+            self._count(len(body), len(body))
+            return body
+
+        content_encoding = response.headers.get('content-encoding', '')
+        content_encoding = content_encoding.lower()
+        if content_encoding == 'gzip':
+            decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif content_encoding == 'deflate':
+            decoder = DeflateDecoder()
+        else:
+            body = response.read(decode_content=False) or ''
+            self._count(len(body), len(body))
+            return body
+
+        # Content length is the compressed size, the buffer grows to fit
+        buf = self.buffers.acquire(
+            int(response.headers.get('content-length') or 0))
+        try:
+            received, length = read_into(response, buf, decoder,
+                                         self.CHUNK_SIZE)
+            # The only copy of the body, JSON decoder of Python 2
+            # takes strings only
+            body = memoryview(buf)[:length].tobytes()
+        except zlib.error, e:
+            raise DecodeError(
+                'Received response with content-encoding: {0}, but '
+                'failed to decode it.'.format(content_encoding), e)
+        finally:
+            self.buffers.release(buf)
+        self._count(received, len(body))
+        return body
+
+    def _count(self, received, decoded):
+        with self._lock:
+            self.bytes_received += received
+            self.bytes_decoded += decoded
+
 
 if __name__ == "__main__":
     import doctest
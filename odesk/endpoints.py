@@ -0,0 +1,191 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Declarative registry of API endpoints.
+
+Routers describe their endpoints in ``ENDPOINTS``: path template, HTTP
+method, accepted parameters, allowed values of parameters and the key
+the result is unwrapped from. Templates are compiled once when the
+router class is created and the endpoint is called with
+:py:meth:`odesk.namespaces.Namespace.call`::
+
+  class HR(Namespace):
+      api_url = 'hr/'
+      version = 2
+
+      ENDPOINTS = (
+          Endpoint('get_user', 'users/{0}', unwrap='user'),
+      )
+
+      def get_user(self, user_reference):
+          return self.call('get_user', user_reference)
+
+Other layers can introspect the registry, e.g. to know which calls are
+safe to retry::
+
+  endpoint = find(url, 'PUT')
+  if endpoint is not None and endpoint.idempotent:
+      ...
+
+"""
+
+import re
+import copy
+from string import Formatter
+
+from odesk.exceptions import ApiValueError
+from odesk.utils import assert_parameter
+
+
+__all__ = ['Endpoint', 'URLTemplate', 'registry', 'find']
+
+
+#: Mapping of ``Router.endpoint`` names to bound :py:class:`Endpoint`
+registry = {}
+
+
+class URLTemplate(object):
+    """Path template with positional fields, e.g. ``'users/{0}'``,
+    compiled into a ``%`` format string and a regular expression.
+
+    """
+
+    def __init__(self, template):
+        self.template = template
+        pieces = []
+        pattern = []
+        self.order = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            pieces.append(literal.replace('%', '%%'))
+            pattern.append(re.escape(literal))
+            if field is not None:
+                pieces.append('%s')
+                pattern.append('[^/?]+')
+                self.order.append(int(field or len(self.order)))
+        self.format = ''.join(pieces)
+        self.pattern = ''.join(pattern)
+        if self.order == range(len(self.order)):
+            # Arguments are used in the template order as is
+            self.expand = self.format.__mod__
+
+    def expand(self, args):
+        """Return the path with fields replaced by ``args`` tuple."""
+        return self.format % tuple(args[i] for i in self.order)
+
+
+class Endpoint(object):
+    """Description of an API endpoint.
+
+    *Parameters:*
+      :name:      Name of the endpoint, unique within the router
+
+      :path:      Path template relative to the router url,
+                  e.g. ``'users/{0}'``
+
+      :method:    (optional, default ``GET``) HTTP method
+
+      :params:    (optional) Names of the accepted request parameters,
+                  other parameters are rejected before the request is
+                  made; ``'name[]'`` accepts indexed names like
+                  ``'name[3]'``, ``None`` accepts any parameters
+
+      :choices:   (optional) Mapping of parameter names to their
+                  allowed values, checked before the request is made
+
+      :unwrap:    (optional) Key or tuple of nested keys the result is
+                  taken from, the whole result is returned if one
+                  of them is missing
+
+      :paged:     (optional, default ``False``) Whether the endpoint
+                  returns results page by page
+
+    """
+
+    def __init__(self, name, path, method='GET', params=(), choices=None,
+                 unwrap=None, paged=False):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.verb = method.lower()
+        self.params = tuple(params) if params is not None else None
+        self._params = frozenset(params) if params is not None else None
+        # 'fb_scores[]' accepts indexed names like 'fb_scores[3]'
+        self._indexed = tuple(param[:-1] for param in self.params or ()
+                              if param.endswith('[]'))
+        self.choices = dict(choices or {})
+        self._choices = tuple((name, tuple(options))
+                              for name, options in self.choices.iteritems())
+        if isinstance(unwrap, basestring):
+            unwrap = (unwrap,)
+        self.unwrap = unwrap or ()
+        self.paged = paged
+        self.template = URLTemplate(path)
+        self.router = None
+        self.regex = None
+
+    @property
+    def idempotent(self):
+        """Whether repeating the request has the same effect."""
+        return self.method != 'POST'
+
+    def bind(self, router):
+        """Return copy of the endpoint attached to the router class,
+        registered under ``Router.name``.
+
+        """
+        bound = copy.copy(self)
+        bound.router = router
+        bound.regex = re.compile(
+            re.escape(router.url_prefix) + self.template.pattern + '$')
+        registry['{0}.{1}'.format(router.__name__, self.name)] = bound
+        return bound
+
+    def validate(self, data):
+        """Check names of the parameters and values of the ones
+        having choices.
+
+        """
+        if self._params is not None:
+            unknown = [name for name in data if name not in self._params and
+                       not (name.startswith(self._indexed) and
+                            name.endswith(']'))]
+            if unknown:
+                raise ApiValueError(
+                    "Unknown parameters for {0}: {1}, "
+                    "valid parameters are {2}".format(
+                        self.name, ', '.join(sorted(unknown)), self.params))
+        for name, options in self._choices:
+            if name in data and data[name] not in options:
+                assert_parameter(name, data[name], self.choices[name])
+
+    def unwrap_result(self, result):
+        """Return the part of the result under ``unwrap`` keys."""
+        value = result
+        for key in self.unwrap:
+            try:
+                value = value.get(key, result)
+            except AttributeError:
+                return result
+        return value
+
+    def __repr__(self):
+        return '<Endpoint {0} {1}>'.format(self.method, self.path)
+
+
+def find(url, method='GET'):
+    """Return :py:class:`Endpoint` the full url belongs to or ``None``.
+
+    Of several matching endpoints the one with fewer fields wins,
+    e.g. ``users/me`` over ``users/{0}``.
+
+    """
+    url = url.split('?', 1)[0]
+    if url.endswith('.json'):
+        url = url[:-len('.json')]
+    found = None
+    for endpoint in registry.itervalues():
+        if endpoint.method == method and endpoint.regex.match(url) and \
+                (found is None or len(endpoint.template.order) <
+                 len(found.template.order)):
+            found = endpoint
+    return found
@@ -67,3 +67,19 @@ class ApiValueError(BaseException):
 
 class IncorrectJsonResponseError(BaseException):
     pass
+
+
+class CircuitOpenError(BaseException):
+    """Raised without calling the API while the circuit breaker of
+    the endpoint family is open.
+
+    """
+    pass
+
+
+class MemoryCeilingError(BaseException):
+    """Raised before reading a response which would push memory use
+    above the ceiling of :py:class:`odesk.memory.MemoryMonitor`.
+
+    """
+    pass
@@ -0,0 +1,303 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Streaming export of GDS reports to CSV, JSON Lines and Parquet.
+
+Reports are fetched in date windows and written row by row, so memory
+use is bounded by a single window regardless of the exported period.
+When a window hits the ceiling of the client's
+:py:class:`odesk.memory.MemoryMonitor` it's split into smaller ones.
+
+*Example:*::
+
+  chunks = iter_report(client.finreport.get_provider_billings, ['me'],
+                       Query.DEFAULT_FINREPORT_FIELDS, 'date',
+                       since=date(2013, 1, 1), until=date(2013, 12, 31))
+  export_report(chunks, 'billings.csv.gz')
+
+Parquet output requires ``pyarrow`` to be installed.
+
+"""
+
+import bz2
+import csv
+import gzip
+import json
+from datetime import date, datetime, timedelta
+
+from odesk.utils import Q, Query, decimal_default
+from odesk.exceptions import ApiValueError, MemoryCeilingError
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+__all__ = ['iter_report', 'export_report', 'FORMATS']
+
+
+def iter_report(method, args, fields, date_field, since, until=None,
+                chunk_days=7, where=None, **kwargs):
+    """Fetch a GDS report window by window.
+
+    Yields ``(cols, rows)`` tuples where ``cols`` are the GDS column
+    descriptions (``label`` and ``type``) and ``rows`` is an iterator
+    over lists of cell values of one window.
+
+    *Parameters:*
+      :method:        Bound report method, e.g.
+                      ``client.timereport.get_company_report``
+
+      :args:          Arguments of the method preceding the query
+
+      :fields:        List of columns to select
+
+      :date_field:    Date column to split the period on,
+                      ``worked_on`` or ``date``
+
+      :since:         First date of the period
+
+      :until:         (optional, default today) Last date of the period
+
+      :chunk_days:    (optional, default ``7``) Days per API call,
+                      halved while a window exceeds the memory ceiling
+
+      :where:         (optional) Additional :py:class:`odesk.utils.Q`
+                      predicate
+
+    """
+    until = until or date.today()
+    start = since
+    while start <= until:
+        end = min(start + timedelta(days=chunk_days - 1), until)
+        condition = (Q(date_field) >= start) & (Q(date_field) <= end)
+        if where is not None:
+            condition = condition & where
+        try:
+            data = method(*(tuple(args) +
+                            (Query(fields, where=condition),)), **kwargs)
+        except MemoryCeilingError:
+            if chunk_days == 1:
+                raise
+            chunk_days = max(chunk_days // 2, 1)
+            continue
+        table = data['table']
+        cols = table['cols']
+        rows = table.get('rows') or []
+        # Drop the reference to the parsed response as soon as
+        # its rows are consumed
+        del data, table
+        yield cols, _iter_cells(rows)
+        start = end + timedelta(days=1)
+
+
+def _iter_cells(rows):
+    for row in rows:
+        if row == '':   # Empty response
+            continue
+        yield [cell['v'] for cell in row['c']]
+
+
+def _open(path, compress):
+    if compress == 'gzip':
+        return gzip.open(path, 'wb')
+    elif compress == 'bz2':
+        return bz2.BZ2File(path, 'wb')
+    elif compress is None:
+        return open(path, 'wb')
+    raise ApiValueError("Incorrect value for compress: '{0}', valid values "
+                        "are ['gzip', 'bz2', None]".format(compress))
+
+
+def _labels(cols):
+    return [col['label'] for col in cols]
+
+
+def _to_number(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def _to_date(value):
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y%m%d').date()
+
+
+#: Converters of GDS cell values by column type, others stay strings
+CONVERTERS = {
+    'number': _to_number,
+    'date': _to_date,
+}
+
+
+def _arrow_type(gds_type):
+    if gds_type == 'number':
+        return pyarrow.float64()
+    elif gds_type == 'date':
+        return pyarrow.date32()
+    return pyarrow.string()
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+class CsvWriter(object):
+
+    def __init__(self, path, compress=None, **kwargs):
+        self._file = _open(path, compress)
+        self._writer = csv.writer(self._file)
+        self._labels = None
+
+    def write(self, cols, rows):
+        if self._labels is None:
+            self._labels = _labels(cols)
+            self._writer.writerow([_encode(label)
+                                   for label in self._labels])
+        for row in rows:
+            self._writer.writerow([_encode(value) for value in row])
+
+    def close(self):
+        self._file.close()
+
+
+class JsonLinesWriter(object):
+
+    def __init__(self, path, compress=None, **kwargs):
+        self._file = _open(path, compress)
+
+    def write(self, cols, rows):
+        labels = _labels(cols)
+        for row in rows:
+            self._file.write(json.dumps(dict(zip(labels, row)),
+                                        default=decimal_default))
+            self._file.write('\n')
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter(object):
+    """Columnar writer, buffers at most ``row_group_size`` rows.
+
+    Column types follow GDS column types: ``number`` columns are stored
+    as doubles, ``date`` ones as dates and the rest as strings.
+
+    """
+
+    def __init__(self, path, compress=None, row_group_size=65536):
+        if pyarrow is None:
+            raise ApiValueError('Parquet export requires pyarrow')
+        self._path = path
+        self._compression = compress or 'snappy'
+        self._row_group_size = row_group_size
+        self._writer = None
+        self._labels = None
+        self._types = None
+        self._converters = None
+        self._columns = None
+
+    def write(self, cols, rows):
+        if self._labels is None:
+            self._labels = _labels(cols)
+            self._types = [col.get('type') for col in cols]
+            self._converters = [CONVERTERS.get(gds_type)
+                                for gds_type in self._types]
+            self._columns = [[] for label in self._labels]
+        for row in rows:
+            for column, convert, value in zip(self._columns,
+                                              self._converters, row):
+                if convert is not None:
+                    value = convert(value)
+                column.append(value)
+            if len(self._columns[0]) >= self._row_group_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._columns or not self._columns[0]:
+            return
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=_arrow_type(gds_type))
+             for column, gds_type in zip(self._columns, self._types)],
+            names=self._labels)
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(
+                self._path, table.schema, compression=self._compression)
+        self._writer.write_table(table)
+        self._columns = [[] for label in self._labels]
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+FORMATS = {
+    'csv': CsvWriter,
+    'jsonl': JsonLinesWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def guess_format(path):
+    """Return ``(format, compress)`` from the file extension."""
+    compress = None
+    if path.endswith('.gz'):
+        compress, path = 'gzip', path[:-3]
+    elif path.endswith('.bz2'):
+        compress, path = 'bz2', path[:-4]
+    extension = path.rsplit('.', 1)[-1]
+    if extension == 'json':
+        extension = 'jsonl'
+    return extension, compress
+
+
+def export_report(chunks, path, fmt=None, compress=None,
+                  row_group_size=65536):
+    """Write report chunks produced by :py:func:`iter_report` to a file.
+
+    *Parameters:*
+      :chunks:          Iterable of ``(cols, rows)`` tuples
+
+      :path:            Output file path
+
+      :fmt:             (optional) ``csv``, ``jsonl`` or ``parquet``,
+                        guessed from the extension by default
+
+      :compress:        (optional) ``gzip`` or ``bz2`` for text formats,
+                        codec name for parquet; guessed from
+                        ``.gz``/``.bz2`` extension by default
+
+      :row_group_size:  (optional, default ``65536``)
+                        Rows per Parquet row group
+
+    Returns number of rows written.
+
+    """
+    guessed_fmt, guessed_compress = guess_format(path)
+    fmt = fmt or guessed_fmt
+    compress = compress or guessed_compress
+    if fmt not in FORMATS:
+        raise ApiValueError("Incorrect value for fmt: '{0}', valid values "
+                            "are {1}".format(fmt, sorted(FORMATS)))
+    writer = FORMATS[fmt](path, compress=compress,
+                          row_group_size=row_group_size)
+    count = [0]
+
+    def counted(rows):
+        for row in rows:
+            count[0] += 1
+            yield row
+
+    try:
+        for cols, rows in chunks:
+            writer.write(cols, counted(rows))
+    finally:
+        writer.close()
+    return count[0]
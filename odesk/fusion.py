@@ -0,0 +1,187 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Fusion of per-team time report requests.
+
+Team reports of one company with the same query are answered by a single
+company report with ``team_id`` added to the select list, the returned
+table is then split back per team locally.
+
+*Example:*::
+
+  batch = TeamReportBatch(client.timereport)
+  for team_id in team_ids:
+      batch.add('company', team_id, query)
+  reports = batch.execute()   # In the order of ``add()`` calls
+
+"""
+
+import copy
+import logging
+
+from odesk.exceptions import HTTP401UnauthorizedError, HTTP403ForbiddenError
+from odesk.utils import Query
+
+
+__all__ = ['TeamReportBatch', 'split_by_team']
+
+
+class TeamReportBatch(object):
+    """Collect :py:meth:`~odesk.routers.timereport.TimeReport.get_team_report`
+    requests and execute them with as few API calls as possible.
+
+    *Parameters:*
+      :timereport:    :py:class:`odesk.routers.timereport.TimeReport`
+                      router, e.g. ``client.timereport``
+
+      :min_teams:     (optional, default ``2``)
+                      Minimal number of same-shaped team requests
+                      to be fused into a company request
+
+    Company reports require hiring or finance permissions to all teams
+    within the company, if the API denies the fused request, requests
+    are executed per team and the company is not fused again.
+
+    """
+
+    TEAM_FIELD = 'team_id'
+
+    def __init__(self, timereport, min_teams=2):
+        self.timereport = timereport
+        self.min_teams = min_teams
+        self.denied_companies = set()
+        self._requests = []
+
+    def add(self, company_id, team_id, query, hours=False):
+        """Queue a team report request.
+
+        *Parameters:*
+          :company_id:    The Company ID
+
+          :team_id:       The Team ID
+
+          :query:         The GDS query, :py:class:`odesk.utils.Query`
+
+          :hours:         (optional) Limits the query to hour specific
+                          elements and hides all financial details
+                          Default: ``False``
+
+        """
+        self._requests.append((company_id, team_id, query, hours))
+
+    def __len__(self):
+        return len(self._requests)
+
+    def _groups(self):
+        """Group queued requests by company, query shape and ``hours``."""
+        groups = {}
+        order = []
+        for index, (company_id, team_id, query, hours) in \
+                enumerate(self._requests):
+            if isinstance(query, Query):
+                shape = query.fingerprint()
+            else:
+                shape = str(query)
+            key = (company_id, shape, hours)
+            if key not in groups:
+                groups[key] = []
+                order.append(key)
+            groups[key].append(index)
+        return [(key, groups[key]) for key in order]
+
+    def execute(self):
+        """Run queued requests and return results in the order
+        they were added.
+
+        """
+        groups = self._groups()
+        requests, self._requests = self._requests, []
+        results = [None] * len(requests)
+        for (company_id, shape, hours), indexes in groups:
+            query = requests[indexes[0]][2]
+            teams = set(requests[index][1] for index in indexes)
+            fused = None
+            cols = []
+            handed_out = set()
+            if len(teams) >= self.min_teams and isinstance(query, Query) \
+                    and company_id not in self.denied_companies:
+                cols, fused = self._company_report(company_id, query, hours)
+            for index in indexes:
+                company_id, team_id, query, hours = requests[index]
+                if fused is None:
+                    results[index] = self.timereport.get_team_report(
+                        company_id, team_id, query, hours=hours)
+                elif team_id not in fused:
+                    # Team without rows, each request gets its own table
+                    results[index] = {'table': {'cols': _copy_cols(cols),
+                                                'rows': []}}
+                elif team_id in handed_out:
+                    # The same team queued twice, results are independent
+                    results[index] = copy.deepcopy(fused[team_id])
+                else:
+                    handed_out.add(team_id)
+                    results[index] = fused[team_id]
+        return results
+
+    def _company_report(self, company_id, query, hours):
+        """Return columns of the report and mapping of team ID to
+        the report table, ``(None, None)`` if the company report
+        isn't allowed.
+
+        """
+        select = list(query.select)
+        added = self.TEAM_FIELD not in select
+        if added:
+            select.append(self.TEAM_FIELD)
+        fused_query = Query(select, where=query.where,
+                            order_by=query.order_by)
+        try:
+            data = self.timereport.get_company_report(
+                company_id, fused_query, hours=hours)
+        except (HTTP401UnauthorizedError, HTTP403ForbiddenError), e:
+            logger = logging.getLogger('python-odesk')
+            logger.debug('Company report is not allowed for {0}, '
+                         'falling back to team reports: {1}'.format(
+                             company_id, e))
+            self.denied_companies.add(company_id)
+            return None, None
+        cols = data['table']['cols']
+        if added:
+            cols = [col for col in cols if col['label'] != self.TEAM_FIELD]
+        return cols, split_by_team(data, self.TEAM_FIELD, drop_column=added)
+
+
+def _copy_cols(cols):
+    return [dict(col) for col in cols]
+
+
+def split_by_team(data, team_field='team_id', drop_column=False):
+    """Split GDS table by team.
+
+    *Parameters:*
+      :data:          Parsed JSON GDS response
+
+      :team_field:    (optional, default ``team_id``)
+                      Label of the column with team IDs
+
+      :drop_column:   (optional, default ``False``)
+                      Remove team column from resulting tables
+
+    """
+    cols = data['table']['cols']
+    team_idx = [col['label'] for col in cols].index(team_field)
+    if drop_column:
+        cols = cols[:team_idx] + cols[team_idx + 1:]
+
+    teams = {}
+    for row in data['table'].get('rows') or []:
+        if row == '':   # Empty response
+            continue
+        cells = row['c']
+        team_id = cells[team_idx]['v']
+        if drop_column:
+            row = {'c': cells[:team_idx] + cells[team_idx + 1:]}
+        teams.setdefault(team_id, []).append(row)
+
+    return dict((team_id, {'table': {'cols': _copy_cols(cols), 'rows': rows}})
+                for team_id, rows in teams.items())
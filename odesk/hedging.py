@@ -0,0 +1,197 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Hedged requests for idempotent API calls.
+
+If a ``GET`` request takes longer than the usual (95th percentile)
+latency of its route, a duplicate request is sent and whichever answers
+first wins. The number of extra requests is capped by a budget.
+
+*Example:*::
+
+  client = Client(public_key, secret_key, token, token_secret,
+                  hedging=HedgingPolicy(budget_ratio=0.05))
+
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from Queue import Queue, Empty
+
+from odesk.utils import route_of
+
+
+__all__ = ['HedgingPolicy']
+
+
+class HedgingPolicy(object):
+    """Decide when to send a duplicate of a slow idempotent request.
+
+    *Parameters:*
+      :percentile:      (optional, default ``95``)
+                        Latency percentile of the route after which
+                        the hedge request is sent
+
+      :initial_delay:   (optional, default ``None``)
+                        Hedge delay in seconds used until ``min_samples``
+                        latencies are observed, ``None`` disables hedging
+                        for unknown routes
+
+      :min_samples:     (optional, default ``20``)
+                        Number of observed latencies required to trust
+                        the percentile
+
+      :window:          (optional, default ``200``)
+                        Number of recent latencies kept per route
+
+      :budget_ratio:    (optional, default ``0.05``)
+                        Share of requests allowed to be hedged
+
+      :budget_burst:    (optional, default ``10``)
+                        Maximum number of hedges which can be saved up
+
+      :routes:          (optional, default all routes)
+                        List of route prefixes hedging applies to,
+                        e.g. ``['/gds/', '/api/hr/']``
+
+    """
+
+    def __init__(self, percentile=95, initial_delay=None, min_samples=20,
+                 window=200, budget_ratio=0.05, budget_burst=10,
+                 routes=None):
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.budget_ratio = budget_ratio
+        self.budget_burst = budget_burst
+        self.routes = routes
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._budget = float(budget_burst)
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Observed latencies and counters stay in this process
+        return {'percentile': self.percentile,
+                'initial_delay': self.initial_delay,
+                'min_samples': self.min_samples, 'window': self.window,
+                'budget_ratio': self.budget_ratio,
+                'budget_burst': self.budget_burst, 'routes': self.routes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def after_fork(self):
+        """Reset the lock possibly held by a thread of the parent
+        process.
+
+        """
+        self._lock = threading.Lock()
+
+    def applies(self, url, method):
+        """Whether the request may be hedged."""
+        if method != 'GET':
+            return False
+        if self.routes is None:
+            return True
+        route = route_of(url)
+        return any(route.startswith(prefix) for prefix in self.routes)
+
+    def observe(self, route, latency):
+        with self._lock:
+            latencies = self._latencies.get(route)
+            if latencies is None:
+                latencies = self._latencies[route] = deque(
+                    maxlen=self.window)
+            latencies.append(latency)
+
+    def delay(self, route):
+        """Return the hedge delay of the route or ``None``."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(route, ()))
+        if len(latencies) < self.min_samples or not latencies:
+            return self.initial_delay
+        index = int(len(latencies) * self.percentile / 100.0)
+        return latencies[min(index, len(latencies) - 1)]
+
+    def _spend(self):
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            self.hedged += 1
+            return True
+
+    def run(self, url, func):
+        """Call ``func`` and hedge it with another call if it's slow.
+
+        Returns the result of the first successful call. If all calls
+        fail the first error is raised.
+
+        """
+        route = route_of(url)
+        with self._lock:
+            self.requests += 1
+            self._budget = min(self._budget + self.budget_ratio,
+                               self.budget_burst)
+
+        delay = self.delay(route)
+        if delay is None:
+            # Nothing known about the route yet, just measure it
+            start = time.time()
+            result = func()
+            self.observe(route, time.time() - start)
+            return result
+
+        results = Queue()
+
+        def attempt(number):
+            start = time.time()
+            try:
+                result = func()
+            except Exception, e:
+                results.put((number, False, e))
+            else:
+                self.observe(route, time.time() - start)
+                results.put((number, True, result))
+
+        def spawn(number):
+            thread = threading.Thread(target=attempt, args=(number,))
+            thread.daemon = True
+            thread.start()
+
+        spawn(0)
+        pending = 1
+        try:
+            number, success, value = results.get(timeout=delay)
+        except Empty:
+            # Primary is slow, send the hedge if budget allows
+            if self._spend():
+                logger = logging.getLogger('python-odesk')
+                logger.debug('Hedging request to {0} after {1:.3f}s'
+                             .format(route, delay))
+                spawn(1)
+                pending += 1
+        else:
+            if success:
+                return value
+            raise value
+
+        error = None
+        while pending:
+            number, success, value = results.get()
+            pending -= 1
+            if success:
+                if number:
+                    with self._lock:
+                        self.hedge_wins += 1
+                # The other call is left to finish in background
+                return value
+            if error is None:
+                error = value
+        raise error
@@ -0,0 +1,256 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Memory accounting of large report pulls.
+
+:py:class:`MemoryMonitor` records how much memory each stage of
+:py:meth:`odesk.Client.read` retains and how far it pushes the peak:
+reading the raw body, decoding JSON and, when tracked explicitly,
+building :py:class:`odesk.utils.Table`. With a ceiling set, calls which
+would exceed it fail with :py:class:`odesk.exceptions.MemoryCeilingError`
+before allocating, :py:func:`odesk.export.iter_report` then retries with
+smaller date windows.
+
+*Example:*::
+
+  monitor = MemoryMonitor(ceiling=512 * 2 ** 20)
+  client = Client(public_key, secret_key, token, token_secret,
+                  memory=monitor)
+  data = client.finreport.get_provider_billings(provider_id, query)
+  with monitor.track('table', rows=len(data['table']['rows'])):
+      table = Table(data['table'])
+  print monitor.report()
+
+Memory is measured as resident set size of the process, so stages of
+concurrent calls overlap. The peak of a stage is how far the process
+high-water mark rose above the resident size at the start of the stage;
+a stage which stays below an earlier peak only reports the memory it
+retained. ``reset_peaks=True`` resets the high-water mark before each
+stage where the kernel allows it (``/proc/self/clear_refs``), which
+measures every stage but also resets it for other code reading it.
+
+"""
+
+import os
+import resource
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from odesk.exceptions import MemoryCeilingError
+
+
+__all__ = ['MemoryMonitor', 'rss', 'peak_rss', 'reset_peak', 'count_rows']
+
+
+_PAGE_SIZE = resource.getpagesize()
+
+
+def _maxrss():
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def rss():
+    """Return current resident set size of the process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (IOError, IndexError, ValueError):
+        return _maxrss()
+
+
+def peak_rss():
+    """Return peak resident set size of the process in bytes."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, IndexError, ValueError):
+        pass
+    return _maxrss()
+
+
+def reset_peak():
+    """Reset the peak resident set size to the current one.
+
+    Returns ``False`` if it's not supported, :py:func:`peak_rss` is then
+    the peak over the process lifetime.
+
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def count_rows(data):
+    """Return number of rows of the GDS response or ``None``."""
+    try:
+        rows = data['table']['rows']
+    except (KeyError, TypeError):
+        return None
+    if rows and rows[0] == '':   # Empty response
+        return 0
+    return len(rows)
+
+
+class MemoryRecord(object):
+    """Memory used by the stages of one call."""
+
+    def __init__(self, label, reset_peaks=False):
+        self.label = label
+        self.rows = None
+        self.stages = []
+        self.reset_peaks = reset_peaks
+        if reset_peaks:
+            reset_peak()
+        self._rss = rss()
+        self._peak = peak_rss()
+
+    def stage(self, name, size=None, rows=None):
+        """Record the stage which just finished.
+
+        *Parameters:*
+          :name:    Stage name, e.g. ``body``
+
+          :size:    (optional) Size of the stage's result in bytes
+
+          :rows:    (optional) Number of report rows
+
+        """
+        current, peak = rss(), peak_rss()
+        if rows is not None:
+            self.rows = rows
+        if peak > self._peak:
+            # The stage raised the high-water mark
+            stage_peak = peak - self._rss
+        else:
+            stage_peak = max(current - self._rss, 0)
+        self.stages.append({'stage': name,
+                            'retained': current - self._rss,
+                            'peak': stage_peak,
+                            'size': size})
+        if self.reset_peaks:
+            reset_peak()
+        self._rss, self._peak = current, peak_rss()
+
+    def bytes_per_row(self, stage):
+        """Return bytes per report row of the stage's result size
+        or retained memory.
+
+        """
+        for entry in self.stages:
+            if entry['stage'] == stage and self.rows:
+                size = entry['size']
+                if size is None:
+                    size = entry['retained']
+                return float(size) / self.rows
+        return None
+
+
+class MemoryMonitor(object):
+    """Record memory used by API calls and enforce a ceiling.
+
+    *Parameters:*
+      :ceiling:          (optional, default ``None``)
+                         Bytes of resident memory calls may not exceed
+
+      :json_expansion:   (optional, default ``8``)
+                         Estimated ratio of the decoded JSON tree size
+                         to the raw body size
+
+      :history:          (optional, default ``100``)
+                         Number of recent records kept
+
+      :compression_ratio: (optional, default ``5``)
+                         Estimated ratio of the decompressed body size
+                         to the compressed one, applied to
+                         ``Content-Length`` of compressed responses
+
+      :reset_peaks:      (optional, default ``False``)
+                         Whether to reset the peak resident set size of
+                         the process before each stage
+
+    """
+
+    def __init__(self, ceiling=None, json_expansion=8, history=100,
+                 compression_ratio=5, reset_peaks=False):
+        self.ceiling = ceiling
+        self.json_expansion = json_expansion
+        self.compression_ratio = compression_ratio
+        self.reset_peaks = reset_peaks
+        self.records = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'ceiling': self.ceiling,
+                'json_expansion': self.json_expansion,
+                'compression_ratio': self.compression_ratio,
+                'reset_peaks': self.reset_peaks,
+                'history': self.records.maxlen}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def after_fork(self):
+        """Reset the lock possibly held by a thread of the parent
+        process.
+
+        """
+        self._lock = threading.Lock()
+
+    def start(self, label):
+        """Return new :py:class:`MemoryRecord` of a call."""
+        record = MemoryRecord(label, self.reset_peaks)
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    @contextmanager
+    def track(self, stage, rows=None, label=None):
+        """Record memory used by the block as a single stage."""
+        record = self.start(label or stage)
+        yield record
+        record.stage(stage, rows=rows)
+
+    def check(self, expected, label=None):
+        """Raise :py:class:`odesk.exceptions.MemoryCeilingError` if
+        allocating ``expected`` more bytes would exceed the ceiling.
+
+        """
+        if self.ceiling is None:
+            return
+        current = rss()
+        if current + expected > self.ceiling:
+            raise MemoryCeilingError(
+                '{0} needs about {1} MB on top of {2} MB in use, which '
+                'exceeds the ceiling of {3} MB; fetch smaller date ranges, '
+                'e.g. with odesk.export.iter_report'.format(
+                    label or 'The call', expected // 2 ** 20,
+                    current // 2 ** 20, self.ceiling // 2 ** 20))
+
+    def body_estimate(self, length):
+        """Return estimated memory needed to read and decode
+        a body of ``length`` bytes.
+
+        """
+        return length * (1 + self.json_expansion)
+
+    def report(self):
+        """Return text table of recorded stages."""
+        lines = ['{0:<50} {1:<8} {2:>12} {3:>12} {4:>12}'.format(
+            'call', 'stage', 'retained', 'peak', 'bytes/row')]
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            for entry in record.stages:
+                per_row = record.bytes_per_row(entry['stage'])
+                lines.append('{0:<50} {1:<8} {2:>12} {3:>12} {4:>12}'.format(
+                    record.label[-50:], entry['stage'], entry['retained'],
+                    entry['peak'],
+                    '' if per_row is None else '{0:.1f}'.format(per_row)))
+        return os.linesep.join(lines)
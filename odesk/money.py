@@ -0,0 +1,136 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Exact aggregation of financial report amounts.
+
+Amounts are parsed once into integer cents, so sums match ``Decimal``
+arithmetic exactly instead of drifting like float sums do. Grouped sums
+are vectorized with NumPy when it's installed.
+
+*Example:*::
+
+  amounts = AmountRollup()
+  amounts.update(client.finreport.get_provider_billings(provider_id, query))
+  amounts.sums('type')   # {(u'APAdjustment',): Decimal('-12.50'), ...}
+
+"""
+
+from array import array
+from decimal import Decimal, InvalidOperation
+
+from odesk.exceptions import ApiValueError
+from odesk.rollup import Rollup
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+__all__ = ['AmountRollup', 'to_cents']
+
+
+_CENT = Decimal('0.01')
+
+
+def to_cents(value):
+    """Return amount as integer cents, further digits are rounded half up.
+
+    Empty amounts are zero, malformed ones raise
+    :py:class:`odesk.exceptions.ApiValueError`.
+
+    >>> to_cents('-12.3')
+    -1230
+    >>> to_cents(0.1)
+    10
+
+    """
+    if isinstance(value, basestring):
+        text = value.strip()
+        if not text:
+            return 0
+        digits = text
+        if text[0] in '+-':
+            digits = text[1:]
+        whole, _, fraction = digits.partition('.')
+        if len(fraction) <= 2 and (whole + fraction).isdigit():
+            # Fast path for plain amounts like "1234.5"
+            cents = int(whole or '0') * 100 + int(fraction.ljust(2, '0'))
+            return -cents if text[0] == '-' else cents
+        number = text
+    elif isinstance(value, float):
+        number = repr(value)
+    elif value is None:
+        return 0
+    else:
+        number = value
+    try:
+        # NaN and infinity don't convert to int
+        return int(Decimal(number).quantize(
+            _CENT, rounding='ROUND_HALF_UP').scaleb(2))
+    except (InvalidOperation, ValueError, OverflowError):
+        raise ApiValueError('Incorrect amount: {0!r}'.format(value))
+
+
+class AmountRollup(Rollup):
+    """Sum financial report amounts in cents by several groupings.
+
+    *Parameters:*
+      :groupings:   (optional, default ``AmountRollup.DEFAULT_GROUPINGS``)
+                    Mapping of grouping names to tuples of columns, see
+                    :py:class:`odesk.rollup.Rollup`
+
+      :value:       (optional, default ``amount``)
+                    Label of the column being summed
+
+      :use_numpy:   (optional, default whether NumPy is installed)
+                    Whether to sum groups with NumPy
+
+    Sums are returned as ``Decimal`` with two decimal digits.
+
+    """
+
+    DEFAULT_GROUPINGS = {
+        'buyer_team': ('buyer_team__id',),
+        'provider_team': ('provider_team__id',),
+        'buyer_company': ('buyer_company__id',),
+        'provider_company': ('provider_company__id',),
+        'type': ('type',),
+        'subtype': ('type', 'subtype'),
+    }
+
+    def __init__(self, groupings=None, value='amount', use_numpy=None):
+        super(AmountRollup, self).__init__(groupings, value, digits=2)
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        elif use_numpy and numpy is None:
+            raise ApiValueError('NumPy is not installed')
+        self.use_numpy = use_numpy
+
+    def _parse_values(self, rows, value_idx, sign):
+        cents = (sign * to_cents(row['c'][value_idx]['v']) for row in rows)
+        if self.use_numpy:
+            return numpy.fromiter(cents, dtype=numpy.int64, count=len(rows))
+        return array('l', cents)
+
+    def _accumulate(self, sums, arrays, values):
+        if not self.use_numpy:
+            return super(AmountRollup, self)._accumulate(sums, arrays, values)
+        codes = {}
+        key_codes = numpy.fromiter(
+            (codes.setdefault(key, len(codes)) for key in zip(*arrays)),
+            dtype=numpy.int64, count=len(values))
+        # Integer sums, exact unlike bincount's float weights
+        totals = numpy.zeros(len(codes), dtype=numpy.int64)
+        numpy.add.at(totals, key_codes, values)
+        get = sums.get
+        for key, code in codes.iteritems():
+            sums[key] = get(key, 0) + int(totals[code])
+
+    def sums(self, grouping):
+        return dict((key, value.quantize(_CENT))
+                    for key, value in
+                    super(AmountRollup, self).sums(grouping).items())
+
+    def total(self, grouping):
+        return super(AmountRollup, self).total(grouping).quantize(_CENT)
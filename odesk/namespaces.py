@@ -7,27 +7,83 @@ from .config import BASE_URL
 __all__ = ['Namespace', 'GdsNamespace']
 
 
+class NamespaceType(type):
+    """Compiles url prefix and endpoints of the router class."""
+
+    def __init__(cls, name, bases, attrs):
+        super(NamespaceType, cls).__init__(name, bases, attrs)
+        cls._compile()
+
+    def __setattr__(cls, name, value):
+        super(NamespaceType, cls).__setattr__(name, value)
+        if name in ('base_url', 'api_url', 'version'):
+            cls._compile()
+
+    def _compile(cls):
+        type.__setattr__(cls, 'url_prefix', '{0}{1}v{2}/'.format(
+            cls.base_url, cls.api_url, cls.version))
+        endpoints = {}
+        for klass in reversed(cls.__mro__):
+            for endpoint in klass.__dict__.get('ENDPOINTS', ()):
+                endpoints[endpoint.name] = endpoint
+        type.__setattr__(cls, 'endpoints', dict(
+            (name, endpoint.bind(cls))
+            for name, endpoint in endpoints.iteritems()))
+
+
 class Namespace(object):
     """
     A special 'proxy' class to keep API methods organized.
 
-    Use this class for defining new routers.
+    Use this class for defining new routers, endpoints declared in
+    ``ENDPOINTS`` are called with :py:meth:`call`, see
+    :py:mod:`odesk.endpoints`.
 
     """
+    __metaclass__ = NamespaceType
 
     base_url = os.path.join(BASE_URL, 'api/')
     api_url = None
     version = 1
 
+    ENDPOINTS = ()
+
     def __init__(self, client):
         self.client = client
 
+    def __setattr__(self, name, value):
+        super(Namespace, self).__setattr__(name, value)
+        if name in ('base_url', 'api_url', 'version'):
+            # Overrides of a single router instance
+            super(Namespace, self).__setattr__(
+                'url_prefix', '{0}{1}v{2}/'.format(
+                    self.base_url, self.api_url, self.version))
+
     def full_url(self, url):
         """
         Gets relative URL of API method and returns a full URL
         """
-        return "{0}{1}v{2}/{3}".format(self.base_url,
-                                       self.api_url, self.version, url)
+        return self.url_prefix + url
+
+    def call(self, name, *args, **kwargs):
+        """Make request to the endpoint.
+
+        *Parameters:*
+          :name:    Name of the endpoint in ``ENDPOINTS``
+
+          :args:    Values of the path template fields
+
+          :data:    (optional) Request parameters
+
+        """
+        endpoint = self.endpoints[name]
+        data = kwargs.get('data')
+        if data:
+            endpoint.validate(data)
+        client = self.client
+        result = client.read(self.url_prefix + endpoint.template.expand(args),
+                             data, endpoint.method, client.fmt)
+        return endpoint.unwrap_result(result)
 
     #Proxied client's methods
     def get(self, url, data=None):
@@ -47,6 +103,11 @@ class GdsNamespace(Namespace):
     """Gds API only allows GET requests."""
     base_url = os.path.join(BASE_URL, 'gds/')
 
+    def call(self, name, *args, **kwargs):
+        if self.endpoints[name].method != 'GET':
+            return None
+        return super(GdsNamespace, self).call(name, *args, **kwargs)
+
     def post(self, url, data=None):
         return None
 
@@ -0,0 +1,78 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Fan-out of API calls and report processing over a process pool.
+
+*Example:*::
+
+  def team_hours(client, team):
+      report = client.timereport.get_team_report(company, team, query)
+      return team, sum_hours(report)
+
+  results = process_map(team_hours, teams, client, processes=8)
+
+The function must be defined at module level, so it can be pickled.
+
+"""
+
+import cPickle as pickle
+import multiprocessing
+
+
+__all__ = ['process_map', 'worker_client']
+
+
+_client_state = None
+_client = None
+
+
+def _init_worker(client_state):
+    global _client_state, _client
+    _client_state = client_state
+    _client = None
+
+
+def worker_client():
+    """Return the client of the current worker process, it's created
+    from the pickled client on first use.
+
+    """
+    global _client
+    if _client is None:
+        if _client_state is None:
+            raise RuntimeError('Not in a process_map worker')
+        _client = pickle.loads(_client_state)
+    return _client
+
+
+def _call(args):
+    func, item = args
+    return func(worker_client(), item)
+
+
+def process_map(func, iterable, client, processes=None, chunksize=1):
+    """Return ``[func(client, item) for item in iterable]`` computed by
+    a pool of processes, each having its own copy of the ``client``.
+
+    *Parameters:*
+      :func:        Function taking the client and an item
+
+      :iterable:    Items to process
+
+      :client:      :py:class:`odesk.Client` to copy to the workers
+
+      :processes:   (optional, default number of CPUs)
+                    Number of worker processes
+
+      :chunksize:   (optional, default ``1``)
+                    Number of items sent to a worker at once
+
+    """
+    client_state = pickle.dumps(client, pickle.HIGHEST_PROTOCOL)
+    pool = multiprocessing.Pool(processes, _init_worker, (client_state,))
+    try:
+        return pool.map(_call, [(func, item) for item in iterable],
+                        chunksize)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,208 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Clients of many accounts sharing one transport.
+
+Every :py:class:`odesk.Client` normally owns its connection pool, with
+hundreds of tokens that means hundreds of sockets and handshakes to the
+same host. Clients created by :py:class:`ClientPool` sign requests with
+their own token, but share one bounded connection pool and a scheduler
+which interleaves requests of different accounts fairly.
+
+*Example:*::
+
+  pool = ClientPool(public_key, secret_key, maxsize=10, rate=2)
+  for token, token_secret in tokens:
+      client = pool.client(token, token_secret)
+      client.hr.get_user('me')
+
+"""
+
+import time
+import threading
+from collections import deque, OrderedDict
+
+from odesk.buffers import BufferPool
+from odesk.client import Client
+from odesk.resolver import DNSCache
+from odesk.transport import PoolManager
+
+
+__all__ = ['ClientPool', 'FairScheduler', 'TokenBucket']
+
+
+class TokenBucket(object):
+    """Rate limit of ``rate`` calls per second with bursts of ``burst``."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return seconds to wait until it's available."""
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def take(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+
+class FairScheduler(object):
+    """Limit concurrent requests and hand free slots to waiting keys
+    (tokens) in round-robin order, so one busy account can't starve
+    the others.
+
+    *Parameters:*
+      :concurrency:   (optional, default ``10``)
+                      Number of requests in flight
+
+      :rate:          (optional, default ``None``)
+                      Requests per second allowed for each key,
+                      ``None`` means no limit
+
+      :burst:         (optional, default ``1``)
+                      Number of requests a key can make at once
+                      when it was idle
+
+    """
+
+    def __init__(self, concurrency=10, rate=None, burst=1):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.active = 0
+        self.served = {}
+        self._buckets = {}
+        self._waiting = OrderedDict()   # key -> deque of events
+        self._lock = threading.Lock()
+
+    def _bucket(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate,
+                                                          self.burst)
+            return bucket
+
+    def acquire(self, key):
+        """Wait for the rate limit of the ``key`` and a free slot."""
+        if self.rate:
+            self._bucket(key).take()
+        with self._lock:
+            if self.active < self.concurrency and not self._waiting:
+                self.active += 1
+                self.served[key] = self.served.get(key, 0) + 1
+                return
+            event = threading.Event()
+            self._waiting.setdefault(key, deque()).append(event)
+        event.wait()
+
+    def release(self):
+        """Free the slot, handing it to the next waiting key."""
+        with self._lock:
+            if not self._waiting:
+                self.active -= 1
+                return
+            key, events = self._waiting.popitem(last=False)
+            event = events.popleft()
+            if events:
+                # Other requests of the key wait behind all other keys
+                self._waiting[key] = events
+            self.served[key] = self.served.get(key, 0) + 1
+        event.set()
+
+    def after_fork(self):
+        """Reset locks possibly held by threads of the parent process,
+        requests in flight and waiting there don't exist here.
+
+        """
+        self._lock = threading.Lock()
+        self.active = 0
+        self._waiting.clear()
+        for bucket in self._buckets.itervalues():
+            bucket.after_fork()
+
+    def waiting(self):
+        """Return number of requests waiting for a slot."""
+        with self._lock:
+            return sum(len(events) for events in self._waiting.values())
+
+
+class ClientPool(object):
+    """Create clients for many tokens on a shared transport.
+
+    *Parameters:*
+      :public_key:    Public key of the application
+
+      :secret_key:    Secret key of the application
+
+      :maxsize:       (optional, default ``10``)
+                      Number of connections kept open to the API host,
+                      also the number of concurrent requests
+
+      :rate:          (optional, default ``None``)
+                      Requests per second allowed for each token
+
+      :burst:         (optional, default ``1``)
+                      Requests a token can make at once when it was idle
+
+      :dns_cache:     (optional, default ``True``)
+                      Whether to cache lookups of the API host
+
+    Other keyword arguments are passed to :py:class:`odesk.Client`.
+
+    """
+
+    def __init__(self, public_key, secret_key, maxsize=10, rate=None,
+                 burst=1, dns_cache=True, **client_kwargs):
+        self.public_key = public_key
+        self.secret_key = secret_key
+        self.client_kwargs = client_kwargs
+        resolver = DNSCache() if dns_cache is True else dns_cache or None
+        self.http = PoolManager(maxsize=maxsize, resolver=resolver)
+        self.scheduler = FairScheduler(maxsize, rate, burst)
+        self.buffers = BufferPool()
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, oauth_access_token, oauth_access_token_secret):
+        """Return the client of the token, creating it on first use."""
+        key = (oauth_access_token, oauth_access_token_secret)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = Client(
+                    self.public_key, self.secret_key,
+                    oauth_access_token, oauth_access_token_secret,
+                    http=self.http, scheduler=self.scheduler,
+                    buffers=self.buffers, **self.client_kwargs)
+            return client
+
+    def remove(self, oauth_access_token, oauth_access_token_secret):
+        with self._lock:
+            self._clients.pop(
+                (oauth_access_token, oauth_access_token_secret), None)
+
+    def __len__(self):
+        return len(self._clients)
+
+    def close(self):
+        """Forget all clients and close pooled connections."""
+        with self._lock:
+            self._clients.clear()
+        self.http.clear()
@@ -0,0 +1,173 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Per-request profiling of :py:meth:`odesk.Client.read`.
+
+Enabled without code changes by environment variables::
+
+  PYTHON_ODESK_PROFILE=/tmp/odesk.prof      # file the stats are dumped to
+  PYTHON_ODESK_PROFILE_SAMPLE=0.1           # profile 10% of the calls
+
+Stats are aggregated per router method, e.g. ``Team_V2.get_snapshots``,
+and written at exit or when the process receives ``SIGUSR1``: a text
+report to the given file and cumulative binary stats next to it
+(``<file>.pstats``), which can be loaded with ``pstats.Stats``.
+
+"""
+
+import sys
+import atexit
+import random
+import signal
+import logging
+import cProfile
+import pstats
+import threading
+from StringIO import StringIO
+
+
+__all__ = ['RequestProfiler', 'from_environ']
+
+
+def caller_method(skip=2):
+    """Return ``Class.method`` of the router method up the stack,
+    or ``None`` if the call didn't come through a router.
+
+    """
+    from odesk.namespaces import Namespace
+    frame = sys._getframe(skip)
+    while frame is not None:
+        instance = frame.f_locals.get('self')
+        if isinstance(instance, Namespace) and \
+                frame.f_code.co_name not in ('get', 'post', 'put', 'delete',
+                                             'call'):
+            return '{0}.{1}'.format(type(instance).__name__,
+                                    frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+class RequestProfiler(object):
+    """Profile calls with ``cProfile`` and aggregate stats by key.
+
+    *Parameters:*
+      :path:      (optional, default ``None``)
+                  File :py:meth:`dump` writes the report to
+
+      :sample:    (optional, default ``1.0``)
+                  Share of the calls being profiled
+
+      :limit:     (optional, default ``25``)
+                  Number of functions listed per key in the report
+
+    """
+
+    def __init__(self, path=None, sample=1.0, limit=25):
+        self.path = path
+        self.sample = sample
+        self.limit = limit
+        self.calls = {}
+        self._stats = {}
+        self._total = None
+        # Reentrant, the signal handler may interrupt the holder
+        self._lock = threading.RLock()
+
+    def sampled(self):
+        """Decide whether the next call is profiled."""
+        return self.sample >= 1 or random.random() < self.sample
+
+    def call(self, key, func):
+        """Call ``func``, profiling it if it's sampled."""
+        if not self.sampled():
+            return func()
+        return self.profile(key, func)
+
+    def profile(self, key, func):
+        """Call ``func`` under the profiler and add its stats
+        to the ``key``.
+
+        """
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func)
+        finally:
+            profile.create_stats()
+            with self._lock:
+                self.calls[key] = self.calls.get(key, 0) + 1
+                stats = self._stats.get(key)
+                if stats is None:
+                    self._stats[key] = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+                if self._total is None:
+                    self._total = pstats.Stats(profile)
+                else:
+                    self._total.add(profile)
+
+    def after_fork(self):
+        """Reset the lock possibly held by a thread of the parent
+        process.
+
+        """
+        self._lock = threading.RLock()
+
+    def stats(self, key):
+        """Return ``pstats.Stats`` aggregated for the key or ``None``."""
+        return self._stats.get(key)
+
+    def report(self, sort='cumulative'):
+        """Return text report of stats of all keys."""
+        output = StringIO()
+        with self._lock:
+            for key in sorted(self._stats, key=str):
+                output.write('=== {0} ({1} calls) ===\n'.format(
+                    key, self.calls[key]))
+                stats = self._stats[key]
+                stats.stream = output
+                stats.sort_stats(sort).print_stats(self.limit)
+        return output.getvalue()
+
+    def dump(self, path=None):
+        """Write the report and cumulative binary stats."""
+        path = path or self.path
+        if path is None or not self._stats:
+            return
+        with open(path, 'w') as f:
+            f.write(self.report())
+        with self._lock:
+            self._total.dump_stats(path + '.pstats')
+        logger = logging.getLogger('python-odesk')
+        logger.debug('Profile stats written to {0}'.format(path))
+
+    def install(self):
+        """Dump stats at exit and on ``SIGUSR1``, a handler of the signal
+        installed before is still called.
+
+        """
+        atexit.register(self.dump)
+        if not hasattr(signal, 'SIGUSR1'):
+            return
+        previous = signal.getsignal(signal.SIGUSR1)
+
+        def handler(signum, frame):
+            self.dump()
+            if callable(previous):
+                previous(signum, frame)
+        try:
+            signal.signal(signal.SIGUSR1, handler)
+        except ValueError:   # Not in the main thread
+            pass
+
+
+def from_environ(environ):
+    """Return installed profiler configured by ``PYTHON_ODESK_PROFILE``
+    variables or ``None``.
+
+    """
+    path = environ.get('PYTHON_ODESK_PROFILE')
+    if not path:
+        return None
+    profiler = RequestProfiler(
+        path, sample=float(environ.get('PYTHON_ODESK_PROFILE_SAMPLE', 1)))
+    profiler.install()
+    return profiler
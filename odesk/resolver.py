@@ -0,0 +1,180 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""In-process DNS cache used by connections of :py:mod:`odesk.transport`.
+
+Every new pooled connection would otherwise resolve the API host again,
+which adds latency and stalls on a slow resolver.
+
+*Example:*::
+
+  client = Client(public_key, secret_key, token, token_secret,
+                  dns_cache=DNSCache(ttl=300))
+  ...
+  client.http.resolver.stats()   # {'hits': 41, 'misses': 1, ...}
+
+"""
+
+import time
+import socket
+import logging
+import threading
+
+
+__all__ = ['DNSCache']
+
+
+class DNSCache(object):
+    """TTL-bounded cache of ``getaddrinfo`` results.
+
+    Failed lookups are cached for a shorter time, so a broken name doesn't
+    hammer the resolver. Entries used close to their expiration are
+    refreshed in a background thread, the cached addresses are served
+    meanwhile.
+
+    *Parameters:*
+      :ttl:            (optional, default ``300``)
+                       Seconds successful lookups are cached
+
+      :negative_ttl:   (optional, default ``30``)
+                       Seconds failed lookups are cached
+
+      :refresh_ahead:  (optional, default ``0.8``)
+                       Share of ``ttl`` after which a used entry is
+                       refreshed in background, ``None`` disables it
+
+    Counters ``hits``, ``negative_hits``, ``misses`` and ``refreshes``
+    are returned by :py:meth:`stats`.
+
+    """
+
+    def __init__(self, ttl=300, negative_ttl=30, refresh_ahead=0.8):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ahead = refresh_ahead
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._entries = {}   # (host, port) -> (resolved_at, expires, result)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _lookup(self, host, port):
+        return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+    def _resolve(self, key):
+        now = time.time()
+        try:
+            result = self._lookup(*key)
+        except socket.gaierror, e:
+            with self._lock:
+                self._entries[key] = (now, now + self.negative_ttl, e)
+            raise
+        with self._lock:
+            self._entries[key] = (now, now + self.ttl, result)
+        return result
+
+    def _refresh(self, key):
+        try:
+            self._resolve(key)
+        except socket.error, e:
+            logger = logging.getLogger('python-odesk')
+            logger.debug('Failed to refresh address of {0}: {1}'.format(
+                key[0], e))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _start_refresh(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.refreshes += 1
+        thread = threading.Thread(target=self._refresh, args=(key,),
+                                  name='odesk-dns-refresh')
+        thread.daemon = True
+        thread.start()
+
+    def getaddrinfo(self, host, port):
+        """Return cached ``socket.getaddrinfo`` result for the address.
+
+        Raises ``socket.gaierror`` for names which failed to resolve.
+
+        """
+        key = (host, port)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                entry = None
+            elif isinstance(entry[2], Exception):
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            return self._resolve(key)
+
+        resolved_at, expires, result = entry
+        if isinstance(result, Exception):
+            raise result
+        if self.refresh_ahead is not None and \
+                now - resolved_at >= self.ttl * self.refresh_ahead:
+            self._start_refresh(key)
+        return result
+
+    def create_connection(self, address,
+                          timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                          source_address=None):
+        """Drop-in replacement of ``socket.create_connection``
+        using cached addresses.
+
+        """
+        host, port = address
+        error = None
+        for family, socktype, proto, _, sockaddr in \
+                self.getaddrinfo(host, port):
+            sock = None
+            try:
+                sock = socket.socket(family, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except socket.error, e:
+                error = e
+                if sock is not None:
+                    sock.close()
+        if error is not None:
+            raise error
+        raise socket.error('getaddrinfo returns an empty list')
+
+    def stats(self):
+        """Return cache counters, ``hits`` and ``negative_hits`` are
+        lookups saved.
+
+        """
+        with self._lock:
+            return {'hits': self.hits, 'negative_hits': self.negative_hits,
+                    'misses': self.misses, 'refreshes': self.refreshes,
+                    'entries': len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def after_fork(self):
+        """Reset locks possibly held by threads of the parent process."""
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def __getstate__(self):
+        return {'ttl': self.ttl, 'negative_ttl': self.negative_ttl,
+                'refresh_ahead': self.refresh_ahead}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
@@ -0,0 +1,185 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Rollups of time report hours by several groupings at once.
+
+Rows of a GDS table are read into column arrays once, hours are parsed
+into fixed-point integers, so sums are exact, and every grouping is
+accumulated from the same columns.
+
+*Example:*::
+
+  rollup = Rollup()
+  rollup.update(client.timereport.get_company_report(company_id, query))
+  rollup.sums('team_week')   # {(u'company:team', '20130527'): Decimal('12.5')}
+
+"""
+
+from decimal import Decimal
+from datetime import date, timedelta
+
+
+__all__ = ['Rollup']
+
+
+def _day(value):
+    return value.replace('-', '')
+
+
+def _week(value):
+    """Return Monday of the week of the ``YYYYMMDD`` date."""
+    value = _day(value)
+    day = date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+    return (day - timedelta(days=day.weekday())).strftime('%Y%m%d')
+
+
+def _month(value):
+    return _day(value)[:6]
+
+
+GRANULARITIES = {
+    'day': _day,
+    'week': _week,
+    'month': _month,
+}
+
+
+class Rollup(object):
+    """Sum hours of GDS time report rows by several groupings.
+
+    *Parameters:*
+      :groupings:   (optional, default ``Rollup.DEFAULT_GROUPINGS``)
+                    Mapping of grouping names to tuples of columns.
+                    Date columns can be truncated with a granularity
+                    suffix, e.g. ``'worked_on:week'``, available are
+                    ``day``, ``week`` (starting on Monday) and ``month``
+
+      :value:       (optional, default ``hours``)
+                    Label of the column being summed
+
+      :digits:      (optional, default ``6``)
+                    Decimal digits of the value kept by the fixed-point
+                    sums, further digits are rounded half up
+
+    Groupings using columns missing from the table are left empty.
+    Rows with an empty date are grouped under the ``None`` date.
+
+    """
+
+    DEFAULT_GROUPINGS = {
+        'team_day': ('team_id', 'worked_on:day'),
+        'team_week': ('team_id', 'worked_on:week'),
+        'team_month': ('team_id', 'worked_on:month'),
+        'task': ('task',),
+        'provider': ('provider_id',),
+    }
+
+    def __init__(self, groupings=None, value='hours', digits=6):
+        if groupings is None:
+            groupings = self.DEFAULT_GROUPINGS
+        self.groupings = dict(groupings)
+        self.value = value
+        self.digits = digits
+        self.scale = 10 ** digits
+        self.rows = 0
+        self._quantum = Decimal(1).scaleb(-digits)
+        self._sums = dict((name, {}) for name in self.groupings)
+        self._parsed = {}    # value -> fixed-point integer
+
+    def _fixed(self, value):
+        fixed = self._parsed.get(value)
+        if fixed is None:
+            if isinstance(value, float):
+                number = Decimal(repr(value))
+            else:
+                number = Decimal(value or 0)
+            fixed = int(number.quantize(self._quantum,
+                                        rounding='ROUND_HALF_UP').scaleb(
+                                            self.digits))
+            self._parsed[value] = fixed
+        return fixed
+
+    def _dimension(self, columns, dimension, rows, index):
+        """Return column array of the dimension, truncated
+        to its granularity.
+
+        """
+        if dimension in columns:
+            return columns[dimension]
+        label, _, granularity = dimension.partition(':')
+        if label not in columns:
+            if label not in index:
+                return None
+            i = index[label]
+            columns[label] = [row['c'][i]['v'] for row in rows]
+        values = columns[label]
+        if granularity:
+            # Few distinct dates repeat over many rows
+            truncate = GRANULARITIES[granularity]
+            truncated = {}
+            for value in set(values):
+                truncated[value] = truncate(value) if value else None
+            values = [truncated[value] for value in values]
+        columns[dimension] = values
+        return values
+
+    def update(self, data, sign=1):
+        """Add rows of the GDS response to the sums.
+
+        *Parameters:*
+          :data:    Parsed JSON GDS response or its ``table``
+
+          :sign:    (optional, default ``1``)
+                    ``-1`` subtracts the rows instead
+
+        """
+        table = data.get('table', data)
+        rows = table['rows']
+        if not rows or rows[0] == '':   # Empty response
+            return
+        index = dict((col['label'], i) for i, col in enumerate(table['cols']))
+        values = self._parse_values(rows, index[self.value], sign)
+
+        # All arrays are built before any sum changes, so a bad row
+        # leaves the rollup as it was
+        columns = {}
+        groups = []
+        for name, dimensions in self.groupings.items():
+            arrays = [self._dimension(columns, dimension, rows, index)
+                      for dimension in dimensions]
+            if None not in arrays:
+                groups.append((name, arrays))
+        for name, arrays in groups:
+            self._accumulate(self._sums[name], arrays, values)
+        self.rows += sign * len(rows)
+
+    def _parse_values(self, rows, value_idx, sign):
+        fixed = self._fixed
+        return [sign * fixed(row['c'][value_idx]['v']) for row in rows]
+
+    def _accumulate(self, sums, arrays, values):
+        get = sums.get
+        for key, value in zip(zip(*arrays), values):
+            sums[key] = get(key, 0) + value
+
+    def remove(self, data):
+        """Subtract rows of the GDS response, e.g. the previous
+        fetch of a refreshed period.
+
+        """
+        self.update(data, sign=-1)
+
+    def sums(self, grouping):
+        """Return mapping of grouping keys to ``Decimal`` sums.
+
+        Groups summing to zero are kept, including ones whose rows
+        were all removed.
+
+        """
+        return dict((key, Decimal(value).scaleb(-self.digits))
+                    for key, value in self._sums[grouping].items())
+
+    def total(self, grouping):
+        """Return ``Decimal`` sum of all rows of the grouping."""
+        return Decimal(sum(self._sums[grouping].values())).scaleb(
+            -self.digits)
@@ -3,12 +3,40 @@
 # (C) 2010-2014 oDesk
 
 from odesk.namespaces import GdsNamespace
+from odesk.endpoints import Endpoint
 
 
 class Finreports(GdsNamespace):
     api_url = 'finreports/'
     version = 2
 
+    ENDPOINTS = (
+        Endpoint('get_provider_billings',
+                 'providers/{0}/billings', params=('tq',)),
+        Endpoint('get_provider_teams_billings',
+                 'provider_teams/{0}/billings', params=('tq',)),
+        Endpoint('get_provider_companies_billings',
+                 'provider_companies/{0}/billings', params=('tq',)),
+        Endpoint('get_provider_earnings',
+                 'providers/{0}/earnings', params=('tq',)),
+        Endpoint('get_provider_teams_earnings',
+                 'provider_teams/{0}/earnings', params=('tq',)),
+        Endpoint('get_provider_companies_earnings',
+                 'provider_companies/{0}/earnings', params=('tq',)),
+        Endpoint('get_buyer_teams_billings',
+                 'buyer_teams/{0}/billings', params=('tq',)),
+        Endpoint('get_buyer_companies_billings',
+                 'buyer_companies/{0}/billings', params=('tq',)),
+        Endpoint('get_buyer_teams_earnings',
+                 'buyer_teams/{0}/earnings', params=('tq',)),
+        Endpoint('get_buyer_companies_earnings',
+                 'buyer_companies/{0}/earnings', params=('tq',)),
+        Endpoint('get_financial_entities',
+                 'financial_accounts/{0}', params=('tq',)),
+        Endpoint('get_financial_entities_provider',
+                 'financial_account_owner/{0}', params=('tq',)),
+    )
+
     def get_provider_billings(self, provider_id, query):
         """
         Generate Billing Reports for a Specific Provider.
@@ -19,10 +47,8 @@ class Finreports(GdsNamespace):
           :query:         The GDS query string
 
         """
-        url = 'providers/{0}/billings'.format(provider_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_provider_billings', provider_id,
+                         data={'tq': str(query)})
 
     def get_provider_teams_billings(self, provider_team_id, query):
         """
@@ -36,10 +62,8 @@ class Finreports(GdsNamespace):
           :query:             The GDS query string
 
         """
-        url = 'provider_teams/{0}/billings'.format(provider_team_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_provider_teams_billings', provider_team_id,
+                         data={'tq': str(query)})
 
     def get_provider_companies_billings(self, provider_company_id, query):
         """
@@ -52,10 +76,8 @@ class Finreports(GdsNamespace):
           :query:                 The GDS query string
 
         """
-        url = 'provider_companies/{0}/billings'.format(provider_company_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_provider_companies_billings',
+                         provider_company_id, data={'tq': str(query)})
 
     def get_provider_earnings(self, provider_id, query):
         """
@@ -67,10 +89,8 @@ class Finreports(GdsNamespace):
           :query:         The GDS query string
 
         """
-        url = 'providers/{0}/earnings'.format(provider_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_provider_earnings', provider_id,
+                         data={'tq': str(query)})
 
     def get_provider_teams_earnings(self, provider_team_id, query):
         """
@@ -82,10 +102,8 @@ class Finreports(GdsNamespace):
           :query:             The GDS query string
 
         """
-        url = 'provider_teams/{0}/earnings'.format(provider_team_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_provider_teams_earnings', provider_team_id,
+                         data={'tq': str(query)})
 
     def get_provider_companies_earnings(self, provider_company_id, query):
         """
@@ -97,10 +115,8 @@ class Finreports(GdsNamespace):
           :query:                 The GDS query string
 
         """
-        url = 'provider_companies/{0}/earnings'.format(provider_company_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_provider_companies_earnings',
+                         provider_company_id, data={'tq': str(query)})
 
     def get_buyer_teams_billings(self, buyer_team_id, query):
         """
@@ -114,10 +130,8 @@ class Finreports(GdsNamespace):
           :query:             The GDS query string
 
         """
-        url = 'buyer_teams/{0}/billings'.format(buyer_team_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_buyer_teams_billings', buyer_team_id,
+                         data={'tq': str(query)})
 
     def get_buyer_companies_billings(self, buyer_company_id, query):
         """
@@ -129,10 +143,8 @@ class Finreports(GdsNamespace):
 
           :query:             The GDS query string
         """
-        url = 'buyer_companies/{0}/billings'.format(buyer_company_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_buyer_companies_billings', buyer_company_id,
+                         data={'tq': str(query)})
 
     def get_buyer_teams_earnings(self, buyer_team_id, query):
         """
@@ -144,10 +156,8 @@ class Finreports(GdsNamespace):
           :query:             The GDS query string
 
         """
-        url = 'buyer_teams/{0}/earnings'.format(buyer_team_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_buyer_teams_earnings', buyer_team_id,
+                         data={'tq': str(query)})
 
     def get_buyer_companies_earnings(self, buyer_company_id, query):
         """
@@ -159,10 +169,8 @@ class Finreports(GdsNamespace):
           :query:             The GDS query string
 
         """
-        url = 'buyer_companies/{0}/earnings'.format(buyer_company_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_buyer_companies_earnings', buyer_company_id,
+                         data={'tq': str(query)})
 
     def get_financial_entities(self, accounting_id, query):
         """
@@ -174,10 +182,8 @@ class Finreports(GdsNamespace):
           :query:             The GDS query string
 
         """
-        url = 'financial_accounts/{0}'.format(accounting_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_financial_entities', accounting_id,
+                         data={'tq': str(query)})
 
     def get_financial_entities_provider(self, provider_id, query):
         """
@@ -189,7 +195,5 @@ class Finreports(GdsNamespace):
           :query:             The GDS query string
 
         """
-        url = 'financial_account_owner/{0}'.format(provider_id)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+        return self.call('get_financial_entities_provider', provider_id,
+                         data={'tq': str(query)})
@@ -3,7 +3,8 @@
 # (C) 2010-2014 oDesk
 
 from odesk.namespaces import Namespace
-from odesk.utils import assert_parameter, ApiValueError
+from odesk.endpoints import Endpoint
+from odesk.utils import ApiValueError
 
 
 class HR_V1(Namespace):
@@ -13,6 +14,11 @@ class HR_V1(Namespace):
     api_url = 'hr/'
     version = 1
 
+    ENDPOINTS = (
+        Endpoint('invite_to_interview', 'jobs/{0}/candidates', method='POST',
+                 params=('profile_key', 'provider__reference', 'cover')),
+    )
+
     def invite_to_interview(self, job_id, cover, profile_key=None,
                             provider_reference=None):
         """
@@ -47,8 +53,7 @@ class HR_V1(Namespace):
 
         data['cover'] = cover
 
-        url = 'jobs/{0}/candidates'.format(job_id)
-        return self.post(url, data)
+        return self.call('invite_to_interview', job_id, data=data)
 
 
 class HR(Namespace):
@@ -72,6 +77,74 @@ class HR(Namespace):
     )
     CONTRACT_WOULD_HIRE_AGAIN_OPTONS = ('yes', 'no')
 
+    JOB_PARAMS = ('buyer_team__reference', 'title', 'job_type', 'description',
+                  'visibility', 'category', 'subcategory', 'budget',
+                  'duration', 'start_date', 'end_date', 'skills', 'status')
+    LIST_PARAMS = ('buyer_team__reference', 'include_sub_teams',
+                   'provider__reference', 'profile_key', 'job__reference',
+                   'agency_team__reference', 'status', 'created_by',
+                   'created_time_from', 'created_time_to', 'page',
+                   'order_by')
+
+    ENDPOINTS = (
+        Endpoint('get_user_roles', 'userroles', unwrap='userroles'),
+        Endpoint('get_user', 'users/{0}', unwrap='user'),
+        Endpoint('get_user_me', 'users/me', unwrap='user'),
+        Endpoint('get_companies', 'companies'),
+        Endpoint('get_company', 'companies/{0}', unwrap='company'),
+        Endpoint('get_company_teams', 'companies/{0}/teams', unwrap='teams'),
+        Endpoint('get_company_users', 'companies/{0}/users',
+                 params=('status_in_company',), unwrap='users'),
+        Endpoint('get_team_adjustments', 'teams/{0}/adjustments',
+                 params=('engagement__reference',), unwrap='adjustments'),
+        Endpoint('post_team_adjustment', 'teams/{0}/adjustments',
+                 method='POST',
+                 params=('engagement__reference', 'comments', 'amount',
+                         'charge_amount', 'notes'),
+                 unwrap='adjustment'),
+        Endpoint('get_teams', 'teams', unwrap='teams'),
+        Endpoint('get_team', 'teams/{0}', params=('include_users',),
+                 unwrap='team'),
+        Endpoint('get_team_users', 'teams/{0}/users',
+                 params=('status_in_team',), unwrap='users'),
+        Endpoint('get_jobs', 'jobs', params=LIST_PARAMS, unwrap='jobs',
+                 paged=True),
+        Endpoint('get_job', 'jobs/{0}', unwrap='job'),
+        Endpoint('post_job', 'jobs', method='POST', params=JOB_PARAMS,
+                 choices={'job_type': JOB_TYPES,
+                          'visibility': JOB_VISIBILITY_OPTIONS}),
+        Endpoint('update_job', 'jobs/{0}', method='PUT', params=JOB_PARAMS,
+                 choices={'visibility': JOB_VISIBILITY_OPTIONS,
+                          'status': JOB_STATUSES}),
+        Endpoint('delete_job', 'jobs/{0}', method='DELETE',
+                 params=('reason_code',)),
+        Endpoint('get_offers', 'offers', params=LIST_PARAMS,
+                 unwrap='offers', paged=True),
+        Endpoint('get_offer', 'offers/{0}', unwrap='offer'),
+        Endpoint('post_offer', 'offers', method='POST',
+                 params=('job__reference', 'provider_team__reference',
+                         'provider__reference', 'profile_key',
+                         'message_from_buyer', 'engagement_title',
+                         'attached_doc', 'fixed_charge_amount_agreed',
+                         'fixed_pay_amount_agreed',
+                         'fixed_price_upfront_payment', 'hourly_pay_rate',
+                         'weekly_salary_charge_amount',
+                         'weekly_salary_pay_amount', 'weekly_stipend_hours',
+                         'weekly_hours_limit', 'start_date', 'keep_open'),
+                 choices={'keep_open': JOB_KEEP_OPEN_OPTIONS}),
+        Endpoint('get_engagements', 'engagements',
+                 params=LIST_PARAMS + ('provider_reference',
+                                       'agency_team_reference'),
+                 unwrap='engagements', paged=True),
+        Endpoint('get_engagement', 'engagements/{0}', unwrap='engagement'),
+        Endpoint('end_contract', 'contracts/{0}', method='DELETE',
+                 params=('reason', 'would_hire_again', 'fb_scores[]',
+                         'fb_comment'),
+                 choices={'reason': CONTRACT_REASON_OPTIONS,
+                          'would_hire_again':
+                          CONTRACT_WOULD_HIRE_AGAIN_OPTONS}),
+    )
+
     """userrole api"""
 
     def get_user_roles(self):
@@ -84,9 +157,7 @@ class HR(Namespace):
         they have access to.
 
         """
-        url = 'userroles'
-        result = self.get(url)
-        return result.get('userroles', result)
+        return self.call('get_user_roles')
 
     """user api"""
 
@@ -98,18 +169,14 @@ class HR(Namespace):
           :user_reference:    The user reference
 
         """
-        url = 'users/{0}'.format(user_reference)
-        result = self.get(url)
-        return result.get('user', result)
+        return self.call('get_user', user_reference)
 
     def get_user_me(self):
         """
         Retrieve currently authenticated user object.
 
         """
-        url = 'users/me'
-        result = self.get(url)
-        return result.get('user', result)
+        return self.call('get_user_me')
 
     """company api"""
 
@@ -119,9 +186,7 @@ class HR(Namespace):
         has access.
 
         """
-        url = 'companies'
-        result = self.get(url)
-        return result['companies']
+        return self.call('get_companies')['companies']
 
     def get_company(self, company_referece):
         """
@@ -132,9 +197,7 @@ class HR(Namespace):
                                   get_companies method)
 
         """
-        url = 'companies/{0}'.format(company_referece)
-        result = self.get(url)
-        return result.get('company', result)
+        return self.call('get_company', company_referece)
 
     def get_company_teams(self, company_referece):
         """
@@ -147,9 +210,7 @@ class HR(Namespace):
                                   get_companies method)
 
         """
-        url = 'companies/{0}/teams'.format(company_referece)
-        result = self.get(url)
-        return result.get('teams', result)
+        return self.call('get_company_teams', company_referece)
 
     def get_company_users(self, company_referece, active=True):
         """
@@ -164,13 +225,11 @@ class HR(Namespace):
           :active:                ``True``/``False`` (default ``True``)
 
         """
-        url = 'companies/{0}/users'.format(company_referece)
         if active:
             data = {'status_in_company': 'active'}
         else:
             data = {'status_in_company': 'inactive'}
-        result = self.get(url, data)
-        return result.get('users', result)
+        return self.call('get_company_users', company_referece, data=data)
 
     """team api"""
 
@@ -184,14 +243,12 @@ class HR(Namespace):
           :engagement_reference:  (optional) The Engagement reference ID
 
         """
-        url = 'teams/{0}/adjustments'.format(team_reference)
         data = {}
 
         if engagement_reference:
             data['engagement__reference'] = engagement_reference
 
-        result = self.get(url, data)
-        return result.get('adjustments', result)
+        return self.call('get_team_adjustments', team_reference, data=data)
 
     def post_team_adjustment(self, team_reference, engagement_reference,
                              comments, amount=None, charge_amount=None,
@@ -220,7 +277,6 @@ class HR(Namespace):
         one of them is present.
 
         """
-        url = 'teams/{0}/adjustments'.format(team_reference)
         data = {}
 
         data['engagement__reference'] = engagement_reference
@@ -240,8 +296,7 @@ class HR(Namespace):
         if notes:
             data['notes'] = notes
 
-        result = self.post(url, data)
-        return result.get('adjustment', result)
+        return self.call('post_team_adjustment', team_reference, data=data)
 
     def get_teams(self):
         """
@@ -251,9 +306,7 @@ class HR(Namespace):
         user has access to.
 
         """
-        url = 'teams'
-        result = self.get(url)
-        return result.get('teams', result)
+        return self.call('get_teams')
 
     def get_team(self, team_reference, include_users=False):
         """
@@ -266,10 +319,9 @@ class HR(Namespace):
                               (default: False)
 
         """
-        url = 'teams/{0}'.format(team_reference)
-        result = self.get(url, {'include_users': include_users})
         #TODO: check how included users returned
-        return result.get('team', result)
+        return self.call('get_team', team_reference,
+                         data={'include_users': include_users})
 
     def get_team_users(self, team_reference, active=True):
         """
@@ -283,13 +335,11 @@ class HR(Namespace):
                        Default value is ``True``.
 
         """
-        url = 'teams/{0}/users'.format(team_reference)
         if active:
             data = {'status_in_team': 'active'}
         else:
             data = {'status_in_team': 'inactive'}
-        result = self.get(url, data)
-        return result.get('users', result)
+        return self.call('get_team_users', team_reference, data=data)
 
     """job api"""
 
@@ -325,8 +375,6 @@ class HR(Namespace):
           :order_by:              (optional)
 
         """
-        url = 'jobs'
-
         data = {}
         data['buyer_team__reference'] = buyer_team_reference
 
@@ -351,8 +399,7 @@ class HR(Namespace):
         if order_by is not None:
             data['order_by'] = order_by
 
-        result = self.get(url, data)
-        return result.get('jobs', result)
+        return self.call('get_jobs', data=data)
 
     def get_job(self, job_reference):
         """
@@ -364,9 +411,7 @@ class HR(Namespace):
           :job_reference:     Job reference
 
         """
-        url = 'jobs/{0}'.format(job_reference)
-        result = self.get(url)
-        return result.get('job', result)
+        return self.call('get_job', job_reference)
 
     def post_job(self, buyer_team_reference, title, job_type, description,
                  visibility, category, subcategory, budget=None, duration=None,
@@ -430,18 +475,12 @@ class HR(Namespace):
                                    e.g. ``['python']``
 
         """
-        url = 'jobs'
         data = {}
 
         data['buyer_team__reference'] = buyer_team_reference
         data['title'] = title
-
-        assert_parameter('job_type', job_type, self.JOB_TYPES)
         data['job_type'] = job_type
-
         data['description'] = description
-
-        assert_parameter('visibility', visibility, self.JOB_VISIBILITY_OPTIONS)
         data['visibility'] = visibility
 
         data['category'] = category
@@ -462,8 +501,7 @@ class HR(Namespace):
         if skills:
             data['skills'] = ';'.join(skills)
 
-        result = self.post(url, data)
-        return result
+        return self.call('post_job', data=data)
 
     def update_job(self, job_id, buyer_team_reference, title, description,
                    visibility, category=None, subcategory=None, budget=None,
@@ -528,14 +566,11 @@ class HR(Namespace):
                                    - 'cancelled'
 
         """
-        url = 'jobs/{0}'.format(job_id)
         data = {}
 
         data['buyer_team__reference'] = buyer_team_reference
         data['title'] = title
         data['description'] = description
-
-        assert_parameter('visibility', visibility, self.JOB_VISIBILITY_OPTIONS)
         data['visibility'] = visibility
 
         data['category'] = category
@@ -555,12 +590,11 @@ class HR(Namespace):
             data['end_date'] = end_date
 
         if status:
-            assert_parameter('status', status, self.JOB_STATUSES)
             data['status'] = status
         else:
             raise ApiValueError('Missing required parameter "status"')
 
-        return self.put(url, data)
+        return self.call('update_job', job_id, data=data)
 
     def delete_job(self, job_id, reason_code):
         """
@@ -578,8 +612,8 @@ class HR(Namespace):
                             * ``34`` - No developer for requested skills
 
         """
-        url = 'jobs/{0}'.format(job_id)
-        return self.delete(url, {'reason_code': reason_code})
+        return self.call('delete_job', job_id,
+                         data={'reason_code': reason_code})
 
     """offer api"""
 
@@ -623,7 +657,6 @@ class HR(Namespace):
           :order_by:              (optional) Sorting
 
         """
-        url = 'offers'
         data = {}
         data['buyer_team__reference'] = buyer_team_reference
 
@@ -656,8 +689,7 @@ class HR(Namespace):
         if order_by is not None:
             data['order_by'] = order_by
 
-        result = self.get(url, data)
-        return result.get('offers', result)
+        return self.call('get_offers', data=data)
 
     def get_offer(self, offer_reference):
         """
@@ -667,9 +699,7 @@ class HR(Namespace):
           :offer_reference:   Offer reference ID
 
         """
-        url = 'offers/{0}'.format(offer_reference)
-        result = self.get(url)
-        return result.get('offer', result)
+        return self.call('get_offer', offer_reference)
 
     def post_offer(self, job_reference, provider_team_reference=None,
                    provider_reference=None, profile_key=None,
@@ -745,8 +775,6 @@ class HR(Namespace):
         and start working or decline the offer.
 
         """
-        url = 'offers'
-
         data = {}
         data['job__reference'] = job_reference
 
@@ -799,11 +827,9 @@ class HR(Namespace):
             data['start_date'] = start_date
 
         if keep_open:
-            assert_parameter('keep_open', keep_open,
-                             self.JOB_KEEP_OPEN_OPTIONS)
             data['keep_open'] = keep_open
 
-        return self.post(url, data)
+        return self.call('post_offer', data=data)
 
     """engagement api"""
 
@@ -862,8 +888,6 @@ class HR(Namespace):
                                     * 'engagement_start_date',
                                     * 'engagement_end_date'
         """
-        url = 'engagements'
-
         data = {}
         if buyer_team_reference:
             data['buyer_team__reference'] = buyer_team_reference
@@ -902,8 +926,7 @@ class HR(Namespace):
         if order_by is not None:
             data['order_by'] = order_by
 
-        result = self.get(url, data)
-        return result.get('engagements', result)
+        return self.call('get_engagements', data=data)
 
     def get_engagement(self, engagement_reference):
         """
@@ -913,9 +936,7 @@ class HR(Namespace):
           :engagement_reference:    Engagement reference ID
 
         """
-        url = 'engagements/{0}'.format(engagement_reference)
-        result = self.get(url)
-        return result.get('engagement', result)
+        return self.call('get_engagement', engagement_reference)
 
     """contracts api"""
 
@@ -1000,14 +1021,8 @@ class HR(Namespace):
                                  the ``fb_scores`` parameter is also required.
 
         """
-        url = 'contracts/{0}'.format(contract_reference)
         data = {}
-
-        assert_parameter('reason', reason, self.CONTRACT_REASON_OPTIONS)
         data['reason'] = reason
-
-        assert_parameter('would_hire_again', would_hire_again,
-                         self.CONTRACT_WOULD_HIRE_AGAIN_OPTONS)
         data['would_hire_again'] = would_hire_again
 
         if fb_scores:
@@ -1017,5 +1032,4 @@ class HR(Namespace):
         if fb_comment:
             data['fb_comment'] = fb_comment
 
-        result = self.delete(url, data)
-        return result
+        return self.call('end_contract', contract_reference, data=data)
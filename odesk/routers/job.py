@@ -3,12 +3,18 @@
 # (C) 2010-2014 oDesk
 
 from odesk.namespaces import Namespace
+from odesk.endpoints import Endpoint
 
 
 class Job(Namespace):
     api_url = 'profiles/'
     version = 1
 
+    ENDPOINTS = (
+        Endpoint('get_job_profile', 'jobs/{0}',
+                 unwrap=('profiles', 'profile')),
+    )
+
     def get_job_profile(self, job_key):
         """Returns detailed profile information about job(s).
 
@@ -24,7 +30,6 @@ class Job(Namespace):
 
         """
         max_keys = 20
-        url = 'jobs/{0}'
         # Check job key(s)
         if not job_key.__class__ in [str, int, list, tuple]:
             raise ValueError(
@@ -39,9 +44,5 @@ class Job(Namespace):
                 raise ValueError(
                     'List should contain only job keys not recno.')
             else:
-                url = url.format(';'.join(job_key))
-        else:
-            url = url.format(job_key)
-        result = self.get(url)
-        profiles = result.get('profiles', result)
-        return profiles.get('profile', result)
+                job_key = ';'.join(job_key)
+        return self.call('get_job_profile', job_key)
@@ -5,12 +5,37 @@
 import urllib
 
 from odesk.namespaces import Namespace
+from odesk.endpoints import Endpoint
+
+
+FLAG_CHOICES = ('true', 'false')
 
 
 class MC(Namespace):
     api_url = 'mc/'
     version = 1
 
+    ENDPOINTS = (
+        Endpoint('get_trays', 'trays', params=('page',), unwrap='trays',
+                 paged=True),
+        Endpoint('get_user_trays', 'trays/{0}', params=('page',),
+                 unwrap='trays', paged=True),
+        Endpoint('get_tray_content', 'trays/{0}/{1}', params=('page',),
+                 unwrap=('current_tray', 'threads'), paged=True),
+        Endpoint('get_thread_content', 'threads/{0}/{1}', params=('page',),
+                 unwrap='thread', paged=True),
+        Endpoint('put_threads', 'threads/{0}/{1}', method='PUT',
+                 params=('read', 'starred', 'deleted'),
+                 choices={'read': FLAG_CHOICES, 'starred': FLAG_CHOICES,
+                          'deleted': FLAG_CHOICES}),
+        Endpoint('post_message', 'threads/{0}', method='POST',
+                 params=('recipients', 'subject', 'body', 'bcc',
+                         'attachment-key')),
+        Endpoint('post_reply', 'threads/{0}/{1}', method='POST',
+                 params=('recipients', 'subject', 'body', 'bcc',
+                         'attachment-key')),
+    )
+
     def get_trays(self, username=None, paging_offset=0, paging_count=20):
         """
         Retrieve a list of all active trays and a message count for each.
@@ -19,7 +44,6 @@ class MC(Namespace):
           :username:          User name
 
         """
-        url = 'trays'
         if paging_offset or not paging_count == 20:
             data = {'page': '{0};{1}'.format(paging_offset,
                                              paging_count)}
@@ -27,9 +51,8 @@ class MC(Namespace):
             data = {}
 
         if username:
-            url = '{0}/{1}'.format(url, username)
-        result = self.get(url, data=data)
-        return result.get("trays", result)
+            return self.call('get_user_trays', username, data=data)
+        return self.call('get_trays', data=data)
 
     def get_tray_content(self, username, tray, paging_offset=None,
                          paging_count=None):
@@ -46,19 +69,13 @@ class MC(Namespace):
           :paging_count:      Page size (number of results)
 
         """
-        url = 'trays/{0}/{1}'.format(username, tray)
         if paging_offset is not None and paging_count is not None:
             data = {'page': '{0};{1}'.format(paging_offset,
                                              paging_count)}
         else:
             data = {}
 
-        result = self.get(url, data=data)
-        try:
-            current_tray = result.get("current_tray", result)
-            return current_tray.get("threads", result)
-        except AttributeError:
-            return result
+        return self.call('get_tray_content', username, tray, data=data)
 
     def get_thread_content(self, username, thread_id, paging_offset=0,
                            paging_count=20):
@@ -75,15 +92,14 @@ class MC(Namespace):
           :paging_count:      Page size (number of results)
 
         """
-        url = 'threads/{0}/{1}'.format(username, thread_id)
         if paging_offset or not paging_count == 20:
             data = {'page': '{0};{1}'.format(paging_offset,
                                                paging_count)}
         else:
             data = {}
 
-        result = self.get(url, data=data)
-        return result.get("thread", result)
+        return self.call('get_thread_content', username, thread_id,
+                         data=data)
 
     def _generate_many_threads_url(self, url, threads_ids):
         return ';'.join(urllib.quote(str(i)) for i in threads_ids)
@@ -102,14 +118,13 @@ class MC(Namespace):
         """
         if isinstance(thread_ids, (list, tuple)):
             thread_ids = ';'.join(map(str, thread_ids))
-        url = 'threads/{0}/{1}'.format(username, thread_ids)
 
         if read:
             data = {'read': 'true'}
         else:
             data = {'read': 'false'}
 
-        return self.put(url, data=data)
+        return self.call('put_threads', username, thread_ids, data=data)
 
     def put_threads_read(self, username, thread_ids):
         """
@@ -150,14 +165,13 @@ class MC(Namespace):
         """
         if isinstance(thread_ids, (list, tuple)):
             thread_ids = ';'.join(map(str, thread_ids))
-        url = 'threads/{0}/{1}'.format(username, thread_ids)
 
         if starred:
             data = {'starred': 'true'}
         else:
             data = {'starred': 'false'}
 
-        return self.put(url, data=data)
+        return self.call('put_threads', username, thread_ids, data=data)
 
     def put_threads_starred(self, username, thread_ids):
         """
@@ -200,14 +214,13 @@ class MC(Namespace):
         """
         if isinstance(thread_ids, (list, tuple)):
             thread_ids = ';'.join(map(str, thread_ids))
-        url = 'threads/{0}/{1}'.format(username, thread_ids)
 
         if deleted:
             data = {'deleted': 'true'}
         else:
             data = {'deleted': 'false'}
 
-        return self.put(url, data=data)
+        return self.call('put_threads', username, thread_ids, data=data)
 
     def put_threads_deleted(self, username, thread_ids):
         """
@@ -260,12 +273,9 @@ class MC(Namespace):
                             associated with the thread
 
         """
-        url = 'threads/{0}'.format(username)
         if not isinstance(recipients, (list, tuple)):
             recipients = [recipients]
         recipients = ','.join(map(str, recipients))
-        if thread_id:
-            url = '{0}/{1}'.format(url, thread_id)
 
         data = {'recipients': recipients,
                 'subject': subject,
@@ -277,4 +287,6 @@ class MC(Namespace):
         if attachment_key:
             data['attachment-key'] = attachment_key
 
-        return self.post(url, data=data)
+        if thread_id:
+            return self.call('post_reply', username, thread_id, data=data)
+        return self.call('post_message', username, data=data)
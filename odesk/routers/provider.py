@@ -3,12 +3,30 @@
 # (C) 2010-2014 oDesk
 
 from odesk.namespaces import Namespace
+from odesk.endpoints import Endpoint
 
 
 class Provider(Namespace):
     api_url = 'profiles/'
     version = 1
 
+    ENDPOINTS = (
+        Endpoint('get_provider', 'providers/{0}', unwrap='profile'),
+        Endpoint('get_provider_brief', 'providers/{0}/brief',
+                 unwrap='profile'),
+        # Search queries are passed through as is
+        Endpoint('search_providers', 'search/providers', params=None,
+                 unwrap='providers', paged=True),
+        Endpoint('search_jobs', 'search/jobs', params=None,
+                 unwrap='jobs', paged=True),
+        Endpoint('get_categories_metadata', 'metadata/categories',
+                 unwrap='categories'),
+        Endpoint('get_skills_metadata', 'metadata/skills', unwrap='skills'),
+        Endpoint('get_regions_metadata', 'metadata/regions',
+                 unwrap='regions'),
+        Endpoint('get_tests_metadata', 'metadata/tests', unwrap='tests'),
+    )
+
     def get_provider(self, provider_ciphertext):
         """
         Retrieve an exhaustive list of attributes associated with the \
@@ -22,9 +40,7 @@ class Provider(Namespace):
             provider_ciphertext = map(str, provider_ciphertext)
             provider_ciphertext = ';'.join(provider_ciphertext[:20])
 
-        url = 'providers/{0}'.format(provider_ciphertext)
-        result = self.get(url)
-        return result.get('profile', result)
+        return self.call('get_provider', provider_ciphertext)
 
     def get_provider_brief(self, provider_ciphertext):
         """
@@ -39,9 +55,7 @@ class Provider(Namespace):
             provider_ciphertext = map(str, provider_ciphertext)
             provider_ciphertext = ';'.join(provider_ciphertext[:20])
 
-        url = 'providers/{0}/brief'.format(provider_ciphertext)
-        result = self.get(url)
-        return result.get('profile', result)
+        return self.call('get_provider_brief', provider_ciphertext)
 
     def search_providers(self, data=None, page_offset=0, page_size=20,
                          order_by=None):
@@ -148,15 +162,13 @@ class Provider(Namespace):
                       the only available sort field as of now is "Date Created"
 
         """
-        url = 'search/providers'
         if data is None:
             data = {}
 
         data['page'] = '{0};{1}'.format(page_offset, page_size)
         if order_by is not None:
             data['sort'] = order_by
-        result = self.get(url, data=data)
-        return result.get('providers', result)
+        return self.call('search_providers', data=data)
 
     def search_jobs(self, data=None,
                     page_offset=0, page_size=20, order_by=None):
@@ -257,32 +269,26 @@ class Provider(Namespace):
                         e.g. ``date_posted;A``
 
         """
-        url = 'search/jobs'
         if data is None:
             data = {}
         data['page'] = '{0};{1}'.format(page_offset, page_size)
         if order_by is not None:
             data['sort'] = order_by
-        result = self.get(url, data=data)
-        return result.get('jobs', result)
+        return self.call('search_jobs', data=data)
 
     def get_categories_metadata(self):
         """
         Returns list of all categories available for job/contractor profiles.
 
         """
-        url = 'metadata/categories'
-        result = self.get(url)
-        return result.get('categories', result)
+        return self.call('get_categories_metadata')
 
     def get_skills_metadata(self):
         """
         Returns list of all skills available for job/contractor profiles.
 
         """
-        url = 'metadata/skills'
-        result = self.get(url)
-        return result.get('skills', result)
+        return self.call('get_skills_metadata')
 
     def get_regions_metadata(self):
         """
@@ -290,24 +296,27 @@ class Provider(Namespace):
         job/contractor profiles.
 
         """
-        url = 'metadata/regions'
-        result = self.get(url)
-        return result.get('regions', result)
+        return self.call('get_regions_metadata')
 
     def get_tests_metadata(self):
         """
         Returns list of all available tests at oDesk.
 
         """
-        url = 'metadata/tests'
-        result = self.get(url)
-        return result.get('tests', result)
+        return self.call('get_tests_metadata')
 
 
 class Provider_V2(Namespace):
     api_url = 'profiles/'
     version = 2
 
+    ENDPOINTS = (
+        Endpoint('search_providers', 'search/providers', params=None,
+                 unwrap='providers', paged=True),
+        Endpoint('search_jobs', 'search/jobs', params=None,
+                 unwrap='jobs', paged=True),
+    )
+
     def search_providers(self, data=None, page_offset=0, page_size=20):
         """Search providers.
 
@@ -410,7 +419,6 @@ class Provider_V2(Namespace):
          :page_size:  (optional: default ``20``) Page size (number of results)
 
         """
-        url = 'search/providers'
         search_data = {}
 
         if data:
@@ -418,9 +426,7 @@ class Provider_V2(Namespace):
 
         search_data['paging'] = '{0};{1}'.format(page_offset, page_size)
 
-        result = self.get(url, data=search_data)
-
-        return result.get('providers', result)
+        return self.call('search_providers', data=search_data)
 
     def search_jobs(self, data=None, page_offset=0, page_size=20):
         """Search jobs.
@@ -533,7 +539,6 @@ class Provider_V2(Namespace):
          :page_size:  (optional: default ``20``) Page size (number of results)
 
         """
-        url = 'search/jobs'
         search_data = {}
 
         if data:
@@ -541,6 +546,4 @@ class Provider_V2(Namespace):
 
         search_data['paging'] = '{0};{1}'.format(page_offset, page_size)
 
-        result = self.get(url, data=search_data)
-
-        return result.get('jobs', result)
+        return self.call('search_jobs', data=search_data)
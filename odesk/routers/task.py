@@ -6,12 +6,35 @@ import urllib
 
 
 from odesk.namespaces import Namespace
+from odesk.endpoints import Endpoint
+
+
+TASK_PARAMS = ('code', 'description', 'url', 'engagements', 'all_in_company')
 
 
 class Task(Namespace):
     api_url = 'otask/'
     version = 1
 
+    ENDPOINTS = (
+        Endpoint('get_team_tasks', 'tasks/companies/{0}/teams/{1}/tasks'),
+        Endpoint('get_team_specific_tasks',
+                 'tasks/companies/{0}/teams/{1}/tasks/{2}'),
+        Endpoint('post_team_task', 'tasks/companies/{0}/teams/{1}/tasks',
+                 method='POST', params=TASK_PARAMS),
+        Endpoint('put_team_task', 'tasks/companies/{0}/teams/{1}/tasks/{2}',
+                 method='PUT', params=TASK_PARAMS),
+        Endpoint('archive_team_task',
+                 'tasks/companies/{0}/teams/{1}/archive/{2}', method='PUT'),
+        Endpoint('unarchive_team_task',
+                 'tasks/companies/{0}/teams/{1}/unarchive/{2}', method='PUT'),
+        Endpoint('assign_engagement',
+                 'tasks/companies/{0}/teams/{1}/engagements/{2}/tasks',
+                 method='PUT', params=('tasks',)),
+        Endpoint('update_batch_tasks', 'tasks/companies/{0}/tasks/batch',
+                 method='PUT', params=('data',)),
+    )
+
     def get_team_tasks(self, company_id, team_id):
         """
         Retrieve a list of all activities in the given team.
@@ -29,9 +52,7 @@ class Task(Namespace):
                           from ``hr.get_team()`` API call.
 
         """
-        url = 'tasks/companies/{0}/teams/{1}/tasks'.format(company_id,
-                                                           team_id)
-        result = self.get(url)
+        result = self.call('get_team_tasks', company_id, team_id)
         try:
             return result["tasks"] or []
         except KeyError:
@@ -77,9 +98,8 @@ class Task(Namespace):
 
         """
         task_codes = self._encode_task_codes(task_codes)
-        url = 'tasks/companies/{0}/teams/{1}/tasks/{2}'.format(
-            company_id, team_id, urllib.quote(task_codes))
-        result = self.get(url)
+        result = self.call('get_team_specific_tasks', company_id, team_id,
+                           urllib.quote(task_codes))
         try:
             return result["tasks"] or []
         except KeyError:
@@ -136,8 +156,6 @@ class Task(Namespace):
           ``engagements`` list will override the ``all_in_company`` setting.
 
         """
-        post_url = 'tasks/companies/{0}/teams/{1}/tasks'.format(
-            company_id, team_id)
         data = {'code': code,
                 'description': description,
                 'url': url}
@@ -149,8 +167,7 @@ class Task(Namespace):
         if all_in_company:
             data['all_in_company'] = 1
 
-        result = self.post(post_url, data)
-        return result
+        return self.call('post_team_task', company_id, team_id, data=data)
 
     def post_company_task(self, company_id, code, description, url,
                           engagements=None, all_in_company=None):
@@ -226,8 +243,6 @@ class Task(Namespace):
           ``engagements`` list will override the ``all_in_company`` setting.
 
         """
-        put_url = 'tasks/companies/{0}/teams/{1}/tasks/{2}'.format(
-            company_id, team_id, urllib.quote(str(code)))
         data = {'code': code,
                 'description': description,
                 'url': url}
@@ -239,8 +254,8 @@ class Task(Namespace):
         if all_in_company:
             data['all_in_company'] = 1
 
-        result = self.put(put_url, data)
-        return result
+        return self.call('put_team_task', company_id, team_id,
+                         urllib.quote(str(code)), data=data)
 
     def put_company_task(self, company_id, code, description, url,
                          engagements=None, all_in_company=None):
@@ -294,9 +309,8 @@ class Task(Namespace):
           :task_code:     A single Activity ID
 
         """
-        url = 'tasks/companies/{0}/teams/{1}/archive/{2}'.format(
-            company_id, team_id, urllib.quote(str(task_code)))
-        return self.put(url, data={})
+        return self.call('archive_team_task', company_id, team_id,
+                         urllib.quote(str(task_code)), data={})
 
     def archive_company_task(self, company_id, task_code):
         """Archive single activity within a company.
@@ -327,9 +341,8 @@ class Task(Namespace):
           :task_code:     A single Activity ID
 
         """
-        url = 'tasks/companies/{0}/teams/{1}/unarchive/{2}'.format(
-            company_id, team_id, urllib.quote(str(task_code)))
-        return self.put(url, data={})
+        return self.call('unarchive_team_task', company_id, team_id,
+                         urllib.quote(str(task_code)), data={})
 
     def unarchive_company_task(self, company_id, task_code):
         """Unarchive single activity within a company.
@@ -374,11 +387,9 @@ class Task(Namespace):
 
         """
         task_codes = self._encode_task_codes(task_codes)
-        url = 'tasks/companies/{0}/teams/{1}/engagements/{2}/tasks'.format(
-            company_id, team_id, engagement)
         data = {'tasks': task_codes}
-        result = self.put(url, data)
-        return result
+        return self.call('assign_engagement', company_id, team_id,
+                         engagement, data=data)
 
     def update_batch_tasks(self, company_id, csv_data):
         """
@@ -399,6 +410,4 @@ class Task(Namespace):
 
         """
         data = {'data': csv_data}
-        url = 'tasks/companies/{0}/tasks/batch'.format(company_id)
-
-        return self.put(url, data)
+        return self.call('update_batch_tasks', company_id, data=data)
@@ -3,6 +3,7 @@
 # (C) 2010-2014 oDesk
 
 from odesk.namespaces import Namespace
+from odesk.endpoints import Endpoint
 from odesk.utils import assert_parameter
 
 
@@ -13,6 +14,20 @@ class Team(Namespace):
 
     TZ_CHOICES = ('mine', 'user', 'gmt')
 
+    ENDPOINTS = (
+        Endpoint('get_snapshot', 'snapshots/{0}/{1}'),
+        Endpoint('get_snapshot_at', 'snapshots/{0}/{1}/{2}'),
+        Endpoint('update_snapshot', 'snapshots/{0}/{1}', method='PUT',
+                 params=('memo',)),
+        Endpoint('update_snapshot_at', 'snapshots/{0}/{1}/{2}', method='PUT',
+                 params=('memo',)),
+        Endpoint('delete_snapshot', 'snapshots/{0}/{1}', method='DELETE'),
+        Endpoint('delete_snapshot_at', 'snapshots/{0}/{1}/{2}',
+                 method='DELETE'),
+        Endpoint('get_workdiaries', 'workdiaries/{0}/{1}'),
+        Endpoint('get_workdiaries_on', 'workdiaries/{0}/{1}/{2}'),
+    )
+
     def get_snapshot(self, company_id, user_id, datetime=None):
         """
         Retrieve a company's user snapshots during given time or 'now'.
@@ -30,11 +45,11 @@ class Team(Namespace):
                         seconds after epoch)
 
         """
-        url = 'snapshots/{0}/{1}'.format(company_id, user_id)
         if datetime:   # date could be a list or a range also
-            url = '{0}/{1}'.format(url, datetime.isoformat())
-
-        result = self.get(url)
+            result = self.call('get_snapshot_at', company_id, user_id,
+                               datetime.isoformat())
+        else:
+            result = self.call('get_snapshot', company_id, user_id)
         if 'snapshot' in result:
             snapshot = result['snapshot']
         else:
@@ -71,10 +86,11 @@ class Team(Namespace):
                             ``20081205T090351Z;20081405T090851Z;20081705T091853Z``
 
         """
-        url = 'snapshots/{0}/{1}'.format(company_id, user_id)
         if datetime:
-            url = '{0}/{1}'.format(url, datetime.isoformat())
-        return self.put(url, {'memo': memo})
+            return self.call('update_snapshot_at', company_id, user_id,
+                             datetime.isoformat(), data={'memo': memo})
+        return self.call('update_snapshot', company_id, user_id,
+                         data={'memo': memo})
 
     def delete_snapshot(self, company_id, user_id, datetime=None):
         """
@@ -102,10 +118,10 @@ class Team(Namespace):
                             20081205T090351Z;20081405T090851Z;20081705T091853Z
 
         """
-        url = 'snapshots/{0}/{1}'.format(company_id, user_id)
         if datetime:
-            url = '{0}/{1}'.format(url, datetime.isoformat())
-        return self.delete(url)
+            return self.call('delete_snapshot_at', company_id, user_id,
+                             datetime.isoformat())
+        return self.call('delete_snapshot', company_id, user_id)
 
     def get_workdiaries(self, team_id, username, date=None, tz=None):
         """
@@ -126,10 +142,10 @@ class Team(Namespace):
                           * 'gmt'
 
         """
-        url = 'workdiaries/{0}/{1}'.format(team_id, username)
         if date:
-            url = '{0}/{1}'.format(url, date)
-        result = self.get(url)
+            result = self.call('get_workdiaries_on', team_id, username, date)
+        else:
+            result = self.call('get_workdiaries', team_id, username)
         if 'error' in result:
             return result
 
@@ -154,6 +170,14 @@ class Team_V2(Namespace):
     ONLINE_CHOICES = ('now', 'last_24h', 'all')
     DISABLED_CHOICES = ('yes', 'no')
 
+    ENDPOINTS = (
+        Endpoint('get_teamrooms', 'teamrooms'),
+        Endpoint('get_snapshots', 'teamrooms/{0}',
+                 params=('online', 'disabled'),
+                 choices={'online': ONLINE_CHOICES,
+                          'disabled': DISABLED_CHOICES}),
+    )
+
     def get_teamrooms(self):
         """
         Retrieve all teamrooms accessible to the authenticated user.
@@ -162,9 +186,7 @@ class Team_V2(Namespace):
           :target_version:      Version of future requested API
 
         """
-        url = 'teamrooms'
-
-        result = self.get(url)
+        result = self.call('get_teamrooms')
 
         if 'error' in result:
             return result
@@ -198,19 +220,15 @@ class Team_V2(Namespace):
                                  * 'yes'
 
         """
-        url = 'teamrooms/{0}'.format(company_or_team_id)
-
         data = {}
 
         if online:
-            assert_parameter('online', online, self.ONLINE_CHOICES)
             data['online'] = online
 
         if disabled:
-            assert_parameter('disabled', disabled, self.ONLINE_CHOICES)
             data['disabled'] = disabled
 
-        result = self.get(url, data)
+        result = self.call('get_snapshots', company_or_team_id, data=data)
         if 'error' in result:
             return result
 
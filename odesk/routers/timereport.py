@@ -3,12 +3,27 @@
 # (C) 2010-2014 oDesk
 
 from odesk.namespaces import GdsNamespace
+from odesk.endpoints import Endpoint
 
 
 class TimeReport(GdsNamespace):
     api_url = 'timereports/'
     version = 1
 
+    ENDPOINTS = (
+        Endpoint('get_provider_report', 'providers/{0}', params=('tq',)),
+        Endpoint('get_provider_hours', 'providers/{0}/hours', params=('tq',)),
+        Endpoint('get_company_report', 'companies/{0}', params=('tq',)),
+        Endpoint('get_company_hours', 'companies/{0}/hours', params=('tq',)),
+        Endpoint('get_team_report', 'companies/{0}/teams/{1}', params=('tq',)),
+        Endpoint('get_team_hours',
+                 'companies/{0}/teams/{1}/hours', params=('tq',)),
+        Endpoint('get_agency_report',
+                 'companies/{0}/agencies/{1}', params=('tq',)),
+        Endpoint('get_agency_hours',
+                 'companies/{0}/agencies/{1}/hours', params=('tq',)),
+    )
+
     def get_provider_report(self, provider_id, query, hours=False):
         """
         Get caller's specific time report.
@@ -24,12 +39,11 @@ class TimeReport(GdsNamespace):
                           and hides all financial details
                           Default: ``False``
         """
-        url = 'providers/{0}'.format(provider_id)
         if hours:
-            url = '{0}/hours'.format(url)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+            return self.call('get_provider_hours', provider_id,
+                             data={'tq': str(query)})
+        return self.call('get_provider_report', provider_id,
+                         data={'tq': str(query)})
 
     def get_company_report(self, company_id, query, hours=False):
         """
@@ -49,12 +63,11 @@ class TimeReport(GdsNamespace):
                           Default: ``False``
 
         """
-        url = 'companies/{0}'.format(company_id)
         if hours:
-            url = '{0}/hours'.format(url)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+            return self.call('get_company_hours', company_id,
+                             data={'tq': str(query)})
+        return self.call('get_company_report', company_id,
+                         data={'tq': str(query)})
 
     def get_team_report(self, company_id, team_id, query, hours=False):
         """
@@ -72,12 +85,11 @@ class TimeReport(GdsNamespace):
                           Default: ``False``
 
         """
-        url = 'companies/{0}/teams/{1}'.format(company_id, team_id)
         if hours:
-            url = '{0}/hours'.format(url)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+            return self.call('get_team_hours', company_id, team_id,
+                             data={'tq': str(query)})
+        return self.call('get_team_report', company_id, team_id,
+                         data={'tq': str(query)})
 
     def get_agency_report(self, company_id, agency_id, query, hours=False):
         """
@@ -95,9 +107,8 @@ class TimeReport(GdsNamespace):
                           Default: ``False``
 
         """
-        url = 'companies/{0}/agencies/{1}'.format(company_id, agency_id)
         if hours:
-            url = '{0}/hours'.format(url)
-        tq = str(query)
-        result = self.get(url, data={'tq': tq})
-        return result
+            return self.call('get_agency_hours', company_id, agency_id,
+                             data={'tq': str(query)})
+        return self.call('get_agency_report', company_id, agency_id,
+                         data={'tq': str(query)})
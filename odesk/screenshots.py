@@ -0,0 +1,352 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Bulk download of snapshot screenshots.
+
+Snapshot records returned by :py:meth:`odesk.routers.team.Team.get_snapshot`,
+:py:meth:`odesk.routers.team.Team_V2.get_snapshots` and
+:py:meth:`odesk.routers.team.Team.get_workdiaries` only refer to images,
+:py:class:`ScreenshotDownloader` fetches them over the client's connection
+pool, several at a time, streaming every image straight to disk.
+
+Completed files are recorded in a manifest, so a repeated run skips them
+and an interrupted download continues from where it stopped.
+
+*Example:*::
+
+  client = Client(public_key, secret_key, token, token_secret,
+                  pool_maxsize=8)
+  downloader = ScreenshotDownloader(client, 'archive/', concurrency=8)
+  snapshots = workdiary_snapshots(client, team_id, username,
+                                  date(2013, 5, 1), date(2013, 5, 31))
+  downloader.download(snapshots)
+
+"""
+
+import os
+import json
+import socket
+import hashlib
+import logging
+import datetime
+import threading
+import posixpath
+from Queue import Queue
+from urlparse import urlparse
+
+from urllib3.exceptions import HTTPError as Urllib3Error
+
+from odesk.exceptions import ApiValueError
+
+
+__all__ = ['ScreenshotDownloader', 'workdiary_snapshots']
+
+
+MANIFEST = 'manifest.jsonl'
+
+
+def workdiary_snapshots(client, team_id, username, since, until):
+    """Yield snapshot records of the team member's workdiaries
+    from ``since`` till ``until`` date inclusive.
+
+    Raises :py:class:`odesk.exceptions.ApiValueError` if the workdiary
+    of a day is returned as an error, so an archive doesn't silently
+    miss the day.
+
+    """
+    day = since
+    while day <= until:
+        result = client.team.get_workdiaries(team_id, username,
+                                             day.strftime('%Y%m%d'))
+        if not isinstance(result, tuple):
+            raise ApiValueError(
+                'Failed to get workdiary of {0} on {1}: {2}'.format(
+                    username, day, result.get('error', result)))
+        for snapshot in result[1]:
+            if isinstance(snapshot, dict):
+                yield snapshot
+        day += datetime.timedelta(days=1)
+
+
+class ScreenshotDownloader(object):
+    """Download images referred by snapshot records.
+
+    *Parameters:*
+      :client:        :py:class:`odesk.Client` whose connection pool
+                      is used
+
+      :directory:     Directory the images are saved to
+
+      :concurrency:   (optional, default ``4``)
+                      Number of images downloaded at once, the client's
+                      ``pool_maxsize`` should be at least as big
+
+      :fields:        (optional, default
+                      ``('screenshot_img', 'screenshot_img_thmb')``)
+                      Snapshot fields with image urls
+
+      :verify:        (optional, default ``'size'``)
+                      How files already on disk are checked: ``'size'``
+                      compares the length, ``'hash'`` also the SHA-1
+                      of the content
+
+      :sign:          (optional, default ``False``)
+                      Whether to sign image requests with oAuth, the
+                      urls returned by the API are usually public
+
+    Counters ``downloaded``, ``skipped``, ``resumed`` and
+    ``bytes_written`` are updated as files are processed, failed urls
+    are collected in ``failed``.
+
+    """
+
+    CHUNK_SIZE = 2 ** 16
+
+    def __init__(self, client, directory, concurrency=4,
+                 fields=('screenshot_img', 'screenshot_img_thmb'),
+                 verify='size', sign=False):
+        assert verify in ('size', 'hash'), "verify must be 'size' or 'hash'"
+        self.client = client
+        self.directory = directory
+        self.concurrency = concurrency
+        self.fields = fields
+        self.verify = verify
+        self.sign = sign
+        self.downloaded = 0
+        self.skipped = 0
+        self.resumed = 0
+        self.bytes_written = 0
+        self.failed = []
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        manifest = {}
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return manifest
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Line cut by an interruption
+                    continue
+                manifest[entry['path']] = entry
+        return manifest
+
+    def _record(self, entry):
+        with self._lock:
+            self.manifest[entry['path']] = entry
+            with open(os.path.join(self.directory, MANIFEST), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def path_of(self, snapshot, field):
+        """Return path of the image relative to ``directory``."""
+        url = snapshot[field]
+        user = snapshot.get('uid') or snapshot.get('user_id') or 'unknown'
+        stamp = snapshot.get('time') or \
+            hashlib.sha1(url).hexdigest()[:16]
+        ext = posixpath.splitext(urlparse(url).path)[1] or '.jpg'
+        name = '{0}_{1}{2}'.format(stamp, field, ext)
+        return os.path.join(*[part.replace('/', '_').replace('\\', '_')
+                              for part in (str(user), str(name))])
+
+    def jobs(self, snapshots):
+        """Yield ``(url, path)`` pairs of images of the snapshots."""
+        for snapshot in snapshots:
+            for field in self.fields:
+                if snapshot.get(field):
+                    yield snapshot[field], self.path_of(snapshot, field)
+
+    def _hash_file(self, path):
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), ''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _urlopen(self, url, headers):
+        if self.sign:
+            return self.client.urlopen(url, headers=headers,
+                                       preload_content=False)
+        return self.client.http.urlopen('GET', url, headers=headers,
+                                        preload_content=False)
+
+    def _content_length(self, url):
+        """Return length of the image on the server or ``None``."""
+        response = self.client.http.urlopen('HEAD', url)
+        length = response.headers.get('content-length')
+        if response.status != 200 or length is None:
+            return None
+        return int(length)
+
+    def _discard(self, response):
+        """Read the unused body so the connection goes back to the pool
+        clean.
+
+        """
+        try:
+            response.read()
+        finally:
+            response.release_conn()
+
+    def _expected_size(self, response, offset):
+        """Return full size of the image the response delivers or
+        ``None`` if the server didn't tell.
+
+        """
+        content_range = response.headers.get('content-range')
+        if response.status == 206 and content_range:
+            # bytes 100-199/200
+            total = content_range.rsplit('/', 1)[-1]
+            if total.isdigit():
+                return int(total)
+        length = response.headers.get('content-length')
+        if length is None:
+            return None
+        return offset + int(length)
+
+    def _is_complete(self, url, path):
+        full_path = os.path.join(self.directory, path)
+        if not os.path.exists(full_path):
+            return False
+        size = os.path.getsize(full_path)
+        entry = self.manifest.get(path)
+        if entry is not None:
+            if entry['size'] != size:
+                return False
+            return self.verify == 'size' or \
+                entry['sha1'] == self._hash_file(full_path)
+        # Not in the manifest, compare with the length on the server
+        if self._content_length(url) != size:
+            return False
+        self._record({'path': path, 'url': url, 'size': size,
+                      'sha1': self._hash_file(full_path)})
+        return True
+
+    def fetch(self, url, path):
+        """Download one image unless it's complete already.
+
+        Returns ``True`` if the image was downloaded.
+
+        """
+        if self._is_complete(url, path):
+            with self._lock:
+                self.skipped += 1
+            return False
+
+        full_path = os.path.join(self.directory, path)
+        part_path = full_path + '.part'
+        directory = os.path.dirname(full_path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:   # Created by another thread
+                pass
+
+        offset = 0
+        digest = hashlib.sha1()
+        if os.path.exists(part_path):
+            offset = os.path.getsize(part_path)
+        headers = {}
+        if offset:
+            headers['Range'] = 'bytes={0}-'.format(offset)
+
+        response = self._urlopen(url, headers)
+        if response.status == 416 and offset:
+            self._discard(response)
+            if self._content_length(url) == offset:
+                # Interrupted after the last write, before the rename
+                os.rename(part_path, full_path)
+                self._record({'path': path, 'url': url, 'size': offset,
+                              'sha1': self._hash_file(full_path)})
+                with self._lock:
+                    self.downloaded += 1
+                    self.resumed += 1
+                return True
+            # Part doesn't match the image on the server, start over
+            os.remove(part_path)
+            offset = 0
+            response = self._urlopen(url, {})
+        if response.status == 206 and offset:
+            mode = 'ab'
+            with open(part_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.CHUNK_SIZE), ''):
+                    digest.update(chunk)
+            with self._lock:
+                self.resumed += 1
+        elif response.status == 200:
+            mode = 'wb'
+            offset = 0
+        else:
+            self._discard(response)
+            raise Urllib3Error('Failed to download {0}: HTTP {1}'.format(
+                url, response.status))
+
+        expected = self._expected_size(response, offset)
+        written = 0
+        with open(part_path, mode) as f:
+            for chunk in response.stream(self.CHUNK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+                written += len(chunk)
+        if expected is not None and offset + written != expected:
+            # Connection closed early, the next run resumes the part
+            raise Urllib3Error(
+                'Failed to download {0}: got {1} of {2} bytes'.format(
+                    url, offset + written, expected))
+        os.rename(part_path, full_path)
+        self._record({'path': path, 'url': url, 'size': offset + written,
+                      'sha1': digest.hexdigest()})
+        with self._lock:
+            self.downloaded += 1
+            self.bytes_written += written
+        return True
+
+    def download(self, snapshots):
+        """Download images of all ``snapshots``.
+
+        Returns number of images downloaded, failures don't stop the
+        others and are collected in ``failed``.
+
+        """
+        queue = Queue(self.concurrency * 2)
+        logger = logging.getLogger('python-odesk')
+        downloaded = [0]
+
+        def worker():
+            while True:
+                job = queue.get()
+                if job is None:
+                    return
+                url, path = job
+                try:
+                    if self.fetch(url, path):
+                        with self._lock:
+                            downloaded[0] += 1
+                except (Urllib3Error, socket.error, IOError, OSError), e:
+                    logger.debug('Failed to download {0}: {1}'.format(
+                        url, e))
+                    with self._lock:
+                        self.failed.append((url, e))
+
+        threads = [threading.Thread(target=worker)
+                   for i in xrange(self.concurrency)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            seen = set()
+            for url, path in self.jobs(snapshots):
+                if path not in seen:
+                    seen.add(path)
+                    queue.put((url, path))
+        finally:
+            for thread in threads:
+                queue.put(None)
+            for thread in threads:
+                thread.join()
+        return downloaded[0]
@@ -23,6 +23,7 @@ from odesk.http import ODESK_ERROR_CODE, ODESK_ERROR_MESSAGE
 
 from nose.tools import eq_, ok_
 from mock import Mock, patch
+import os
 import urlparse
 import urllib2
 import httplib
@@ -270,6 +271,35 @@ def test_client_read():
         assert 0, "Incorrect exception raised for 500 code: " + str(e)
 
 
+def patched_urlopen_gzip(self, method, url, **kwargs):
+    import gzip
+    from StringIO import StringIO
+    from urllib3.response import HTTPResponse
+
+    assert kwargs['headers']['Accept-Encoding'] == 'gzip, deflate'
+    body = StringIO()
+    f = gzip.GzipFile(fileobj=body, mode='wb')
+    f.write(json.dumps(sample_json_dict))
+    f.close()
+    return HTTPResponse(body=StringIO(body.getvalue()),
+                        headers={'content-encoding': 'gzip'}, status=200,
+                        preload_content=kwargs['preload_content'])
+
+
+@patch('urllib3.PoolManager.urlopen', patched_urlopen_gzip)
+def test_client_read_gzip():
+    client = get_client()
+    client.CHUNK_SIZE = 16
+
+    eq_(client.read('http://test.url'), sample_json_dict)
+    eq_(client.bytes_decoded, len(json.dumps(sample_json_dict)))
+    ok_(0 < client.bytes_received < client.bytes_decoded,
+        client.bytes_received)
+
+    response = client.urlopen('http://test.url')
+    eq_(json.loads(response.data), sample_json_dict)
+
+
 def get_client():
     public_key = 'public'
     secret_key = 'secret'
@@ -635,6 +665,22 @@ def test_get_hrv2_engagements():
     eq_(hr.get_engagement(1), hr_dict[u'engagement'])
 
 
+@patch('urllib3.PoolManager.urlopen', patched_urlopen_hr)
+def test_hrv2_end_contract():
+    hr = get_client().hr
+
+    eq_(hr.end_contract(1, 'API_REAS_HIRED_DIFFERENT', 'yes',
+                        fb_scores={'fb_scores[3]': 5, 'fb_scores[4]': 4},
+                        fb_comment='ok'), hr_dict)
+    eq_(hr.client.last_data['fb_scores[3]'], 5)
+    try:
+        hr.end_contract(1, 'API_REAS_HIRED_DIFFERENT', 'yes',
+                        fb_scores={'fb_score': 5})
+        raise Exception('Unknown parameter should raise ApiValueError')
+    except ApiValueError:
+        pass
+
+
 adjustments = {u'adjustment': {u'reference': '100'}}
 
 
@@ -1459,3 +1505,1593 @@ def test_decimal_default():
 
     eq_('{"value": "10"}', json.dumps({'value': Decimal(value)},
                                       default=decimal_default))
+
+
+def test_query_rendering():
+    from datetime import date
+    from odesk.utils import Q, Query
+
+    where = (Q('worked_on') >= date(2013, 5, 1)) & (Q('team_id') != 'a') & \
+        ~Q('provider_id').in_(['b', u'c'])
+    query = Query(select=['worked_on', 'hours'], where=where,
+                  order_by=['worked_on'])
+    rendered = "SELECT worked_on, hours WHERE " \
+        "((worked_on >= '2013-05-01') AND (team_id <> 'a')) AND " \
+        "(NOT (provider_id IN ('b', 'c'))) ORDER BY worked_on"
+    eq_(str(query), rendered)
+    ok_(str(query) is str(query))
+
+    # Cached rendering follows in place changes
+    query.select.append('task')
+    ok_(str(query).startswith('SELECT worked_on, hours, task WHERE'))
+
+
+def test_query_normalize():
+    from datetime import date, datetime
+    from odesk.utils import Q, Query
+
+    where = (Q('worked_on') >= date(2013, 5, 1)) & (Q('a') == 1) & \
+        ((Q('worked_on') > date(2013, 5, 3)) &
+         (Q('worked_on') < date(2013, 6, 1))) & (Q('a') == 1)
+    eq_(str(where.normalize()),
+        "((a = 1) AND (worked_on <= '2013-05-31')) AND "
+        "(worked_on >= '2013-05-04')")
+
+    where = (Q('team_id') == 'b') | (Q('team_id') == 'a') | \
+        ((Q('date') >= date(2013, 1, 1)) & (Q('date') <= date(2013, 1, 9))) | \
+        ((Q('date') >= date(2013, 1, 10)) & (Q('date') <= date(2013, 1, 20)))
+    eq_(str(where.normalize()),
+        "((date <= '2013-01-20') AND (date >= '2013-01-01')) OR "
+        "(team_id IN ('a', 'b'))")
+
+    eq_(str((~~Q('x').in_([2, 1, 2])).normalize()), 'x IN (1, 2)')
+    eq_(str(Query(select=['a', 'b', 'a']).normalize()), 'SELECT a, b')
+
+    query1 = Query(select=['a', 'b'], where=(Q('x') == 1) & (Q('y') == 2))
+    query2 = Query(select=['a', 'b', 'a'],
+                   where=(Q('y') == 2) & (Q('x') == 1) & (Q('x') == 1))
+    query3 = Query(select=['b', 'a'], where=(Q('y') == 2) & (Q('x') == 1))
+    eq_(query1.fingerprint(), query2.fingerprint())
+    ok_(query1.fingerprint() != query3.fingerprint())
+
+    # Non-ASCII literals are rendered and hashed as UTF-8
+    query = Query(select=['a'], where=Q('memo') == u'caf\xe9')
+    eq_(str(query), "SELECT a WHERE memo = 'caf\xc3\xa9'")
+    eq_(len(query.fingerprint()), 40)
+
+    # Date and datetime bounds of a field are compared as days
+    where = (Q('worked_on') >= datetime(2013, 5, 1, 12)) & \
+        (Q('worked_on') >= date(2013, 5, 2))
+    eq_(str(where.normalize()), "worked_on >= '2013-05-02'")
+
+
+#======================
+# CACHE TESTS
+#======================
+def cache_report_stub(calls):
+    from datetime import date, timedelta
+    from odesk.cache import _conjuncts, _parse_date
+
+    def get_report(team_id, query):
+        calls.append(str(query))
+        bounds = [_parse_date(p.arg2) for p in _conjuncts(query.where)
+                  if p.field == 'worked_on'] or [date.today()]
+        start, end = min(bounds), max(bounds)
+        rows = []
+        while start <= end:
+            rows.append({'c': [{'v': start.strftime('%Y%m%d')},
+                               {'v': team_id}, {'v': '1'}]})
+            start += timedelta(days=1)
+        return {'table': {'cols': [{'type': 'date', 'label': 'worked_on'},
+                                   {'type': 'string', 'label': 'team_id'},
+                                   {'type': 'number', 'label': 'hours'}],
+                          'rows': rows}}
+    return get_report
+
+
+def test_report_cache_subsumes_ranges():
+    from datetime import date
+    from odesk.cache import ReportCache
+
+    calls = []
+    get_report = cache_report_stub(calls)
+    cache = ReportCache(settle_days=2)
+    select = ['worked_on', 'team_id', 'hours']
+
+    def query(start, end):
+        return utils.Query(select=select,
+                           where=(utils.Q('worked_on') >= start) &
+                                 (utils.Q('worked_on') <= end))
+
+    month = cache.get_report(get_report, 'team',
+                             query(date(2013, 5, 1), date(2013, 5, 31)))
+    eq_(len(month['table']['rows']), 31)
+    eq_(len(calls), 1)
+
+    # Week is fully covered by the month
+    week = cache.get_report(get_report, 'team',
+                            query(date(2013, 5, 6), date(2013, 5, 12)))
+    eq_(len(calls), 1)
+    eq_([row['c'][0]['v'] for row in week['table']['rows']],
+        ['201305{0:02d}'.format(day) for day in range(6, 13)])
+    eq_(cache.hits, 1)
+
+    # Only the missing tail is fetched
+    cache.get_report(get_report, 'team',
+                     query(date(2013, 5, 20), date(2013, 6, 10)))
+    eq_(len(calls), 2)
+    ok_("'2013-06-01'" in calls[-1] and "'2013-06-10'" in calls[-1],
+        calls[-1])
+
+    # Different non-date predicates don't share partitions
+    cache.get_report(get_report, 'team', utils.Query(
+        select=select,
+        where=(utils.Q('worked_on') >= date(2013, 5, 6)) &
+              (utils.Q('worked_on') <= date(2013, 5, 12)) &
+              (utils.Q('team_id') == 'team')))
+    eq_(len(calls), 3)
+
+
+def test_report_cache_bypass_and_expiry():
+    from datetime import date, timedelta
+    from odesk.cache import ReportCache
+
+    calls = []
+    get_report = cache_report_stub(calls)
+    cache = ReportCache(settle_days=2, ttl=0)
+    select = ['worked_on', 'team_id', 'hours']
+    today = date.today()
+
+    # Recent partitions expire after ``ttl``
+    recent = utils.Query(select=select,
+                         where=(utils.Q('worked_on') >= today) &
+                               (utils.Q('worked_on') <= today))
+    cache.get_report(get_report, 'team', recent)
+    cache.get_report(get_report, 'team', recent)
+    eq_(len(calls), 2)
+
+    # Settled partitions are immutable
+    old = today - timedelta(days=30)
+    settled = utils.Query(select=select,
+                          where=(utils.Q('worked_on') >= old) &
+                                (utils.Q('worked_on') < old +
+                                 timedelta(days=7)))
+    eq_(len(cache.get_report(get_report, 'team',
+                             settled)['table']['rows']), 7)
+    cache.get_report(get_report, 'team', settled)
+    eq_(len(calls), 3)
+
+    # Open ranges go straight to the API
+    calls[:] = []
+    cache.get_report(get_report, 'team', utils.Query(
+        select=select, where=(utils.Q('worked_on') >= old) &
+                             (utils.Q('worked_on') <= old) |
+                             (utils.Q('hours') > 1)))
+    eq_(len(calls), 1)
+
+
+def test_report_cache_query_keyword_and_clear():
+    from datetime import date
+    from odesk.cache import ReportCache
+
+    calls = []
+    get_report = cache_report_stub(calls)
+    cache = ReportCache(settle_days=2)
+    store = cache._store
+
+    def store_and_clear(*args):
+        store(*args)
+        if len(calls) == 1:
+            # Cleared by another thread before the rows are read
+            cache.clear()
+    cache._store = store_and_clear
+
+    query = utils.Query(select=['worked_on', 'team_id', 'hours'],
+                        where=(utils.Q('worked_on') >= date(2013, 5, 1)) &
+                              (utils.Q('worked_on') <= date(2013, 5, 7)))
+    data = cache.get_report(get_report, 'team', query=query)
+    eq_(len(data['table']['rows']), 7)
+    eq_(len(calls), 2)
+    cache.get_report(get_report, 'team', query)
+    eq_(len(calls), 2)
+    eq_((cache.hits, cache.misses), (1, 1))
+
+
+#======================
+# FUSION TESTS
+#======================
+company_timereport_dict = {u'table':
+     {u'rows':
+      [{u'c': [{u'v': u'20100513'}, {u'v': u'1'}, {u'v': u'team1'}]},
+       {u'c': [{u'v': u'20100513'}, {u'v': u'2'}, {u'v': u'team2'}]},
+       {u'c': [{u'v': u'20100514'}, {u'v': u'3'}, {u'v': u'team1'}]}],
+      u'cols':
+      [{u'type': u'date', u'label': u'worked_on'},
+       {u'type': u'number', u'label': u'hours'},
+       {u'type': u'string', u'label': u'team_id'}]}}
+
+
+def test_team_report_batch_fusion():
+    from odesk.fusion import TeamReportBatch
+
+    timereport = Mock()
+    timereport.get_company_report.return_value = company_timereport_dict
+    timereport.get_team_report.return_value = timereport_dict
+    query = utils.Query(select=['worked_on', 'hours'],
+                        where=(utils.Q('worked_on') > '2010-05-01'))
+
+    batch = TeamReportBatch(timereport)
+    for team_id in ('team1', 'team2', 'team3', 'team5', 'team1'):
+        batch.add('company', team_id, query)
+    batch.add('other', 'team4', query)
+    team1, team2, team3, team5, team1_again, team4 = batch.execute()
+
+    eq_(timereport.get_company_report.call_count, 1)
+    company_id, fused_query = timereport.get_company_report.call_args[0]
+    eq_(company_id, 'company')
+    eq_(fused_query.select, ['worked_on', 'hours', 'team_id'])
+    eq_(team1['table']['cols'], company_timereport_dict['table']['cols'][:2])
+    eq_(team1['table']['rows'], [{'c': [{'v': u'20100513'}, {'v': u'1'}]},
+                                 {'c': [{'v': u'20100514'}, {'v': u'3'}]}])
+    eq_(len(team2['table']['rows']), 1)
+    eq_(team3['table']['rows'], [])
+    # Results don't share tables
+    team3['table']['rows'].append('changed')
+    eq_(team5['table']['rows'], [])
+    team1['table']['rows'].pop()
+    eq_(len(team1_again['table']['rows']), 2)
+    team2['table']['cols'].pop()
+    team3['table']['cols'][0]['label'] = 'changed'
+    eq_(team5['table']['cols'], team1['table']['cols'])
+    eq_(team1['table']['cols'][0]['label'], 'worked_on')
+    # Single team of a company goes straight to the team report
+    eq_(team4, timereport_dict)
+    timereport.get_team_report.assert_called_once_with(
+        'other', 'team4', query, hours=False)
+    eq_(len(batch), 0)
+
+    # Empty company report keeps its columns, no None team
+    from odesk.fusion import split_by_team
+    empty = {'table': {'cols': company_timereport_dict['table']['cols'],
+                       'rows': []}}
+    eq_(split_by_team(empty), {})
+    timereport.get_company_report.return_value = empty
+    batch.add('company', 'team1', query)
+    batch.add('company', 'team2', query)
+    eq_(batch.execute()[0]['table']['cols'],
+        company_timereport_dict['table']['cols'][:2])
+
+
+def test_team_report_batch_fallback():
+    from odesk.fusion import TeamReportBatch
+
+    timereport = Mock()
+    timereport.get_company_report.side_effect = HTTP403ForbiddenError(
+        'http://test.url', httplib.FORBIDDEN, 'Forbidden', {}, None)
+    timereport.get_team_report.return_value = timereport_dict
+    query = utils.Query(select=['worked_on', 'hours'])
+
+    batch = TeamReportBatch(timereport)
+    batch.add('company', 'team1', query)
+    batch.add('company', 'team2', query)
+    eq_(batch.execute(), [timereport_dict, timereport_dict])
+    eq_(timereport.get_team_report.call_count, 2)
+    ok_('company' in batch.denied_companies)
+
+    # Denied company is not fused anymore
+    batch.add('company', 'team1', query)
+    batch.add('company', 'team2', query)
+    batch.execute()
+    eq_(timereport.get_company_report.call_count, 1)
+
+
+#======================
+# WAREHOUSE TESTS
+#======================
+def test_warehouse_sync_timereports():
+    from datetime import date
+    from odesk.warehouse import Warehouse
+
+    calls = []
+
+    def get_company_report(company_id, query):
+        calls.append(str(query))
+        return {'table': {
+            'cols': [{'type': 'date', 'label': 'worked_on'},
+                     {'type': 'string', 'label': 'team_id'},
+                     {'type': 'string', 'label': 'team_name'},
+                     {'type': 'string', 'label': 'task'},
+                     {'type': 'number', 'label': 'hours'}],
+            'rows': [{'c': [{'v': '20130502'}, {'v': 'team1'},
+                            {'v': 'Team 1'}, {'v': 'task'}, {'v': '1.5'}]},
+                     {'c': [{'v': '20130503'}, {'v': 'team2'},
+                            {'v': 'Team 2'}, {'v': 'task'},
+                            {'v': '2'}]}]}}
+
+    warehouse = Warehouse(chunk_days=10, overlap_days=2)
+    synced = warehouse.sync_timereports(get_company_report, 'company',
+                                        since=date(2013, 5, 1),
+                                        until=date(2013, 5, 25))
+    eq_(synced, 6)
+    eq_(len(calls), 3)
+    ok_("(worked_on >= '2013-05-21')" in calls[-1], calls[-1])
+    eq_(warehouse.cursors().values(), [date(2013, 5, 25)])
+
+    # Resumed sync refetches overlap only, same rows are upserted
+    warehouse.sync_timereports(get_company_report, 'company',
+                               since=date(2013, 5, 1),
+                               until=date(2013, 5, 26))
+    eq_(len(calls), 4)
+    ok_("(worked_on >= '2013-05-23')" in calls[-1], calls[-1])
+    # Synced scope resumes from its cursor without since
+    warehouse.sync_timereports(get_company_report, 'company',
+                               until=date(2013, 5, 27))
+    eq_(len(calls), 5)
+    ok_("(worked_on >= '2013-05-24')" in calls[-1], calls[-1])
+    try:
+        warehouse.sync_timereports(get_company_report, 'other')
+        raise Exception('Scope never synced needs since')
+    except ApiValueError:
+        pass
+    eq_(warehouse.query(
+        'SELECT team_name, SUM(hours) AS hours FROM timereports '
+        'GROUP BY team_name ORDER BY team_name'),
+        [{'team_name': 'Team 1', 'hours': 1.5},
+         {'team_name': 'Team 2', 'hours': 2.0}])
+
+    # Rows deleted on the server are dropped from the refetched range
+    deleted = []
+
+    def get_team_report(company_id, team_id, query, hours=False):
+        rows = [{'c': [{'v': '20130502'}, {'v': 'team1'}, {'v': 'kept'},
+                       {'v': '1'}]}]
+        if not deleted:
+            rows.append({'c': [{'v': '20130503'}, {'v': 'team1'},
+                               {'v': 'other'}, {'v': '2'}]})
+        return {'table': {
+            'cols': [{'type': 'date', 'label': 'worked_on'},
+                     {'type': 'string', 'label': 'team_id'},
+                     {'type': 'string', 'label': 'task'},
+                     {'type': 'number', 'label': 'hours'}],
+            'rows': rows}}
+
+    warehouse.sync_timereports(get_team_report, 'company', 'team1',
+                               since=date(2013, 5, 1),
+                               until=date(2013, 5, 3), hours=True)
+    deleted.append(True)
+    warehouse.sync_timereports(get_team_report, 'company', 'team1',
+                               since=date(2013, 5, 1),
+                               until=date(2013, 5, 3), hours=True)
+    eq_(warehouse.query('SELECT task FROM timereports WHERE scope LIKE ?',
+                        ['%team1?hours=True']), [{'task': 'kept'}])
+    # Other scopes and report variants keep their rows and cursors
+    eq_(len(warehouse.query('SELECT * FROM timereports')), 3)
+    eq_(len(warehouse.cursors()), 2)
+
+
+def test_warehouse_sync_finreports():
+    from datetime import date
+    from odesk.warehouse import Warehouse
+
+    def get_provider_billings(provider_id, query):
+        return {'table': {
+            'cols': [{'type': 'string', 'label': 'reference'},
+                     {'type': 'date', 'label': 'date'},
+                     {'type': 'number', 'label': 'amount'}],
+            'rows': [{'c': [{'v': '1'}, {'v': '20130502'},
+                            {'v': '10.25'}]},
+                     {'c': [{'v': '2'}, {'v': '20130503'},
+                            {'v': '-1.25'}]}]}}
+
+    warehouse = Warehouse()
+    warehouse.sync_finreports(get_provider_billings, 'provider',
+                              since=date(2013, 5, 1),
+                              until=date(2013, 5, 3))
+    warehouse.sync_finreports(get_provider_billings, 'provider',
+                              since=date(2013, 5, 1),
+                              until=date(2013, 5, 3))
+    eq_(warehouse.query('SELECT reference, amount FROM finreports '
+                        'WHERE date >= ? ORDER BY reference', ['20130501']),
+        [{'reference': '1', 'amount': 10.25},
+         {'reference': '2', 'amount': -1.25}])
+
+
+#======================
+# EXPORT TESTS
+#======================
+def test_export_report():
+    import gzip
+    import shutil
+    import tempfile
+    from datetime import date
+    from odesk.export import iter_report, export_report
+
+    calls = []
+
+    def get_provider_report(provider_id, query):
+        calls.append(str(query))
+        return {'table': {'cols': timereport_dict['table']['cols'][:3],
+                          'rows': [{'c': row['c'][:3]} for row in
+                                   timereport_dict['table']['rows']]}}
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = directory + '/report.csv.gz'
+        chunks = iter_report(get_provider_report, ['provider'],
+                             ['worked_on', 'assignment_team_id', 'hours'],
+                             'worked_on', since=date(2013, 5, 1),
+                             until=date(2013, 5, 10), chunk_days=7)
+        eq_(export_report(chunks, path), 2)
+        eq_(len(calls), 2)
+        eq_(gzip.open(path).read().splitlines(),
+            ['worked_on,assignment_team_id,hours',
+             '20100513,company1:team1,1',
+             '20100513,company1:team1,1'])
+
+        path = directory + '/report.jsonl'
+        chunks = iter_report(get_provider_report, ['provider'],
+                             ['worked_on', 'assignment_team_id', 'hours'],
+                             'worked_on', since=date(2013, 5, 1),
+                             until=date(2013, 5, 1))
+        eq_(export_report(chunks, path), 1)
+        eq_(json.loads(open(path).read()),
+            {'worked_on': '20100513', 'assignment_team_id': 'company1:team1',
+             'hours': '1'})
+
+        try:
+            export_report([], directory + '/report.xml')
+            raise Exception('Unknown format should raise ApiValueError')
+        except ApiValueError:
+            pass
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_export_converters():
+    from datetime import date
+    from odesk.export import CONVERTERS
+
+    eq_(CONVERTERS['number']('1.25'), 1.25)
+    eq_(CONVERTERS['number'](''), None)
+    eq_(CONVERTERS['date']('20130502'), date(2013, 5, 2))
+    eq_(CONVERTERS['date'](None), None)
+    ok_('string' not in CONVERTERS)
+
+
+def test_export_report_memory_ceiling():
+    from datetime import date
+    from odesk.export import iter_report
+    from odesk.exceptions import MemoryCeilingError
+
+    windows = []
+
+    def get_provider_report(provider_id, query):
+        windows.append(str(query))
+        if '2013-05-01' in str(query) and '2013-05-07' in str(query):
+            raise MemoryCeilingError('too large')
+        return {'table': {'cols': [{'label': 'hours'}], 'rows': []}}
+
+    chunks = list(iter_report(get_provider_report, ['provider'], ['hours'],
+                              'worked_on', since=date(2013, 5, 1),
+                              until=date(2013, 5, 7), chunk_days=7))
+    # The week is split into 3 days windows
+    eq_(len(chunks), 3)
+    eq_(len(windows), 4)
+
+    def always_too_large(provider_id, query):
+        raise MemoryCeilingError('too large')
+
+    try:
+        list(iter_report(always_too_large, ['provider'], ['hours'],
+                         'worked_on', since=date(2013, 5, 1),
+                         until=date(2013, 5, 7)))
+        raise Exception('Single day over the ceiling should raise')
+    except MemoryCeilingError:
+        pass
+
+
+#======================
+# HEDGING TESTS
+#======================
+def test_hedging_route():
+    from odesk.utils import route_of, router_of
+
+    eq_(router_of('https://www.odesk.com/gds/finreports/v2/providers/1'),
+        '/gds/finreports/v2')
+    eq_(route_of('https://www.odesk.com/gds/timereports/v1/companies/1/teams/2'
+                 '?tq=SELECT'), '/gds/timereports/v1/companies')
+    eq_(route_of('https://www.odesk.com/api/hr/v2/users/me.json'),
+        '/api/hr/v2/users')
+
+
+def test_hedged_read():
+    import time
+    import threading
+    from odesk.hedging import HedgingPolicy
+
+    calls = []
+    lock = threading.Lock()
+
+    def slow_first_urlopen(self, method, url, **kwargs):
+        with lock:
+            calls.append(method)
+            first = len(calls) == 1
+        if first:
+            time.sleep(0.5)
+        return MicroMock(data=json.dumps(sample_json_dict), status=200)
+
+    policy = HedgingPolicy(initial_delay=0.05, budget_burst=1,
+                           budget_ratio=0)
+    client = get_client()
+    client.hedging = policy
+
+    with patch('urllib3.PoolManager.urlopen', slow_first_urlopen):
+        start = time.time()
+        eq_(client.get('http://test.url/api/hr/v2/users/me'),
+            sample_json_dict)
+        ok_(time.time() - start < 0.4)
+        eq_((policy.hedged, policy.hedge_wins), (1, 1))
+        # Recorded for the calling thread, not the hedging ones
+        eq_(client.last_request.url,
+            'http://test.url/api/hr/v2/users/me.json')
+        eq_((client.last_method, client.last_data), ('GET', None))
+
+        # Budget is exhausted, no more hedges
+        del calls[:]
+        eq_(client.get('http://test.url/api/hr/v2/users/me'),
+            sample_json_dict)
+        eq_(len(calls), 1)
+
+        # Only GET requests are hedged
+        ok_(not policy.applies('http://test.url/api/hr/v2/users', 'PUT'))
+
+
+#======================
+# CIRCUIT BREAKER TESTS
+#======================
+def test_circuit_breaker():
+    import time
+    from odesk.breaker import CircuitBreaker
+    from odesk.exceptions import CircuitOpenError
+
+    breaker = CircuitBreaker(min_calls=2, reset_timeout=0.1)
+    client = get_client()
+    client.circuit_breaker = breaker
+    finreport_url = 'http://test.url/gds/finreports/v2/providers/1/billings'
+    hr_url = 'http://test.url/api/hr/v2/users/me'
+
+    # Client errors don't count
+    for i in range(3):
+        try:
+            client_read_404(client=client, url=hr_url)
+        except HTTP404NotFoundError:
+            pass
+    eq_(breaker.state(hr_url), 'closed')
+
+    for i in range(2):
+        try:
+            client_read_500(client=client, url=finreport_url)
+        except urllib2.HTTPError, e:
+            eq_(e.code, httplib.INTERNAL_SERVER_ERROR)
+    eq_(breaker.states(), {'/api/hr/v2': 'closed',
+                           '/gds/finreports/v2': 'open'})
+
+    try:
+        client_read_500(client=client, url=finreport_url)
+        raise Exception('Open circuit should fail fast')
+    except CircuitOpenError:
+        pass
+
+    with patch('urllib3.PoolManager.urlopen', patched_urlopen):
+        eq_(client.read(hr_url), sample_json_dict)
+        time.sleep(0.1)
+        eq_(breaker.state(finreport_url), 'half_open')
+        # Successful probe closes the circuit
+        eq_(client.read(finreport_url), sample_json_dict)
+        eq_(breaker.state(finreport_url), 'closed')
+
+
+#======================
+# TRANSPORT TESTS
+#======================
+def test_pool_prewarm_and_reap():
+    import socket
+    from odesk.transport import PoolManager, start_reaper
+
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(5)
+    url = 'http://127.0.0.1:{0}/'.format(server.getsockname()[1])
+    try:
+        manager = PoolManager(maxsize=3)
+        eq_(manager.prewarm(url, 2), 2)
+        pool = manager.connection_from_url(url)
+        eq_(pool.num_connections, 2)
+        # Connected ones are handed out first
+        conn = pool._get_conn()
+        ok_(conn.sock is not None)
+        pool._put_conn(conn)
+
+        eq_(manager.reap_idle(60), 0)
+        eq_(manager.reap_idle(-1), 2)
+        eq_(manager.reap_idle(-1), 0)
+        eq_(pool.pool.qsize(), 3)
+
+        # Prewarming doesn't hold the slots, a connection taken
+        # meanwhile leaves the rest to prewarm
+        conn = pool._get_conn()
+        eq_(manager.prewarm(url, 5), 2)
+        pool._put_conn(conn)
+        eq_(pool.pool.qsize(), 3)
+
+        # Clients sharing the manager share its reaper
+        ok_(start_reaper(manager, 60) is start_reaper(manager, 30))
+    finally:
+        server.close()
+
+
+def test_tls_session_cache():
+    import ssl
+    from odesk import transport
+    from odesk.transport import PoolManager, TLSSessionCache
+
+    cache = TLSSessionCache()
+    context = cache.context(ssl.CERT_NONE, ssl_version=ssl.PROTOCOL_SSLv23)
+    ok_(cache.context(ssl.CERT_NONE,
+                      ssl_version=ssl.PROTOCOL_SSLv23) is context)
+    ok_(cache.context(ssl.CERT_NONE,
+                      ssl_version=ssl.PROTOCOL_TLSv1) is not context)
+
+    session = object()
+    context = Mock()
+    context.wrap_socket.side_effect = [
+        MicroMock(session=session, session_reused=False),
+        MicroMock(session=session, session_reused=True)]
+    with patch.object(transport, 'HAS_SESSIONS', True):
+        cache.wrap_socket('sock', context, 'www.odesk.com')
+        cache.wrap_socket('sock', context, 'www.odesk.com')
+    ok_(cache.session is session)
+    ok_(context.wrap_socket.call_args[1]['session'] is session)
+    eq_((cache.full_handshakes, cache.resumed_handshakes), (1, 1))
+
+    manager = PoolManager()
+    pool = manager.connection_from_url('https://www.odesk.com/')
+    conn = pool._new_conn()
+    ok_(isinstance(conn, transport.VerifiedHTTPSConnection))
+    ok_(conn.tls_sessions is pool.tls_sessions)
+    eq_(manager.tls_stats(), {'full_handshakes': 0, 'resumed_handshakes': 0})
+
+
+def test_dns_cache():
+    import time
+    import socket
+    from odesk.resolver import DNSCache
+    from odesk.transport import PoolManager
+
+    lookups = []
+
+    def lookup(host, port):
+        lookups.append(host)
+        if host == 'missing.odesk.com':
+            raise socket.gaierror(-2, 'Name or service not known')
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+                 ('127.0.0.1', port))]
+
+    cache = DNSCache(ttl=60, negative_ttl=60, refresh_ahead=None)
+    cache._lookup = lookup
+    for i in range(3):
+        eq_(cache.getaddrinfo('www.odesk.com', 443)[0][4],
+            ('127.0.0.1', 443))
+        try:
+            cache.getaddrinfo('missing.odesk.com', 443)
+            raise Exception('Lookup should fail')
+        except socket.gaierror:
+            pass
+    eq_(lookups, ['www.odesk.com', 'missing.odesk.com'])
+    eq_(cache.stats(), {'hits': 2, 'negative_hits': 2, 'misses': 2,
+                        'refreshes': 0, 'entries': 2})
+
+    # Entries due to expire are refreshed in background
+    cache.refresh_ahead = 0
+    cache.getaddrinfo('www.odesk.com', 443)
+    time.sleep(0.1)
+    eq_(cache.refreshes, 1)
+    eq_(lookups.count('www.odesk.com'), 2)
+
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(5)
+    port = server.getsockname()[1]
+    try:
+        manager = PoolManager(resolver=cache)
+        pool = manager.connection_from_url(
+            'http://www.odesk.com:{0}/'.format(port))
+        conn = pool._new_conn()
+        conn.connect()
+        eq_(conn.sock.getpeername(), ('127.0.0.1', port))
+        conn.close()
+    finally:
+        server.close()
+
+
+#======================
+# CLIENT POOL TESTS
+#======================
+def test_fair_scheduler():
+    import time
+    import threading
+    from odesk.pool import FairScheduler, TokenBucket
+
+    bucket = TokenBucket(rate=10, burst=2)
+    eq_(bucket.reserve(), 0)
+    eq_(bucket.reserve(), 0)
+    ok_(0.09 < bucket.reserve() <= 0.1)
+
+    scheduler = FairScheduler(concurrency=1)
+    scheduler.acquire('a')
+    order = []
+
+    def request(key):
+        scheduler.acquire(key)
+        order.append(key)
+        scheduler.release()
+
+    threads = []
+    for key in ['a', 'a', 'a', 'b', 'c']:
+        thread = threading.Thread(target=request, args=(key,))
+        thread.start()
+        threads.append(thread)
+        while scheduler.waiting() < len(threads):
+            time.sleep(0.001)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+    # Waiting keys are served in turns
+    eq_(order, ['a', 'b', 'c', 'a', 'a'])
+    eq_(scheduler.served, {'a': 4, 'b': 1, 'c': 1})
+    eq_(scheduler.active, 0)
+
+
+@patch('urllib3.PoolManager.urlopen', patched_urlopen)
+def test_client_pool():
+    from odesk.pool import ClientPool
+
+    pool = ClientPool('public', 'secret', maxsize=2, team=False)
+    client = pool.client('token1', 'secret1')
+    ok_(pool.client('token1', 'secret1') is client)
+    other = pool.client('token2', 'secret2')
+    ok_(other is not client)
+    ok_(other.http is client.http is pool.http)
+    ok_(not hasattr(client, 'team'))
+    eq_(len(pool), 2)
+
+    eq_(client.read('http://test.url'), sample_json_dict)
+    eq_(other.read('http://test.url'), sample_json_dict)
+    eq_(pool.scheduler.served, {'token1': 1, 'token2': 1})
+    eq_(pool.scheduler.active, 0)
+
+    pool.close()
+    eq_(len(pool), 0)
+
+
+#======================
+# THREAD SAFETY TESTS
+#======================
+def test_client_shared_by_threads():
+    import threading
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            number = int(self.path.split('?')[0].split('/')[-1][:-5])
+            body = json.dumps({'number': number})
+            self.send_response(404 if number % 7 == 0 else 200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    url = 'http://127.0.0.1:{0}/api/echo/{1}'
+
+    client = Client('public', 'secret', 'token', 'token secret',
+                    pool_maxsize=8)
+    errors = []
+
+    def worker(thread_number):
+        for i in range(5):
+            number = thread_number * 5 + i
+            request_url = url.format(server.server_address[1], number)
+            try:
+                result = client.read(request_url)
+            except HTTP404NotFoundError, e:
+                if number % 7 or e.request.url != request_url + '.json':
+                    errors.append((number, e.request))
+            else:
+                if result != {'number': number}:
+                    errors.append((number, result))
+            if client.last_request.url != request_url + '.json':
+                errors.append((number, client.last_request))
+            # Routers are set up once for all threads
+            if client.hr is not client.hr:
+                errors.append((number, 'router'))
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(64)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.shutdown()
+        server.server_close()
+        client.http.clear()
+
+    eq_(errors, [])
+    eq_(client.bytes_received, sum(
+        len(json.dumps({'number': number})) for number in range(320)))
+    eq_(client.last_request, None)
+
+
+def _worker_token(client, item):
+    import os
+    return client.oauth_access_token, item, os.getpid()
+
+
+def test_client_pickle():
+    import cPickle as pickle
+    from odesk.hedging import HedgingPolicy
+    from odesk.resolver import DNSCache
+
+    client = Client('public', 'secret', 'token', 'token secret',
+                    team=False, pool_maxsize=3, dns_cache=DNSCache(ttl=60),
+                    hedging=HedgingPolicy(initial_delay=0.5))
+    client.hr
+    copy = pickle.loads(pickle.dumps(client, pickle.HIGHEST_PROTOCOL))
+    eq_((copy.public_key, copy.oauth_access_token_secret),
+        ('public', 'token secret'))
+    eq_(copy.pool_maxsize, 3)
+    eq_(copy.http.resolver.ttl, 60)
+    eq_(copy.hedging.initial_delay, 0.5)
+    ok_(copy.http is not client.http)
+    ok_(copy.hr is not client.hr)
+    ok_(not hasattr(copy, 'team'))
+
+
+@patch('urllib3.PoolManager.urlopen', patched_urlopen)
+def test_client_fork():
+    import os
+    from odesk.parallel import process_map
+
+    from odesk.pool import FairScheduler
+    from odesk.memory import MemoryMonitor
+    from odesk.breaker import CircuitBreaker
+    from odesk.hedging import HedgingPolicy
+
+    client = get_client()
+    http = client.http
+    pool = http.connection_from_url('http://test.url')
+    lock = client._lock
+    client.scheduler = FairScheduler(concurrency=1)
+    client.memory = MemoryMonitor()
+    client.circuit_breaker = CircuitBreaker()
+    client.hedging = HedgingPolicy()
+    # Locks and the slot held by threads of the parent at fork time
+    held = [client.buffers._lock, client.scheduler._lock,
+            client.memory._lock, client.circuit_breaker._lock,
+            client.hedging._lock]
+    for component_lock in held:
+        component_lock.acquire()
+    client.scheduler.active = 1
+    with patch('os.getpid', Mock(return_value=-1)):
+        client.read('http://test.url')
+        ok_(client._lock is not lock)
+        eq_(client.scheduler.active, 0)
+        # Pools of the parent are not reused
+        ok_(http.connection_from_url('http://test.url') is not pool)
+        ok_(client.http is http)
+    for component_lock in held:
+        component_lock.release()
+    client.scheduler = client.memory = client.circuit_breaker = \
+        client.hedging = None
+
+    results = process_map(_worker_token, range(4), client, processes=2)
+    eq_([result[:2] for result in results],
+        [('some token', item) for item in range(4)])
+    ok_(os.getpid() not in [result[2] for result in results])
+
+
+#======================
+# SCREENSHOT TESTS
+#======================
+def test_screenshot_downloader():
+    import shutil
+    import tempfile
+    import threading
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from odesk.screenshots import ScreenshotDownloader
+
+    images = dict(('/img/{0}.png'.format(i), os.urandom(5000 + i))
+                  for i in range(6))
+    images['/img/short.png'] = os.urandom(4000)
+    requests = []
+    truncated = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            requests.append((self.command, self.headers.get('Range')))
+            body = images[self.path]
+            status = 200
+            if self.headers.get('Range'):
+                offset = int(self.headers['Range'][6:-1])
+                status = 206 if offset < len(body) else 416
+                body = body[offset:]
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.command == 'GET' and self.path in truncated:
+                # Connection drops in the middle of the body
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = 1
+            elif self.command == 'GET':
+                self.wfile.write(body)
+
+        do_HEAD = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    base = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    snapshots = [{'uid': 'john', 'time': str(1370000000 + i),
+                  'screenshot_img': base + '/img/{0}.png'.format(i * 2),
+                  'screenshot_img_thmb': base + '/img/{0}.png'.format(
+                      i * 2 + 1)}
+                 for i in range(3)]
+    directory = tempfile.mkdtemp()
+    client = get_client()
+    try:
+        downloader = ScreenshotDownloader(client, directory, concurrency=3)
+        eq_(downloader.download(snapshots), 6)
+        eq_(downloader.failed, [])
+        path = os.path.join(directory, 'john',
+                            '1370000000_screenshot_img.png')
+        eq_(open(path, 'rb').read(), images['/img/0.png'])
+
+        # Completed files are skipped without requests
+        del requests[:]
+        downloader = ScreenshotDownloader(client, directory, verify='hash')
+        eq_(downloader.download(snapshots), 0)
+        eq_((downloader.skipped, requests), (6, []))
+
+        # Interrupted download continues, file missing from the manifest
+        # is checked against the length on the server
+        os.rename(path, path + '.part')
+        with open(path + '.part', 'r+b') as f:
+            f.truncate(1000)
+        os.remove(os.path.join(directory, 'manifest.jsonl'))
+        downloader = ScreenshotDownloader(client, directory)
+        eq_(downloader.download(snapshots), 1)
+        eq_((downloader.skipped, downloader.resumed), (5, 1))
+        eq_(requests.count(('GET', 'bytes=1000-')), 1)
+        eq_(open(path, 'rb').read(), images['/img/0.png'])
+        eq_(downloader.manifest['john/1370000000_screenshot_img.png']
+            ['size'], 5000)
+
+        # Complete part left by an interruption before the rename
+        # is taken as is, a part longer than the image is replaced
+        os.remove(os.path.join(directory, 'manifest.jsonl'))
+        os.rename(path, path + '.part')
+        thumbnail = os.path.join(directory, 'john',
+                                 '1370000000_screenshot_img_thmb.png')
+        with open(thumbnail + '.part', 'wb') as f:
+            f.write(images['/img/1.png'] + 'garbage')
+        os.remove(thumbnail)
+        del requests[:]
+        downloader = ScreenshotDownloader(client, directory)
+        eq_(downloader.download(snapshots), 2)
+        eq_(downloader.failed, [])
+        eq_(open(path, 'rb').read(), images['/img/0.png'])
+        eq_(open(thumbnail, 'rb').read(), images['/img/1.png'])
+        ok_(not os.path.exists(thumbnail + '.part'))
+        eq_(requests.count(('GET', None)), 1)
+
+        # Truncated body stays a part and is resumed by the next run
+        short = [{'uid': 'john', 'time': '1370000100',
+                  'screenshot_img': base + '/img/short.png'}]
+        short_path = os.path.join(directory, 'john',
+                                  '1370000100_screenshot_img.png')
+        truncated.add('/img/short.png')
+        downloader = ScreenshotDownloader(client, directory)
+        eq_(downloader.download(short), 0)
+        eq_(len(downloader.failed), 1)
+        ok_(not os.path.exists(short_path))
+        eq_(os.path.getsize(short_path + '.part'), 2000)
+        ok_('john/1370000100_screenshot_img.png' not in downloader.manifest)
+        truncated.clear()
+        del requests[:]
+        downloader = ScreenshotDownloader(client, directory)
+        eq_(downloader.download(short), 1)
+        eq_((downloader.resumed, downloader.failed), (1, []))
+        eq_(requests.count(('GET', 'bytes=2000-')), 1)
+        eq_(open(short_path, 'rb').read(), images['/img/short.png'])
+    finally:
+        server.shutdown()
+        server.server_close()
+        client.http.clear()
+        shutil.rmtree(directory)
+
+
+def test_workdiary_snapshots_error():
+    from datetime import date
+    from odesk.screenshots import workdiary_snapshots
+
+    client = Mock()
+    client.team.get_workdiaries.side_effect = [
+        ({'uid': 'john'}, [{'time': '1'}, {'time': '2'}]),
+        {'error': {'message': 'Forbidden'}}]
+    snapshots = workdiary_snapshots(client, 'team', 'john',
+                                    date(2013, 5, 1), date(2013, 5, 2))
+    eq_([next(snapshots), next(snapshots)], [{'time': '1'}, {'time': '2'}])
+    try:
+        next(snapshots)
+        raise Exception('Workdiary error should raise ApiValueError')
+    except ApiValueError:
+        pass
+
+
+#======================
+# METER TESTS
+#======================
+def test_meter_render_update():
+    from odesk_meter import render_update
+
+    eq_(render_update(['a', 'b'], ['a', 'b']), '')
+    eq_(render_update(['a', 'b'], ['a', 'c']), '\x1b[1A\x1b[Jc\n')
+    eq_(render_update(['a'], ['a', 'b']), 'b\n')
+    eq_(render_update(['a', 'b', 'c'], ['x']), '\x1b[3A\x1b[Jx\n')
+
+
+def test_meter_load_state():
+    import shutil
+    import tempfile
+    from datetime import datetime, timedelta
+    from odesk_meter import save_state, load_state, FETCHED_AT_FORMAT
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'state.json')
+    try:
+        eq_(load_state(path), None)
+
+        def saved(fetched_at):
+            save_state({'user': 'john',
+                        'fetched_at': fetched_at.strftime(FETCHED_AT_FORMAT),
+                        'teams': {'Team': {'today_hours': 1.5,
+                                           'week_hours': 10.0}}}, path)
+            return load_state(path)['teams']['Team']
+
+        now = datetime.now()
+        eq_(saved(now), {'today_hours': 1.5, 'week_hours': 10.0})
+        # Hours of the past day and week are zeroed
+        monday = now - timedelta(days=now.weekday())
+        if now.weekday():
+            eq_(saved(monday), {'today_hours': 0.0, 'week_hours': 10.0})
+        eq_(saved(monday - timedelta(days=1)),
+            {'today_hours': 0.0, 'week_hours': 0.0})
+
+        with open(path, 'w') as f:
+            f.write('{"teams": ')
+        eq_(load_state(path), None)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_meter_watch_survives_errors():
+    import odesk_meter
+    from StringIO import StringIO
+
+    outputs = [Exception('Network is unreachable'), timereport_dict]
+
+    def get_timereport(client, odesk_uid=None):
+        output = outputs.pop(0)
+        if isinstance(output, Exception):
+            raise output
+        return output
+
+    stream = StringIO()
+    # Stop watching on the sleep after the second refresh
+    sleep = Mock(side_effect=[None, KeyboardInterrupt])
+    with patch('odesk_meter.get_timereport', get_timereport):
+        with patch('odesk_meter.get_auth_user_uid',
+                   Mock(return_value='test')):
+            with patch('odesk_meter.save_state', Mock()):
+                with patch('odesk_meter.time', Mock(sleep=sleep)):
+                    try:
+                        odesk_meter.run_headless(None, as_json=True,
+                                                 watch=60, stream=stream)
+                    except KeyboardInterrupt:
+                        pass
+    lines = stream.getvalue().splitlines()
+    eq_(json.loads(lines[0]), {'error': 'Network is unreachable'})
+    ok_('teams' in json.loads(lines[1]))
+
+
+#======================
+# ROLLUP TESTS
+#======================
+def rollup_table(rows):
+    return {'table': {
+        'cols': [{'type': 'date', 'label': 'worked_on'},
+                 {'type': 'string', 'label': 'team_id'},
+                 {'type': 'string', 'label': 'task'},
+                 {'type': 'number', 'label': 'hours'}],
+        'rows': [{'c': [{'v': value} for value in row]} for row in rows]}}
+
+
+def test_rollup():
+    from odesk.rollup import Rollup
+
+    rollup = Rollup()
+    rollup.update(rollup_table(
+        [('20130527', 'team1', 'a', '0.1')] * 10 +
+        [('20130602', 'team1', 'b', '1.5'),
+         ('20130603', 'team2', 'a', 2.25),
+         ('2013-06-03', 'team2', 'a', '0.1666667')]))
+
+    eq_(rollup.sums('team_week'), {
+        ('team1', '20130527'): Decimal('2.5'),
+        ('team2', '20130603'): Decimal('2.416667')})
+    eq_(rollup.sums('team_month'), {
+        ('team1', '201305'): Decimal('1'),
+        ('team1', '201306'): Decimal('1.5'),
+        ('team2', '201306'): Decimal('2.416667')})
+    eq_(rollup.sums('team_day')[('team2', '20130603')], Decimal('2.416667'))
+    eq_(rollup.sums('task'), {('a',): Decimal('3.416667'),
+                              ('b',): Decimal('1.5')})
+    # Column is not in the table
+    eq_(rollup.sums('provider'), {})
+    eq_(rollup.total('task'), Decimal('4.916667'))
+
+    # Incremental update
+    rollup.update(rollup_table([('20130528', 'team1', 'b', '0.5')]))
+    eq_(rollup.sums('team_week')[('team1', '20130527')], Decimal('3'))
+    rollup.remove(rollup_table([('20130602', 'team1', 'b', '1.5')]))
+    eq_(rollup.sums('task')[('b',)], Decimal('0.5'))
+    eq_(rollup.rows, 13)
+
+    rollup.update({'table': {'cols': [], 'rows': ['']}})
+    eq_(rollup.rows, 13)
+    # Groups summing to zero are kept
+    rollup.remove(rollup_table([('20130528', 'team1', 'b', '0.5')]))
+    eq_(rollup.sums('task')[('b',)], Decimal('0'))
+
+    # Empty dates are grouped under None
+    rollup = Rollup()
+    rollup.update(rollup_table([(None, 'team1', 'a', '1'),
+                                ('', 'team1', 'a', '2')]))
+    eq_(rollup.sums('team_week'), {('team1', None): Decimal('3')})
+
+    # Malformed date leaves all groupings untouched
+    try:
+        rollup.update(rollup_table([('2013', 'team1', 'a', '1')]))
+        raise Exception('Malformed date should raise ValueError')
+    except ValueError:
+        pass
+    eq_(rollup.sums('task'), {('a',): Decimal('3')})
+    eq_(rollup.rows, 2)
+
+
+def test_meter_zero_hours_team():
+    from odesk_meter import get_today_and_this_week_times
+
+    data = {'table': {
+        'cols': [{'type': 'date', 'label': 'worked_on'},
+                 {'type': 'string', 'label': 'team_name'},
+                 {'type': 'number', 'label': 'hours'}],
+        'rows': [{'c': [{'v': '20130527'}, {'v': 'Idle team'},
+                        {'v': '0'}]}]}}
+    eq_(get_today_and_this_week_times(data),
+        {'Idle team': {'today_hours': 0.0, 'week_hours': 0.0}})
+
+
+def test_amount_rollup():
+    import random
+    from odesk import money
+    from odesk.money import AmountRollup, to_cents
+
+    eq_(to_cents('1234.5'), 123450)
+    eq_(to_cents('-0.07'), -7)
+    eq_(to_cents(u' 12 '), 1200)
+    eq_(to_cents('1.005'), 101)
+    eq_(to_cents('1e2'), 10000)
+    eq_(to_cents(0.1), 10)
+    eq_(to_cents(None), 0)
+    eq_(to_cents(''), 0)
+    eq_(to_cents('+1.5'), 150)
+    for malformed in ('--5', '+-1.00', '-', '1.2.3', 'NaN'):
+        try:
+            to_cents(malformed)
+            raise Exception('{0!r} should raise ApiValueError'.format(
+                malformed))
+        except ApiValueError:
+            pass
+
+    generator = random.Random(0)
+    cols = [{'type': 'string', 'label': label} for label in
+            ('buyer_team__id', 'provider_company__id', 'type', 'subtype')]
+    cols.append({'type': 'number', 'label': 'amount'})
+    rows = []
+    expected = {}
+    for i in range(2000):
+        amount = '{0:.2f}'.format(generator.uniform(-100, 1000))
+        row = ['team{0}'.format(generator.randint(1, 5)),
+               'company{0}'.format(generator.randint(1, 3)),
+               generator.choice(['Hourly', 'Bonus']),
+               generator.choice(['Regular', 'Adjustment']),
+               amount if i % 2 else float(amount)]
+        rows.append({'c': [{'v': value} for value in row]})
+        key = (row[2], row[3])
+        expected[key] = expected.get(key, Decimal(0)) + Decimal(amount)
+    data = {'table': {'cols': cols, 'rows': rows}}
+
+    modes = [False]
+    if money.numpy is not None:
+        modes.append(True)
+    for use_numpy in modes:
+        amounts = AmountRollup(use_numpy=use_numpy)
+        amounts.update(data)
+        eq_(amounts.sums('subtype'), expected)
+        eq_(amounts.total('buyer_team'), sum(expected.values()))
+        eq_(len(amounts.sums('provider_company')), 3)
+        eq_(amounts.sums('buyer_company'), {})
+
+
+#======================
+# PROFILING TESTS
+#======================
+@patch('urllib3.PoolManager.urlopen', patched_urlopen_teamrooms)
+def test_request_profiler():
+    import shutil
+    import pstats
+    import tempfile
+    from odesk import profiling
+    from odesk.profiling import RequestProfiler
+
+    eq_(profiling.from_environ({}), None)
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'odesk.prof')
+    client = get_client()
+    client.profiler = RequestProfiler(path)
+    try:
+        client.team_v2.get_snapshots(1)
+        client.team_v2.get_snapshots(2)
+        client.read('https://www.odesk.com/api/hr/v2/users/me')
+        eq_(client.profiler.calls, {'Team_V2.get_snapshots': 2,
+                                    '/api/hr/v2/users': 1})
+        ok_(client.profiler.stats('Team_V2.get_snapshots').total_calls > 0)
+
+        client.profiler.dump()
+        ok_('=== Team_V2.get_snapshots (2 calls) ===' in open(path).read())
+        ok_(pstats.Stats(path + '.pstats').total_calls > 0)
+
+        client.profiler = RequestProfiler(sample=0)
+        with patch('odesk.profiling.caller_method') as caller_method:
+            client.team_v2.get_snapshots(1)
+        eq_(client.profiler.calls, {})
+        # Unsampled calls don't walk the stack
+        eq_(caller_method.call_count, 0)
+
+        # Handler of SIGUSR1 installed before is chained
+        import signal
+        previous = Mock()
+        original = signal.signal(signal.SIGUSR1, previous)
+        try:
+            profiler = RequestProfiler(path)
+            profiler.dump = Mock()
+            with patch('atexit.register'):
+                profiler.install()
+            os.kill(os.getpid(), signal.SIGUSR1)
+            eq_(profiler.dump.call_count, 1)
+            eq_(previous.call_count, 1)
+        finally:
+            signal.signal(signal.SIGUSR1, original)
+    finally:
+        shutil.rmtree(directory)
+
+
+#======================
+# MEMORY TESTS
+#======================
+@patch('urllib3.PoolManager.urlopen', patched_urlopen_timereport_content)
+def test_memory_monitor():
+    import pickle
+    from odesk.memory import MemoryMonitor, rss, peak_rss, reset_peak
+    from odesk.exceptions import MemoryCeilingError
+
+    ok_(0 < rss() <= peak_rss())
+
+    monitor = MemoryMonitor()
+    client = get_client()
+    client.memory = monitor
+    client.timereport.get_provider_report('test', 'test')
+    record = monitor.records[-1]
+    eq_([entry['stage'] for entry in record.stages], ['body', 'json'])
+    eq_(record.rows, 1)
+    eq_(record.bytes_per_row('body'), len(json.dumps(timereport_dict)))
+    ok_('/gds/timereports/v1/providers' in monitor.report())
+
+    with monitor.track('table', rows=1):
+        utils.Table(timereport_dict['table'])
+    eq_(monitor.records[-1].stages[0]['stage'], 'table')
+
+    # The process peak is left alone unless resets are asked for
+    large = ' ' * 2 ** 25
+    del large
+    peak = peak_rss()
+    with monitor.track('small'):
+        pass
+    ok_(peak_rss() >= peak)
+    ok_(monitor.records[-1].stages[0]['peak'] < 2 ** 24)
+
+    # Peak is measured per stage, not over the process lifetime
+    monitor = MemoryMonitor(reset_peaks=True)
+    if reset_peak():
+        with monitor.track('large'):
+            large = ' ' * 2 ** 25
+            del large
+        ok_(monitor.records[-1].stages[0]['peak'] >= 2 ** 24)
+        with monitor.track('small'):
+            pass
+        ok_(monitor.records[-1].stages[0]['peak'] < 2 ** 24)
+
+    client.memory = MemoryMonitor(ceiling=rss())
+    try:
+        client.timereport.get_provider_report('test', 'test')
+        raise Exception('Call over the ceiling should raise '
+                        'MemoryCeilingError')
+    except MemoryCeilingError, e:
+        ok_(e.request.url.endswith('/gds/timereports/v1/providers/test'))
+
+    client.memory.compression_ratio = 3
+    client.memory.reset_peaks = True
+    copy = pickle.loads(pickle.dumps(client.memory))
+    eq_((copy.ceiling, copy.compression_ratio, copy.reset_peaks),
+        (client.memory.ceiling, 3, True))
+    eq_(len(copy.records), 0)
+
+
+#======================
+# BUFFER TESTS
+#======================
+def test_buffer_pool():
+    import zlib
+    from StringIO import StringIO
+    from odesk.buffers import BufferPool, read_into
+
+    pool = BufferPool(size=8, max_size=32, max_bytes=48)
+    buf = pool.acquire()
+    eq_(len(buf), 8)
+    pool.release(buf)
+    ok_(pool.acquire(4) is buf)
+    eq_((pool.allocated, pool.reused), (1, 1))
+    eq_(len(pool.acquire(16)), 16)
+    pool.release(bytearray(64))    # Too large to keep
+    pool.release(buf)
+    pool.release(bytearray(32))
+    pool.release(bytearray(16))    # Over the total size kept
+    eq_(pool._idle_bytes, 40)
+    eq_(len(pool.acquire(9)), 32)
+    eq_(pool._idle_bytes, 8)
+
+    body = json.dumps(sample_json_dict) * 10
+
+    def stream(data):
+        chunks = [data[i:i + 10] for i in range(0, len(data), 10)]
+        return lambda amt, decode_content: iter(chunks)
+
+    buf = bytearray(4)
+    eq_(read_into(MicroMock(stream=stream(body)), buf),
+        (len(body), len(body)))
+    eq_(str(buf[:len(body)]), body)
+
+    compressed = zlib.compress(body)
+    buf = bytearray(4)
+    eq_(read_into(MicroMock(stream=stream(compressed)), buf,
+                  zlib.decompressobj()),
+        (len(compressed), len(body)))
+    eq_(str(buf[:len(body)]), body)
+
+    # Plain bodies are read at once, only compressed ones take a buffer
+    client = Client('public', 'secret', buffers=pool)
+    allocated = pool.allocated
+    plain = StringIO(body)
+    response = MicroMock(headers={}, stream=stream(body),
+                         read=lambda decode_content: plain.read())
+    eq_(client.read_body(response), body)
+    eq_(pool.allocated, allocated)
+    response = MicroMock(headers={'content-encoding': 'deflate'},
+                         stream=stream(compressed))
+    eq_(client.read_body(response), body)
+    eq_((client.bytes_received, client.bytes_decoded),
+        (len(body) + len(compressed), 2 * len(body)))
+
+
+#======================
+# ENDPOINT TESTS
+#======================
+@patch('urllib3.PoolManager.urlopen', patched_urlopen_teamrooms)
+def test_endpoints():
+    from odesk.endpoints import Endpoint, URLTemplate, registry, find
+    from odesk.routers.hr import HR
+    from odesk.routers.mc import MC
+
+    eq_(URLTemplate('companies/{1}/teams/{0}').expand(('team', 'company')),
+        'companies/company/teams/team')
+    eq_(URLTemplate('100%/{0}').expand((1,)), '100%/1')
+
+    endpoint = registry['HR.get_offers']
+    ok_(endpoint.router is HR)
+    ok_(endpoint.paged and endpoint.idempotent)
+    ok_(not registry['MC.post_message'].idempotent)
+
+    eq_(find('https://www.odesk.com/api/hr/v2/users/me.json').name,
+        'get_user_me')
+    eq_(find('https://www.odesk.com/api/hr/v2/users/1.json?a=b').name,
+        'get_user')
+    ok_(find('https://www.odesk.com/api/mc/v1/threads/user/1',
+             'PUT') is registry['MC.put_threads'])
+    eq_(find('https://www.odesk.com/api/hr/v2/unknown'), None)
+
+    eq_(Endpoint('e', 'x', unwrap=('a', 'b')).unwrap_result(
+        {'a': {'b': 1}}), 1)
+    eq_(Endpoint('e', 'x', unwrap=('a', 'b')).unwrap_result({'b': 1}), 1)
+    # Missing nested key gives the whole result, as get_tray_content did
+    eq_(Endpoint('e', 'x', unwrap=('a', 'b')).unwrap_result({'a': {}}),
+        {'a': {}})
+
+    endpoint = Endpoint('e', 'x', params=('a',))
+    endpoint.validate({'a': 1})
+    try:
+        endpoint.validate({'a': 1, 'b': 2})
+        raise Exception('Unknown parameter should raise ApiValueError')
+    except ApiValueError:
+        pass
+    Endpoint('e', 'x', params=None).validate({'b': 2})
+
+    team = get_client().team_v2
+    eq_(len(team.get_snapshots(1, online='all', disabled='yes')), 1)
+    try:
+        team.get_snapshots(1, online='never')
+        raise Exception('Invalid choice should raise ApiValueError')
+    except ApiValueError:
+        pass
+
+    try:
+        MC.version = 3
+        eq_(MC.url_prefix, 'https://www.odesk.com/api/mc/v3/')
+        eq_(MC.endpoints['get_trays'].regex.pattern.count('v3'), 1)
+    finally:
+        MC.version = 1
+    mc = get_client().mc
+    eq_(mc.full_url('trays'), 'https://www.odesk.com/api/mc/v1/trays')
+    mc.version = 2
+    eq_(mc.full_url('trays'), 'https://www.odesk.com/api/mc/v2/trays')
+    eq_(MC.url_prefix, 'https://www.odesk.com/api/mc/v1/')
+
+    # Gds routers stay read-only through call too
+    finreport = get_client().finreport
+    finreport.endpoints = dict(finreport.endpoints, post_report=Endpoint(
+        'post_report', 'reports', method='POST'))
+    eq_(finreport.call('post_report'), None)
+
+
+#======================
+# WRITE-BEHIND TESTS
+#======================
+def test_write_behind_queue():
+    import shutil
+    import tempfile
+    from datetime import datetime
+    from odesk.writebehind import WriteBehindQueue
+
+    requests = []
+    failing = []
+
+    def urlopen(self, method, url, body=None, **kwargs):
+        path = url.split('?')[0].replace('https://www.odesk.com/api/', '')
+        path = path.replace('.json', '')
+        requests.append((method, path, json.loads(body or 'null')))
+        return MicroMock(data='{}', status=failing[-1] if failing else 200,
+                         getheaders=lambda: {})
+
+    directory = tempfile.mkdtemp()
+    journal = os.path.join(directory, 'writes.journal')
+    when = datetime(2013, 5, 1, 10, 20)
+    try:
+        with patch('urllib3.PoolManager.urlopen', urlopen):
+            queue = WriteBehindQueue(get_client(), journal=journal,
+                                     interval=None, batch_size=2)
+            queue.update_snapshot('company', 'user', 'first', when)
+            queue.update_snapshot('company', 'user', 'second', when)
+            queue.delete_snapshot('company', 'other')
+            queue.put_threads_read('user', [1, 2])
+            queue.put_threads_read('user', [2, 3])
+            queue.put_threads_unread('user', 3)
+            eq_(len(queue), 5)
+            eq_(queue.coalesced, 3)
+
+            # The crashed process' writes are picked up from the journal
+            recovered = WriteBehindQueue(get_client(), journal=journal,
+                                         interval=None)
+            eq_(len(recovered), 5)
+
+            failing.append(500)
+            eq_(queue.flush(), 0)
+            eq_(len(queue), 5)
+            del failing[:]
+            eq_(queue.flush(), 4)
+            eq_(len(queue), 0)
+            eq_(sorted(requests[4:]), [
+                ('DELETE', 'team/v1/snapshots/company/other', None),
+                ('PUT', 'mc/v1/threads/user/1;2', {'read': 'true'}),
+                ('PUT', 'mc/v1/threads/user/3', {'read': 'false'}),
+                ('PUT', 'team/v1/snapshots/company/user/2013-05-01T10:20:00',
+                 {'memo': 'second'})])
+            eq_((queue.sent, queue.failed, queue.dropped), (4, 4, 0))
+            queue.close()
+            eq_(open(journal).read(), '')
+
+            # Refused mutations are dropped, others retried a few times
+            queue = WriteBehindQueue(get_client(), journal=journal,
+                                     interval=None, max_retries=2)
+            queue.delete_snapshot('company', 'deleted')
+            failing.append(404)
+            eq_(queue.flush(), 0)
+            eq_((len(queue), queue.dropped), (0, 1))
+            queue.put_threads_read('user', [5])
+            failing.append(503)
+            eq_(queue.flush(), 0)
+            eq_(len(queue), 1)
+            eq_(queue.flush(), 0)
+            eq_((len(queue), queue.dropped), (0, 2))
+            del failing[:]
+            queue.close()
+            eq_(open(journal).read(), '')
+
+            # Disabled router
+            client = Client('public', 'secret', 'some token',
+                            'some token secret', team=False)
+            queue = WriteBehindQueue(client, interval=None)
+            queue.update_snapshot('company', 'user', 'memo')
+            eq_(queue.flush(), 0)
+            eq_((len(queue), queue.dropped), (0, 1))
+
+            queue = WriteBehindQueue(get_client(), interval=0.01)
+            queue.put_threads_starred('user', [4])
+            queue.close()
+            eq_(requests[-1], ('PUT', 'mc/v1/threads/user/4',
+                               {'starred': 'true'}))
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,402 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Connection pools used by :py:class:`odesk.Client`.
+
+Extends ``urllib3`` pools with connection pre-warming, reaping of
+connections that stayed idle for too long, TLS context and session
+reuse across connections of one pool and optional caching of DNS lookups
+(see :py:mod:`odesk.resolver`).
+
+"""
+
+import os
+import time
+import socket
+import logging
+import weakref
+import threading
+from httplib import HTTPException
+
+import urllib3
+from urllib3 import connectionpool
+from urllib3.poolmanager import SSL_KEYWORDS
+from urllib3._collections import RecentlyUsedContainer
+from urllib3.util import resolve_cert_reqs, resolve_ssl_version
+from urllib3.packages.ssl_match_hostname import match_hostname
+
+try:
+    import ssl
+    from ssl import SSLContext, HAS_SNI
+except ImportError:   # Python without ssl or older than 2.7.9
+    ssl = SSLContext = None
+    HAS_SNI = False
+
+# Session resumption is exposed by Python 3.6+ only
+HAS_SESSIONS = hasattr(ssl, 'SSLSession')
+
+
+__all__ = ['PoolManager', 'HTTPConnectionPool', 'HTTPSConnectionPool',
+           'TLSSessionCache']
+
+
+class TLSSessionCache(object):
+    """SSL context and the latest TLS session shared by connections
+    of one pool.
+
+    Loading CA certificates into a fresh context for every connection
+    is expensive, the context is built once per set of certificate
+    options. Where the ``ssl`` module supports it, the last session is
+    offered to the server for an abbreviated handshake.
+
+    Counters ``full_handshakes`` and ``resumed_handshakes`` show
+    how many handshakes were resumed.
+
+    """
+
+    def __init__(self):
+        self.full_handshakes = 0
+        self.resumed_handshakes = 0
+        self.session = None
+        self._contexts = {}
+        self._lock = threading.Lock()
+
+    def context(self, cert_reqs, ca_certs=None, cert_file=None,
+                key_file=None, ssl_version=None):
+        key = (cert_reqs, ca_certs, cert_file, key_file, ssl_version)
+        with self._lock:
+            context = self._contexts.get(key)
+            if context is None:
+                context = SSLContext(ssl_version)
+                context.verify_mode = cert_reqs
+                if ca_certs:
+                    try:
+                        context.load_verify_locations(ca_certs)
+                    except Exception, e:
+                        raise urllib3.exceptions.SSLError(e)
+                if cert_file:
+                    context.load_cert_chain(cert_file, key_file)
+                self._contexts[key] = context
+            return context
+
+    def wrap_socket(self, sock, context, server_hostname=None):
+        kwargs = {}
+        if HAS_SNI:
+            kwargs['server_hostname'] = server_hostname
+        session = self.session
+        if HAS_SESSIONS and session is not None:
+            kwargs['session'] = session
+        sslsock = context.wrap_socket(sock, **kwargs)
+        with self._lock:
+            if getattr(sslsock, 'session_reused', False):
+                self.resumed_handshakes += 1
+            else:
+                self.full_handshakes += 1
+            if HAS_SESSIONS:
+                self.session = sslsock.session
+        return sslsock
+
+
+class VerifiedHTTPSConnection(connectionpool.VerifiedHTTPSConnection):
+    """Verified HTTPS connection wrapping its socket with the pool's
+    :py:class:`TLSSessionCache`.
+
+    """
+
+    tls_sessions = None
+
+    def connect(self):
+        if SSLContext is None or self.tls_sessions is None:
+            return connectionpool.VerifiedHTTPSConnection.connect(self)
+
+        try:
+            sock = self._create_connection((self.host, self.port),
+                                           self.timeout)
+        except socket.error, e:
+            raise urllib3.exceptions.ProxyError(
+                'Cannot connect to proxy. Socket error: {0}.'.format(e))
+
+        resolved_cert_reqs = resolve_cert_reqs(self.cert_reqs)
+        resolved_ssl_version = resolve_ssl_version(self.ssl_version)
+
+        if self._tunnel_host:
+            self.sock = sock
+            self._tunnel()
+
+        context = self.tls_sessions.context(
+            resolved_cert_reqs, self.ca_certs, self.cert_file,
+            self.key_file, resolved_ssl_version)
+        self.sock = self.tls_sessions.wrap_socket(
+            sock, context, server_hostname=self.host)
+
+        if resolved_cert_reqs != ssl.CERT_NONE:
+            if self.assert_fingerprint:
+                urllib3.util.assert_fingerprint(
+                    self.sock.getpeercert(binary_form=True),
+                    self.assert_fingerprint)
+            elif self.assert_hostname is not False:
+                match_hostname(self.sock.getpeercert(),
+                               self.assert_hostname or self.host)
+
+
+class PoolMixin(object):
+    """Stamps connections returned to the pool with the time of last use,
+    so idle ones can be found, and connects them through the ``resolver``
+    if it's set.
+
+    """
+
+    resolver = None
+
+    def _use_resolver(self, conn):
+        if self.resolver is not None:
+            conn._create_connection = self.resolver.create_connection
+        return conn
+
+    def _new_conn(self):
+        return self._use_resolver(super(PoolMixin, self)._new_conn())
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.last_used = time.time()
+        super(PoolMixin, self)._put_conn(conn)
+
+    def _has_empty_slot(self):
+        pool = self.pool
+        if pool is None:   # Closed pool
+            return False
+        with pool.mutex:
+            return None in pool.queue
+
+    def _swap_in(self, conn):
+        """Put the connected ``conn`` in place of an empty slot, on top
+        of the LIFO queue so it's handed out first. Returns ``False``
+        if there is no empty slot anymore.
+
+        """
+        pool = self.pool
+        if pool is None:
+            return False
+        with pool.mutex:
+            if None not in pool.queue:
+                return False
+            pool.queue.remove(None)
+            pool.queue.append(conn)
+        return True
+
+    def prewarm(self, count):
+        """Open up to ``count`` connections ahead of the first request.
+
+        Connections are established one by one outside of the pool and
+        swapped in for empty slots, so requests made meanwhile aren't
+        short of slots.
+
+        Returns number of connections established.
+
+        """
+        logger = logging.getLogger('python-odesk')
+        opened = 0
+        while opened < count and self._has_empty_slot():
+            try:
+                conn = self._new_conn()
+                conn.connect()
+            except (socket.error, HTTPException, urllib3.exceptions.HTTPError,
+                    connectionpool.BaseSSLError), e:
+                logger.debug('Failed to prewarm connection to {0}: {1}'
+                             .format(self.host, e))
+                break
+            conn.last_used = time.time()
+            if not self._swap_in(conn):
+                # Slots were filled by requests meanwhile
+                conn.close()
+                break
+            opened += 1
+        return opened
+
+    def reap_idle(self, max_idle):
+        """Close pooled connections idle for more than ``max_idle``
+        seconds. Returns number of connections closed.
+
+        """
+        pool = self.pool
+        if pool is None:
+            return 0
+        now = time.time()
+        with pool.mutex:
+            idle = [conn for conn in pool.queue if conn is not None and
+                    now - getattr(conn, 'last_used', now) > max_idle]
+            if idle:
+                # Empty slots go to the bottom of the LIFO queue, below
+                # connected ones
+                kept = [conn for conn in pool.queue
+                        if conn is not None and conn not in idle]
+                pool.queue[:] = [None] * (len(pool.queue) - len(kept)) + kept
+        for conn in idle:
+            conn.close()
+        return len(idle)
+
+
+class HTTPConnectionPool(PoolMixin, connectionpool.HTTPConnectionPool):
+    pass
+
+
+class HTTPSConnectionPool(PoolMixin, connectionpool.HTTPSConnectionPool):
+
+    def __init__(self, *args, **kwargs):
+        super(HTTPSConnectionPool, self).__init__(*args, **kwargs)
+        self.tls_sessions = TLSSessionCache()
+
+    def _new_conn(self):
+        if SSLContext is None or not connectionpool.ssl:
+            return super(HTTPSConnectionPool, self)._new_conn()
+
+        self.num_connections += 1
+        logger = logging.getLogger('python-odesk')
+        logger.debug('Starting new HTTPS connection ({0}): {1}'.format(
+            self.num_connections, self.host))
+
+        actual_host = self.host
+        actual_port = self.port
+        if self.proxy is not None:
+            actual_host = self.proxy.host
+            actual_port = self.proxy.port
+
+        connection = VerifiedHTTPSConnection(host=actual_host,
+                                             port=actual_port,
+                                             strict=self.strict)
+        connection.tls_sessions = self.tls_sessions
+        self._use_resolver(connection)
+        return self._prepare_conn(connection)
+
+
+pool_classes_by_scheme = {
+    'http': HTTPConnectionPool,
+    'https': HTTPSConnectionPool,
+}
+
+
+class PoolManager(urllib3.PoolManager):
+    """``urllib3.PoolManager`` creating pools of this module.
+
+    After a ``fork`` the child process starts with empty pools instead of
+    sharing sockets inherited from the parent.
+
+    *Parameters:*
+      :resolver:   (optional, default ``None``)
+                   :py:class:`odesk.resolver.DNSCache` used to resolve
+                   hosts of new connections
+
+    """
+
+    def __init__(self, num_pools=10, headers=None, resolver=None,
+                 **connection_pool_kw):
+        super(PoolManager, self).__init__(num_pools, headers,
+                                          **connection_pool_kw)
+        self.num_pools = num_pools
+        self.resolver = resolver
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        # Locks and sockets of the parent can't be used, just forget
+        # the pools without closing the parent's connections
+        self.pools = RecentlyUsedContainer(self.num_pools,
+                                           dispose_func=lambda p: p.close())
+        if self.resolver is not None:
+            self.resolver.after_fork()
+
+    def connection_from_host(self, host, port=None, scheme='http'):
+        self._check_fork()
+        return super(PoolManager, self).connection_from_host(
+            host, port, scheme)
+
+    def _new_pool(self, scheme, host, port):
+        pool_cls = pool_classes_by_scheme[scheme]
+        kwargs = self.connection_pool_kw
+        if scheme == 'http':
+            kwargs = self.connection_pool_kw.copy()
+            for kw in SSL_KEYWORDS:
+                kwargs.pop(kw, None)
+        pool = pool_cls(host, port, **kwargs)
+        pool.resolver = self.resolver
+        return pool
+
+    def connection_pools(self):
+        """Return list of currently open connection pools."""
+        with self.pools.lock:
+            return list(self.pools._container.values())
+
+    def tls_stats(self):
+        """Return total numbers of full and resumed TLS handshakes."""
+        full = resumed = 0
+        for pool in self.connection_pools():
+            tls_sessions = getattr(pool, 'tls_sessions', None)
+            if tls_sessions is not None:
+                full += tls_sessions.full_handshakes
+                resumed += tls_sessions.resumed_handshakes
+        return {'full_handshakes': full, 'resumed_handshakes': resumed}
+
+    def prewarm(self, url, count):
+        """Open ``count`` connections to the host of the ``url``."""
+        return self.connection_from_url(url).prewarm(count)
+
+    def reap_idle(self, max_idle):
+        """Close connections idle for more than ``max_idle`` seconds
+        in all pools.
+
+        """
+        return sum(pool.reap_idle(max_idle)
+                   for pool in self.connection_pools())
+
+
+_reaper_lock = threading.Lock()
+
+
+def start_reaper(manager, max_idle, interval=None):
+    """Run :py:meth:`PoolManager.reap_idle` periodically in a daemon
+    thread, the thread stops once the ``manager`` is garbage collected.
+
+    A manager shared by several clients gets a single reaper, the
+    running one is returned.
+
+    """
+    with _reaper_lock:
+        thread = getattr(manager, '_reaper', None)
+        if thread is not None and thread.is_alive():
+            return thread
+        thread = manager._reaper = _reaper_thread(manager, max_idle,
+                                                  interval)
+        return thread
+
+
+def _reaper_thread(manager, max_idle, interval):
+    interval = interval or max(max_idle / 2.0, 0.1)
+    ref = weakref.ref(manager)
+
+    def reap():
+        while True:
+            time.sleep(interval)
+            manager = ref()
+            if manager is None:
+                return
+            closed = manager.reap_idle(max_idle)
+            if closed:
+                logger = logging.getLogger('python-odesk')
+                logger.debug('Closed {0} idle connections'.format(closed))
+            del manager
+
+    thread = threading.Thread(target=reap, name='odesk-reaper')
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def start_prewarm(manager, url, count):
+    """Open connections to the host of the ``url`` in a daemon thread."""
+    thread = threading.Thread(target=manager.prewarm, args=(url, count),
+                              name='odesk-prewarm')
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -2,7 +2,10 @@
 # python-odesk version 0.5
 # (C) 2010-2014 oDesk
 
-from datetime import date
+import re
+import hashlib
+from urlparse import urlparse
+from datetime import date, datetime, timedelta
 from odesk.exceptions import ApiValueError
 
 
@@ -29,17 +32,58 @@ def decimal_default(obj):
     raise TypeError
 
 
+_VERSION_RE = re.compile(r'^v\d+$')
+
+
+def route_of(url):
+    """Return route of the API url: path up to the resource name
+    following the version, e.g. ``/gds/timereports/v1/companies``.
+
+    """
+    segments = urlparse(url).path.split('/')
+    for i, segment in enumerate(segments):
+        if _VERSION_RE.match(segment):
+            return '/'.join(segments[:i + 2]).split('.')[0]
+    return '/'.join(segments).split('.')[0]
+
+
+def router_of(url):
+    """Return router part of the API url: path up to the version,
+    e.g. ``/gds/finreports/v2``.
+
+    """
+    segments = urlparse(url).path.split('/')
+    for i, segment in enumerate(segments):
+        if _VERSION_RE.match(segment):
+            return '/'.join(segments[:i + 1])
+    return '/'.join(segments).split('.')[0]
+
+
 class Q(object):
     """Simple GDS query constructor.
 
     Used to costruct :py:class:`odesk.utils.Query`.
 
+    Every operator returns a new node, so a predicate is an immutable
+    tree which renders itself only once.
+
+    *Example:*::
+
+      (Q('worked_on') >= date(2013, 5, 1)) & ~Q('team_id').in_(['a', 'b'])
+
     """
 
+    __slots__ = ('arg1', 'operator', 'arg2', '_str')
+
+    BOUND_OPERATORS = ('>', '>=', '<', '<=')
+
     def __init__(self, arg1, operator=None, arg2=None):
         self.arg1 = arg1
         self.operator = operator
         self.arg2 = arg2
+        self._str = None
+
+    __hash__ = object.__hash__
 
     def __and__(self, other):
         return self.__class__(self, 'AND', other)
@@ -47,9 +91,15 @@ class Q(object):
     def __or__(self, other):
         return self.__class__(self, 'OR', other)
 
+    def __invert__(self):
+        return self.__class__(self, 'NOT')
+
     def __eq__(self, other):
         return self.__class__(self, '=', other)
 
+    def __ne__(self, other):
+        return self.__class__(self, '<>', other)
+
     def __lt__(self, other):
         return self.__class__(self, '<', other)
 
@@ -62,26 +112,252 @@ class Q(object):
     def __ge__(self, other):
         return self.__class__(self, '>=', other)
 
+    def in_(self, values):
+        """Field value is one of ``values``."""
+        return self.__class__(self, 'IN', tuple(values))
+
     def arg_to_string(self, arg):
         if isinstance(arg, self.__class__):
             if arg.operator:
                 return '({0})'.format(arg)
             else:
-                return arg
-        elif isinstance(arg, str):
-            return "'{0}'".format(arg)
+                return _utf8(arg.arg1)
+        elif isinstance(arg, basestring):
+            return "'{0}'".format(_utf8(arg))
         elif isinstance(arg, date):
             return "'{0}'".format(arg.isoformat())
+        elif isinstance(arg, tuple):
+            return '({0})'.format(', '.join(
+                [self.arg_to_string(value) for value in arg]))
         else:
             return str(arg)
 
     def __str__(self):
-        if self.operator:
-            str1 = self.arg_to_string(self.arg1)
-            str2 = self.arg_to_string(self.arg2)
-            return '{0} {1} {2}'.format(str1, self.operator, str2)
+        if self._str is None:
+            if self.operator == 'NOT':
+                self._str = 'NOT {0}'.format(self.arg_to_string(self.arg1))
+            elif self.operator:
+                str1 = self.arg_to_string(self.arg1)
+                str2 = self.arg_to_string(self.arg2)
+                self._str = '{0} {1} {2}'.format(str1, self.operator, str2)
+            else:
+                self._str = self.arg1
+        return self._str
+
+    def __repr__(self):
+        return '<Q: {0}>'.format(self)
+
+    @property
+    def field(self):
+        """Field name of a comparison node, ``None`` for other nodes."""
+        if isinstance(self.arg1, Q) and not self.arg1.operator:
+            return self.arg1.arg1
+        return None
+
+    def operands(self):
+        """Return operands of an ``AND``/``OR`` chain as a flat list."""
+        result = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Q) and node.operator == self.operator:
+                stack.append(node.arg2)
+                stack.append(node.arg1)
+            else:
+                result.append(node)
+        return result
+
+    def normalize(self):
+        """Return an equivalent predicate in canonical form.
+
+        ``AND``/``OR`` chains are flattened, deduplicated and sorted,
+        bounds on the same field are merged into the tightest range,
+        overlapping date ranges joined by ``OR`` are merged and
+        equalities on the same field are folded into ``IN``.
+
+        """
+        if self.operator in ('AND', 'OR'):
+            operands = []
+            for operand in self.operands():
+                if isinstance(operand, Q):
+                    operand = operand.normalize()
+                if isinstance(operand, Q) and \
+                        operand.operator == self.operator:
+                    operands.extend(operand.operands())
+                else:
+                    operands.append(operand)
+            if self.operator == 'AND':
+                operands = _merge_bounds(operands)
+            else:
+                operands = _fold_in(_merge_date_ranges(operands))
+            return _chain(self.operator, operands)
+        elif self.operator == 'NOT':
+            operand = self.arg1
+            if isinstance(operand, Q):
+                operand = operand.normalize()
+                if operand.operator == 'NOT':
+                    return operand.arg1
+            return self.__class__(operand, 'NOT')
+        elif self.operator == 'IN':
+            values = _unique(self.arg2)
+            if len(values) == 1:
+                return self.__class__(self.arg1, '=', values[0])
+            return self.__class__(self.arg1, 'IN', tuple(values))
+        elif self.operator in self.BOUND_OPERATORS and \
+                _is_day(self.arg2):
+            if self.operator == '>':
+                return self.__class__(self.arg1, '>=',
+                                      self.arg2 + timedelta(days=1))
+            elif self.operator == '<':
+                return self.__class__(self.arg1, '<=',
+                                      self.arg2 - timedelta(days=1))
+        return self
+
+    def fingerprint(self):
+        """Stable hash of the normalized predicate."""
+        return hashlib.sha1(str(self.normalize())).hexdigest()
+
+
+def _utf8(value):
+    """Encode unicode ``value`` as UTF-8, so non-ASCII literals render
+    and hash.
+
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def _is_day(value):
+    return isinstance(value, date) and not isinstance(value, datetime)
+
+
+def _unique(values):
+    """Deduplicate ``values`` ordering them by rendered form."""
+    rendered = {}
+    for value in values:
+        rendered[Q('').arg_to_string(value)] = value
+    return [rendered[key] for key in sorted(rendered)]
+
+
+def _chain(operator, operands):
+    """Build a canonical left-deep ``operator`` chain from ``operands``."""
+    operands = _unique(operands)
+    result = operands[0]
+    for operand in operands[1:]:
+        result = Q(result, operator, operand)
+    return result
+
+
+def _merge_bounds(operands):
+    """Keep only the tightest lower and upper bound per field."""
+    lower = {}
+    upper = {}
+    result = []
+    for operand in operands:
+        field = isinstance(operand, Q) and operand.field
+        value = field and operand.arg2
+        comparable = isinstance(value, (date, int, long, float)) and \
+            not isinstance(value, bool)
+        if not comparable or operand.operator not in \
+                Q.BOUND_OPERATORS + ('=',):
+            result.append(operand)
+            continue
+        if isinstance(value, datetime):
+            # Date and datetime don't compare, bounds are days
+            value = value.date()
+        # Dates and numbers don't compare, keep their bounds apart
+        key = (field, isinstance(value, date))
+        strict = operand.operator in ('>', '<')
+        if operand.operator in ('>', '>=', '='):
+            current = lower.get(key)
+            if current is None or (value, strict) > current:
+                lower[key] = (value, strict)
+        if operand.operator in ('<', '<=', '='):
+            current = upper.get(key)
+            if current is None or (value, not strict) < current:
+                upper[key] = (value, not strict)
+    for key in set(lower) | set(upper):
+        field = key[0]
+        low, high = lower.get(key), upper.get(key)
+        if low and high and low[0] == high[0] and \
+                not low[1] and high[1]:
+            result.append(Q(field) == low[0])
+            continue
+        if low:
+            result.append(Q(Q(field), '>' if low[1] else '>=', low[0]))
+        if high:
+            result.append(Q(Q(field), '<=' if high[1] else '<', high[0]))
+    return result
+
+
+def _day_range(operand):
+    """Return ``(field, first, last)`` if the operand is a closed range
+    of days, ``None`` otherwise.
+
+    """
+    if not isinstance(operand, Q):
+        return None
+    if operand.operator == '=' and operand.field and _is_day(operand.arg2):
+        return operand.field, operand.arg2, operand.arg2
+    if operand.operator != 'AND':
+        return None
+    bounds = operand.operands()
+    if len(bounds) != 2 or not all(isinstance(bound, Q) and bound.field
+                                   and _is_day(bound.arg2)
+                                   for bound in bounds):
+        return None
+    first, last = bounds
+    if first.operator == '<=':
+        first, last = last, first
+    if first.field != last.field or first.operator != '>=' or \
+            last.operator != '<=':
+        return None
+    return first.field, first.arg2, last.arg2
+
+
+def _merge_date_ranges(operands):
+    """Merge overlapping or adjacent day ranges joined by ``OR``."""
+    ranges = {}
+    result = []
+    for operand in operands:
+        day_range = _day_range(operand)
+        if day_range is None:
+            result.append(operand)
         else:
-            return self.arg1
+            ranges.setdefault(day_range[0], []).append(day_range[1:])
+    for field, spans in ranges.items():
+        merged = []
+        for first, last in sorted(spans):
+            if merged and first <= merged[-1][1] + timedelta(days=1):
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        for first, last in merged:
+            if first == last:
+                result.append(Q(field) == first)
+            else:
+                result.append(_chain('AND', [Q(field) >= first,
+                                             Q(field) <= last]))
+    return result
+
+
+def _fold_in(operands):
+    """Fold equalities on the same field joined by ``OR`` into ``IN``."""
+    values = {}
+    result = []
+    for operand in operands:
+        if isinstance(operand, Q) and operand.field and \
+                operand.operator == '=':
+            values.setdefault(operand.field, []).append(operand.arg2)
+        elif isinstance(operand, Q) and operand.field and \
+                operand.operator == 'IN':
+            values.setdefault(operand.field, []).extend(operand.arg2)
+        else:
+            result.append(operand)
+    for field, field_values in values.items():
+        result.append(Q(field).in_(field_values).normalize())
+    return result
 
 
 class Query(object):
@@ -96,6 +372,8 @@ class Query(object):
 
     """
 
+    __slots__ = ('select', 'where', 'order_by', '_str', '_rendered')
+
     DEFAULT_TIMEREPORT_FIELDS = ['worked_on',
                                  'team_id',
                                  'team_name',
@@ -122,17 +400,61 @@ class Query(object):
         self.select = select
         self.where = where
         self.order_by = order_by
+        self._str = None
+        self._rendered = None
 
     def __str__(self):
-        select = self.select
-        select_str = 'SELECT ' + ', '.join(select)
-        where_str = ''
-        if self.where:
-            where_str = ' WHERE {0}'.format(self.where)
-        order_by_str = ''
-        if self.order_by:
-            order_by_str = ' ORDER BY ' + ','.join(self.order_by)
-        return ''.join([select_str, where_str, order_by_str])
+        # ``select`` and ``order_by`` are lists and could be changed
+        # in place, so the cached string is checked against them
+        rendered = (tuple(self.select), tuple(self.order_by or ()))
+        if self._str is None or rendered != self._rendered[1] or \
+                self.where is not self._rendered[0]:
+            select_str = 'SELECT ' + ', '.join(self.select)
+            where_str = ''
+            if self.where:
+                where_str = ' WHERE {0}'.format(self.where)
+            order_by_str = ''
+            if self.order_by:
+                order_by_str = ' ORDER BY ' + ','.join(self.order_by)
+            self._str = ''.join([select_str, where_str, order_by_str])
+            self._rendered = (self.where, rendered)
+        return self._str
+
+    def __repr__(self):
+        return '<Query: {0}>'.format(self)
+
+    def normalize(self):
+        """Return an equivalent query in canonical form.
+
+        Duplicate select and order by columns are removed and the
+        ``where`` predicate is normalized with :py:meth:`Q.normalize`.
+
+        """
+        where = self.where
+        if isinstance(where, Q):
+            where = where.normalize()
+        order_by = self.order_by
+        if order_by:
+            order_by = _unique_columns(order_by)
+        return self.__class__(_unique_columns(self.select), where=where,
+                              order_by=order_by)
+
+    def fingerprint(self):
+        """Stable hash of the normalized query, suitable for caching
+        and deduplication.
+
+        """
+        return hashlib.sha1(str(self.normalize())).hexdigest()
+
+
+def _unique_columns(columns):
+    seen = set()
+    result = []
+    for column in columns:
+        if column not in seen:
+            seen.add(column)
+            result.append(column)
+    return result
 
 
 class Table(object):
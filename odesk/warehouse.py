@@ -0,0 +1,278 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Local SQLite warehouse for time and financial reports.
+
+Reports are synced incrementally into a local database, after that
+any analysis runs offline with plain SQL.
+
+*Example:*::
+
+  warehouse = Warehouse('odesk.db')
+  warehouse.sync_timereports(client.timereport.get_company_report,
+                             'company', since=date(2013, 1, 1))
+  warehouse.query('SELECT team_name, SUM(hours) AS hours '
+                  'FROM timereports WHERE worked_on >= ? '
+                  'GROUP BY team_name', ['20130501'])
+
+"""
+
+import time
+import logging
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from odesk.exceptions import ApiValueError
+from odesk.utils import Q, Query, Table
+
+
+__all__ = ['Warehouse']
+
+
+GDS_DATE_FORMAT = '%Y%m%d'
+
+
+class Warehouse(object):
+    """SQLite storage of GDS report rows with resumable sync.
+
+    *Parameters:*
+      :path:            (optional, default ``:memory:``)
+                        Path to SQLite database file
+
+      :chunk_days:      (optional, default ``31``)
+                        Number of days fetched per API call, the sync
+                        cursor is saved after each chunk
+
+      :overlap_days:    (optional, default ``3``)
+                        Number of days before the cursor synced again,
+                        recent rows can still change on the server
+
+    Rows remember the sync scope they were fetched by, and rows of the
+    scope within a refetched date range are replaced as a whole, so
+    rows deleted on the server disappear locally too.
+
+    """
+
+    TIMEREPORT_FIELDS = ['worked_on',
+                         'provider_id',
+                         'provider_name',
+                         'team_id',
+                         'team_name',
+                         'task',
+                         'memo',
+                         'hours']
+    # Natural identity of time report rows
+    TIMEREPORT_KEY = ['worked_on', 'provider_id', 'team_id', 'task', 'memo']
+    FINREPORT_FIELDS = Query.DEFAULT_FINREPORT_FIELDS
+    FINREPORT_KEY = ['reference']
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS timereports (
+            worked_on TEXT NOT NULL,
+            provider_id TEXT NOT NULL,
+            provider_name TEXT,
+            team_id TEXT NOT NULL,
+            team_name TEXT,
+            task TEXT NOT NULL,
+            memo TEXT NOT NULL,
+            hours REAL,
+            scope TEXT,
+            PRIMARY KEY (worked_on, provider_id, team_id, task, memo))""",
+        """CREATE INDEX IF NOT EXISTS timereports_team_id
+            ON timereports (team_id, worked_on)""",
+        """CREATE INDEX IF NOT EXISTS timereports_provider_id
+            ON timereports (provider_id, worked_on)""",
+        """CREATE TABLE IF NOT EXISTS finreports (
+            reference TEXT PRIMARY KEY,
+            date TEXT NOT NULL,
+            buyer_company__id TEXT,
+            buyer_company_name TEXT,
+            buyer_team__id TEXT,
+            buyer_team_name TEXT,
+            provider_company__id TEXT,
+            provider_company_name TEXT,
+            provider_team__id TEXT,
+            provider_team_name TEXT,
+            provider__id TEXT,
+            provider_name TEXT,
+            type TEXT,
+            subtype TEXT,
+            amount NUMERIC,
+            scope TEXT)""",
+        """CREATE INDEX IF NOT EXISTS finreports_date
+            ON finreports (date)""",
+        """CREATE INDEX IF NOT EXISTS finreports_buyer_team
+            ON finreports (buyer_team__id, date)""",
+        """CREATE INDEX IF NOT EXISTS finreports_provider
+            ON finreports (provider__id, date)""",
+        """CREATE TABLE IF NOT EXISTS sync_cursors (
+            scope TEXT PRIMARY KEY,
+            synced_until TEXT NOT NULL,
+            updated_at REAL NOT NULL)""",
+    ]
+    # Created once the ``scope`` columns exist in older databases too
+    SCOPE_SCHEMA = [
+        """CREATE INDEX IF NOT EXISTS timereports_scope
+            ON timereports (scope, worked_on)""",
+        """CREATE INDEX IF NOT EXISTS finreports_scope
+            ON finreports (scope, date)""",
+    ]
+
+    def __init__(self, path=':memory:', chunk_days=31, overlap_days=3):
+        self.path = path
+        self.chunk_days = chunk_days
+        self.overlap_days = overlap_days
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            for statement in self.SCHEMA:
+                self.connection.execute(statement)
+            for table in ('timereports', 'finreports'):
+                columns = [row[1] for row in self.connection.execute(
+                    'PRAGMA table_info({0})'.format(table))]
+                if 'scope' not in columns:
+                    self.connection.execute(
+                        'ALTER TABLE {0} ADD COLUMN scope TEXT'.format(table))
+            for statement in self.SCOPE_SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+    def _scope(self, table, method, args, kwargs):
+        router = getattr(method, 'im_self', None)
+        scope = '{0}:{1}v{2}{3}:{4}'.format(
+            table, getattr(router, 'api_url', ''),
+            getattr(router, 'version', ''),
+            getattr(method, '__name__', ''),
+            '/'.join(map(unicode, args)))
+        if kwargs:
+            # Report variants, e.g. ``hours=True``, are synced apart
+            scope += '?' + '&'.join(
+                '{0}={1}'.format(name, value)
+                for name, value in sorted(kwargs.items()))
+        return scope
+
+    def get_cursor(self, scope):
+        """Return the last synced date of a sync ``scope`` or ``None``."""
+        row = self.connection.execute(
+            'SELECT synced_until FROM sync_cursors WHERE scope = ?',
+            (scope,)).fetchone()
+        if row is None:
+            return None
+        return datetime.strptime(row[0], '%Y-%m-%d').date()
+
+    def cursors(self):
+        """Return mapping of sync scopes to their last synced dates."""
+        return dict((row[0], datetime.strptime(row[1], '%Y-%m-%d').date())
+                    for row in self.connection.execute(
+                        'SELECT scope, synced_until FROM sync_cursors'))
+
+    def sync_timereports(self, method, *args, **kwargs):
+        """Sync rows of a :py:class:`odesk.routers.timereport.TimeReport`
+        report into ``timereports`` table.
+
+        *Parameters:*
+          :method:    Bound report method, e.g.
+                      ``client.timereport.get_company_report``
+
+          :args:      Arguments of the method preceding the query
+
+          :since:     (optional, keyword) First date to sync, required
+                      when the scope has never been synced
+
+          :until:     (optional, keyword, default today)
+                      Last date to sync
+
+        Other keyword arguments are passed to the method.
+        Returns number of rows fetched.
+
+        """
+        return self._sync('timereports', 'worked_on',
+                          self.TIMEREPORT_FIELDS, self.TIMEREPORT_KEY,
+                          method, args, kwargs)
+
+    def sync_finreports(self, method, *args, **kwargs):
+        """Sync rows of a :py:class:`odesk.routers.finreport.Finreports`
+        report into ``finreports`` table.
+
+        Parameters are the same as of :py:meth:`sync_timereports`.
+
+        """
+        return self._sync('finreports', 'date',
+                          self.FINREPORT_FIELDS, self.FINREPORT_KEY,
+                          method, args, kwargs)
+
+    def _sync(self, table, date_field, fields, key, method, args, kwargs):
+        since = kwargs.pop('since', None)
+        until = kwargs.pop('until', None) or date.today()
+        scope = self._scope(table, method, args, kwargs)
+        cursor = self.get_cursor(scope)
+        if cursor is None:
+            if since is None:
+                raise ApiValueError(
+                    'Scope {0} has never been synced, pass since '
+                    'date'.format(scope))
+            start = since
+        else:
+            start = cursor - timedelta(days=self.overlap_days)
+            if since is not None:
+                start = max(since, start)
+
+        logger = logging.getLogger('python-odesk')
+        synced = 0
+        while start <= until:
+            end = min(start + timedelta(days=self.chunk_days - 1), until)
+            query = Query(fields, where=(Q(date_field) >= start) &
+                          (Q(date_field) <= end))
+            data = method(*(tuple(args) + (query,)), **kwargs)
+            rows = Table(data['table'])
+            with self.connection:
+                self.connection.execute(
+                    'DELETE FROM {0} WHERE scope = ? AND {1} >= ? '
+                    'AND {1} <= ?'.format(table, date_field),
+                    (scope, start.strftime(GDS_DATE_FORMAT),
+                     end.strftime(GDS_DATE_FORMAT)))
+                self._upsert(table, fields, key, rows, scope)
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO sync_cursors '
+                    '(scope, synced_until, updated_at) VALUES (?, ?, ?)',
+                    (scope, end.isoformat(), time.time()))
+            logger.debug('Synced {0} rows of {1} from {2} to {3}'.format(
+                len(rows), scope, start, end))
+            synced += len(rows)
+            start = end + timedelta(days=1)
+        return synced
+
+    def _upsert(self, table, fields, key, rows, scope):
+        positions = []
+        for field in fields:
+            if field in rows.cols:
+                positions.append(rows.cols.index(field))
+            else:
+                positions.append(None)
+        # Identity columns are NOT NULL, so absent values become ''
+        required = [field in key for field in fields]
+        values = []
+        for row in rows.rows:
+            record = []
+            for position, is_key in zip(positions, required):
+                value = None if position is None else row[position]
+                if value is None and is_key:
+                    value = ''
+                record.append(value)
+            record.append(scope)
+            values.append(record)
+        placeholders = ', '.join(['?'] * (len(fields) + 1))
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO {0} ({1}, scope) VALUES ({2})'.format(
+                table, ', '.join(fields), placeholders),
+            values)
+
+    def query(self, sql, params=()):
+        """Run SQL against the local database and return list
+        of dictionaries.
+
+        """
+        cursor = self.connection.execute(sql, params)
+        return [dict(zip(row.keys(), row)) for row in cursor.fetchall()]
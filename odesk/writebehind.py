@@ -0,0 +1,413 @@
+# Python bindings to oDesk API
+# python-odesk version 0.5
+# (C) 2010-2014 oDesk
+"""Write-behind queue of snapshot memo and message thread updates.
+
+:py:class:`WriteBehindQueue` accepts mutations immediately and sends them
+from a background thread. Redundant mutations are merged before they're
+sent: the last memo written to a snapshot wins, thread ids marked with
+the same flag are united and sent in one request per batch, and marking
+a thread undoes a pending opposite mark.
+
+Accepted mutations are appended to a journal file first, so writes
+queued when the process crashed are sent by the next queue opened on
+the same journal. The journal is compacted to the pending mutations
+after each flush; a crash in between sends the flushed ones again.
+
+Mutations the API refuses with a client error (``4xx``), e.g. of a
+deleted snapshot or a user without access, are dropped. Other failures
+are retried up to ``max_retries`` times, the background thread backs
+off while they last.
+
+*Example:*::
+
+  queue = WriteBehindQueue(client, journal='odesk-writes.journal')
+  queue.update_snapshot(company_id, user_id, 'Reviewing PR', when)
+  queue.put_threads_read(username, [1, 2, 3])
+  ...
+  queue.close()   # Sends the rest
+
+"""
+
+import os
+import json
+import logging
+import urllib2
+import threading
+
+from odesk.exceptions import ApiValueError
+from odesk.utils import assert_parameter
+
+
+__all__ = ['WriteBehindQueue']
+
+
+FLAGS = ('read', 'starred', 'deleted')
+
+# Client errors worth retrying: request timeout and rate limit
+RETRY_CODES = (408, 429)
+
+SENT, RETRY, DROPPED = range(3)
+
+
+class WriteBehindQueue(object):
+    """Coalescing write-behind queue of API mutations.
+
+    *Parameters:*
+      :client:          :py:class:`odesk.Client` the mutations are sent by
+
+      :journal:         (optional, default ``None``)
+                        Path of the journal file, pending mutations found
+                        in it are queued again
+
+      :interval:        (optional, default ``1.0``)
+                        Seconds between flushes of the background thread,
+                        ``None`` disables the thread, call :py:meth:`flush`
+
+      :batch_size:      (optional, default ``20``)
+                        Thread ids sent per request
+
+      :fsync:           (optional, default ``True``)
+                        Whether journal writes are synced to disk before
+                        a mutation is accepted
+
+      :max_retries:     (optional, default ``10``)
+                        Failed attempts after which a mutation is dropped
+
+      :max_backoff:     (optional, default ``60``)
+                        Longest delay in seconds between flushes of the
+                        background thread, the delay doubles after each
+                        flush having failures to retry
+
+    Counters ``accepted``, ``coalesced``, ``sent``, ``failed`` and
+    ``dropped`` show the number of mutations queued, merged into pending
+    ones, requests made, requests failed and requests given up on.
+
+    """
+
+    def __init__(self, client, journal=None, interval=1.0, batch_size=20,
+                 fsync=True, max_retries=10, max_backoff=60):
+        self.client = client
+        self.journal = journal
+        self.interval = interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.accepted = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        # (company_id, user_id, timestamp or None) -> memo or None to delete
+        self._snapshots = {}
+        # (username, flag, value) -> set of thread ids
+        self._threads = {}
+        # Snapshot key or (username, flag, value, id) -> failed attempts
+        self._attempts = {}
+        # Flushes in a row having failures to retry
+        self._failing = 0
+        self._lock = threading.Lock()
+        # Flushes run one at a time, mutations are accepted meanwhile
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._journal_file = None
+        if journal is not None:
+            self._replay()
+            self._journal_file = open(journal, 'a')
+        self._thread = None
+        if interval is not None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='odesk-write-behind')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._snapshots) + sum(
+                len(ids) for ids in self._threads.itervalues())
+
+    #Snapshot memos
+    def update_snapshot(self, company_id, user_id, memo, datetime=None):
+        """Queue update of the snapshot memo, see
+        :py:meth:`odesk.routers.team.Team.update_snapshot`.
+
+        """
+        self._add({'op': 'snapshot', 'company_id': company_id,
+                   'user_id': user_id, 'datetime': _timestamp(datetime),
+                   'memo': memo})
+
+    def delete_snapshot(self, company_id, user_id, datetime=None):
+        """Queue deletion of the snapshot memo, see
+        :py:meth:`odesk.routers.team.Team.delete_snapshot`.
+
+        """
+        self._add({'op': 'snapshot', 'company_id': company_id,
+                   'user_id': user_id, 'datetime': _timestamp(datetime),
+                   'memo': None})
+
+    #Message thread flags
+    def put_threads(self, username, thread_ids, flag, value=True):
+        """Queue marking of the threads.
+
+        *Parameters:*
+          :username:      User name
+
+          :thread_ids:    List of thread ids
+
+          :flag:          ``read``, ``starred`` or ``deleted``
+
+          :value:         (optional, default ``True``) Flag value
+
+        """
+        assert_parameter('flag', flag, FLAGS)
+        if not isinstance(thread_ids, (list, tuple, set)):
+            thread_ids = [thread_ids]
+        self._add({'op': 'threads', 'username': username, 'flag': flag,
+                   'value': bool(value), 'ids': map(str, thread_ids)})
+
+    def put_threads_read(self, username, thread_ids):
+        self.put_threads(username, thread_ids, 'read', True)
+
+    def put_threads_unread(self, username, thread_ids):
+        self.put_threads(username, thread_ids, 'read', False)
+
+    def put_threads_starred(self, username, thread_ids):
+        self.put_threads(username, thread_ids, 'starred', True)
+
+    def put_threads_unstarred(self, username, thread_ids):
+        self.put_threads(username, thread_ids, 'starred', False)
+
+    def put_threads_deleted(self, username, thread_ids):
+        self.put_threads(username, thread_ids, 'deleted', True)
+
+    def put_threads_undeleted(self, username, thread_ids):
+        self.put_threads(username, thread_ids, 'deleted', False)
+
+    def _add(self, mutation):
+        with self._lock:
+            if self._journal_file is not None:
+                self._journal_file.write(json.dumps(mutation) + '\n')
+                self._journal_file.flush()
+                if self.fsync:
+                    os.fsync(self._journal_file.fileno())
+            self._merge(mutation)
+            self.accepted += 1
+
+    def _merge(self, mutation):
+        """Merge the mutation into pending ones, under the lock."""
+        if mutation['op'] == 'snapshot':
+            key = (mutation['company_id'], mutation['user_id'],
+                   mutation['datetime'])
+            if key in self._snapshots:
+                self.coalesced += 1
+            self._snapshots[key] = mutation['memo']
+            # New memo gets its own attempts
+            self._attempts.pop(key, None)
+            return
+        username, flag = mutation['username'], mutation['flag']
+        ids = set(mutation['ids'])
+        opposite = self._threads.get((username, flag, not mutation['value']))
+        if opposite:
+            self.coalesced += len(opposite & ids)
+            opposite -= ids
+        pending = self._threads.setdefault(
+            (username, flag, mutation['value']), set())
+        self.coalesced += len(pending & ids)
+        pending |= ids
+        for thread_id in ids:
+            self._attempts.pop((username, flag, True, thread_id), None)
+            self._attempts.pop((username, flag, False, thread_id), None)
+
+    def _replay(self):
+        try:
+            with open(self.journal) as f:
+                lines = f.readlines()
+        except IOError:
+            return
+        for line in lines:
+            try:
+                mutation = json.loads(line)
+            except ValueError:
+                # Torn write of the last line
+                continue
+            self._merge(mutation)
+
+    def _pending(self):
+        """Return pending mutations as journal records, under the lock."""
+        mutations = []
+        for (company_id, user_id, stamp), memo in self._snapshots.items():
+            mutations.append({'op': 'snapshot', 'company_id': company_id,
+                              'user_id': user_id, 'datetime': stamp,
+                              'memo': memo})
+        for (username, flag, value), ids in self._threads.items():
+            if ids:
+                mutations.append({'op': 'threads', 'username': username,
+                                  'flag': flag, 'value': value,
+                                  'ids': sorted(ids)})
+        return mutations
+
+    def flush(self):
+        """Send pending mutations. Failed ones stay queued until they
+        run out of retries, ones refused by the API are dropped.
+
+        Returns number of requests sent.
+
+        """
+        with self._flush_lock:
+            with self._lock:
+                snapshots, self._snapshots = self._snapshots, {}
+                threads, self._threads = self._threads, {}
+            sent = 0
+            done = []
+            failed = []
+            for key, memo in snapshots.iteritems():
+                mutation = {'op': 'snapshot', 'company_id': key[0],
+                            'user_id': key[1], 'datetime': key[2],
+                            'memo': memo}
+                status = self._send_snapshot(key, memo)
+                sent += status == SENT
+                (failed if status == RETRY else done).append(mutation)
+            for (username, flag, value), ids in threads.iteritems():
+                ids = sorted(ids)
+                for i in xrange(0, len(ids), self.batch_size):
+                    batch = ids[i:i + self.batch_size]
+                    mutation = {'op': 'threads', 'username': username,
+                                'flag': flag, 'value': value, 'ids': batch}
+                    status = self._send_threads(username, flag, value, batch)
+                    sent += status == SENT
+                    (failed if status == RETRY else done).append(mutation)
+            with self._lock:
+                for mutation in done:
+                    for key in _attempt_keys(mutation):
+                        self._attempts.pop(key, None)
+                for mutation in failed:
+                    self._requeue(mutation)
+                self._failing = self._failing + 1 if failed else 0
+                if self._journal_file is not None and (snapshots or threads):
+                    self._compact()
+            return sent
+
+    def _requeue(self, mutation):
+        """Queue the failed mutation again unless it was overwritten
+        while being sent or ran out of retries, under the lock.
+
+        """
+        keys = _attempt_keys(mutation)
+        attempts = max(self._attempts.get(key, 0) for key in keys) + 1
+        if attempts >= self.max_retries:
+            logger = logging.getLogger('python-odesk')
+            logger.debug('Write-behind {0} dropped after {1} '
+                         'attempts'.format(mutation, attempts))
+            self.dropped += 1
+            for key in keys:
+                self._attempts.pop(key, None)
+            return
+        if mutation['op'] == 'snapshot':
+            key = (mutation['company_id'], mutation['user_id'],
+                   mutation['datetime'])
+            if key not in self._snapshots:
+                self._snapshots[key] = mutation['memo']
+                self._attempts[key] = attempts
+            return
+        username, flag, value = (mutation['username'], mutation['flag'],
+                                 mutation['value'])
+        ids = set(mutation['ids'])
+        # Threads marked since are left alone
+        ids -= self._threads.get((username, flag, not value), set())
+        pending = self._threads.setdefault((username, flag, value), set())
+        for thread_id in ids - pending:
+            self._attempts[(username, flag, value, thread_id)] = attempts
+        pending.update(ids)
+
+    def _compact(self):
+        """Rewrite the journal with pending mutations only,
+        under the lock.
+
+        """
+        tmp_path = self.journal + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for mutation in self._pending():
+                f.write(json.dumps(mutation) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._journal_file.close()
+        os.rename(tmp_path, self.journal)
+        self._journal_file = open(self.journal, 'a')
+
+    def _send(self, router, name, args, data):
+        """Make the request, return ``SENT``, ``RETRY`` or ``DROPPED``."""
+        try:
+            # Raises AttributeError if the router is disabled
+            getattr(self.client, router).call(name, *args, data=data)
+        except Exception, e:
+            dropped = _refused(e)
+            logger = logging.getLogger('python-odesk')
+            logger.debug('Write-behind {0} {1}: {2}'.format(
+                name, 'dropped' if dropped else 'failed', e))
+            with self._lock:
+                self.failed += 1
+                if dropped:
+                    self.dropped += 1
+            return DROPPED if dropped else RETRY
+        with self._lock:
+            self.sent += 1
+        return SENT
+
+    def _send_snapshot(self, key, memo):
+        company_id, user_id, stamp = key
+        args = (company_id, user_id)
+        name = 'update_snapshot' if memo is not None else 'delete_snapshot'
+        if stamp is not None:
+            args += (stamp,)
+            name += '_at'
+        data = {'memo': memo} if memo is not None else None
+        return self._send('team', name, args, data)
+
+    def _send_threads(self, username, flag, value, ids):
+        return self._send('mc', 'put_threads',
+                          (username, ';'.join(ids)),
+                          {flag: 'true' if value else 'false'})
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.wait(delay):
+            self.flush()
+            delay = min(self.interval * 2 ** min(self._failing, 16),
+                        max(self.max_backoff, self.interval))
+
+    def close(self):
+        """Stop the background thread and send pending mutations."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+
+def _refused(error):
+    """Whether the API or the client refused the request for good,
+    so sending it again can't succeed.
+
+    """
+    if isinstance(error, urllib2.HTTPError):
+        return 400 <= error.code < 500 and error.code not in RETRY_CODES
+    return isinstance(error, (ApiValueError, AttributeError))
+
+
+def _attempt_keys(mutation):
+    """Keys of the mutation in ``WriteBehindQueue._attempts``."""
+    if mutation['op'] == 'snapshot':
+        return [(mutation['company_id'], mutation['user_id'],
+                 mutation['datetime'])]
+    return [(mutation['username'], mutation['flag'], mutation['value'],
+             thread_id) for thread_id in mutation['ids']]
+
+
+def _timestamp(value):
+    if value is None or isinstance(value, basestring):
+        return value
+    return value.isoformat()
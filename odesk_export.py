@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Export oDesk time and financial reports to CSV, JSON Lines or Parquet.
+
+Uses keys stored in ``keys.json`` by ``odesk_meter.py``.
+
+*Example:*::
+
+  python odesk_export.py finreport get_provider_billings me \\
+      --since 2013-01-01 --until 2013-12-31 --output billings.csv.gz
+
+"""
+import os
+import sys
+import argparse
+from datetime import datetime
+
+# Update python path
+_PROJECT_DIR = os.path.abspath(os.path.dirname(__file__))
+_LIB_DIR = os.path.join(_PROJECT_DIR, 'lib')
+[sys.path.insert(0, path) for path in (_LIB_DIR,)]
+
+from odesk.utils import Query
+from odesk.export import iter_report, export_report, FORMATS
+from odesk_meter import get_client
+
+REPORTS = {
+    'timereport': ('worked_on', Query.DEFAULT_TIMEREPORT_FIELDS),
+    'finreport': ('date', Query.DEFAULT_FINREPORT_FIELDS),
+}
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('router', choices=sorted(REPORTS))
+    parser.add_argument('method',
+                        help='report method, e.g. get_company_report')
+    parser.add_argument('args', nargs='*',
+                        help='method arguments preceding the query, '
+                             '"me" stands for the authenticated user')
+    parser.add_argument('--since', type=parse_date, required=True)
+    parser.add_argument('--until', type=parse_date)
+    parser.add_argument('--fields',
+                        help='comma separated list of columns')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--format', choices=sorted(FORMATS))
+    parser.add_argument('--compress')
+    parser.add_argument('--chunk-days', type=int, default=7)
+    options = parser.parse_args(argv)
+
+    client = get_client()
+    date_field, fields = REPORTS[options.router]
+    if options.fields:
+        fields = options.fields.split(',')
+    args = options.args
+    if 'me' in args:
+        uid = client.hr.get_user_me()['id']
+        args = [uid if arg == 'me' else arg for arg in args]
+    method = getattr(getattr(client, options.router), options.method)
+
+    chunks = iter_report(method, args, fields, date_field,
+                         since=options.since, until=options.until,
+                         chunk_days=options.chunk_days)
+    count = export_report(chunks, options.output, fmt=options.format,
+                          compress=options.compress)
+    print 'Exported {0} rows to {1}'.format(count, options.output)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        exit(1)
@@ -1,13 +1,21 @@
 #!/usr/bin/env python
+"""Show hours worked on oDesk today and this week.
+
+Runs as a Gtk app by default, ``--headless``, ``--json`` or ``--watch``
+print the summary to the terminal without importing any GUI toolkit::
+
+  python odesk_meter.py --watch 60
+  python odesk_meter.py --json
+
+"""
 import os
 import sys
 import json
+import time
+import argparse
+import threading
 from datetime import datetime, timedelta
 
-import pygtk
-pygtk.require('2.0')
-import gtk
-
 # Update python path
 _PROJECT_DIR = os.path.abspath(os.path.dirname(__file__))
 _LIB_DIR = os.path.join(_PROJECT_DIR, 'lib')
@@ -16,11 +24,32 @@ _LIB_DIR = os.path.join(_PROJECT_DIR, 'lib')
 from odesk import Client
 from odesk.utils import Query
 from odesk.utils import Q
+from odesk.rollup import Rollup
 
 KEYS_FILE = 'keys.json'
 
+# Last fetched hours, painted on startup until fresh ones arrive
+STATE_FILE = 'odesk_meter_state.json'
+
 ODESK_WORKED_ON_FORMAT = '%Y%m%d'
 
+FETCHED_AT_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# Imported by ``import_gtk()`` only when the Gtk app is started
+gtk = None
+gobject = None
+
+
+def import_gtk():
+    global gtk, gobject
+    import pygtk
+    pygtk.require('2.0')
+    import gtk as gtk_module
+    import gobject as gobject_module
+    gobject_module.threads_init()
+    gtk, gobject = gtk_module, gobject_module
+    return gtk
+
 
 def get_client(authorize=False):
     """Authenticate using keys stored in ``keys.json`` and return
@@ -64,12 +93,13 @@ def get_auth_user_uid(client):
     return user_info['id']
 
 
-def get_timereport(client, from_date=None, to_date=None):
+def get_timereport(client, from_date=None, to_date=None, odesk_uid=None):
     """Return parsed JSON data with timereport for given period.
     Fields are default.
 
     :from_date:    date object
     :to_date:      date object
+    :odesk_uid:    oDesk user UID, fetched if not given
 
     If empty - timereport from now to the begining of the current week.
 
@@ -83,9 +113,10 @@ def get_timereport(client, from_date=None, to_date=None):
     query = Query(
         select=Query.DEFAULT_TIMEREPORT_FIELDS,
         where=(Q('worked_on') >= from_date) & (Q('worked_on') <= to_date))
-    auth_user_uid = get_auth_user_uid(client)
+    if odesk_uid is None:
+        odesk_uid = get_auth_user_uid(client)
 
-    return client.timereport.get_provider_report(auth_user_uid, query)
+    return client.timereport.get_provider_report(odesk_uid, query)
 
 
 def get_today_and_this_week_times(data):
@@ -95,34 +126,26 @@ def get_today_and_this_week_times(data):
     :data:    parsed json data returned from ``get_timereport()`` function
 
     """
-    now = datetime.now()
-
-    date_idx = data['table']['cols'].index(
-        {'type': 'date', 'label': 'worked_on'})
-    team_idx = data['table']['cols'].index(
-        {'type': 'string', 'label': 'team_name'})
-    hours_idx = data['table']['cols'].index(
-        {'type': 'number', 'label': 'hours'})
+    today = datetime.now().strftime(ODESK_WORKED_ON_FORMAT)
+    rollup = Rollup({'team': ('team_name',),
+                     'team_day': ('team_name', 'worked_on:day')})
+    rollup.update(data)
 
     teams = {}
-
-    for row in data['table']['rows']:
-        team_name = row['c'][team_idx]['v']
-        hours = float(row['c'][hours_idx]['v'])
-        date_worked_on = row['c'][date_idx]['v']
-        if team_name not in teams:
-            teams[team_name] = {'today_hours': 0.0, 'week_hours': 0.0}
-        teams[team_name]['week_hours'] += hours
-        if date_worked_on == now.strftime(ODESK_WORKED_ON_FORMAT):
-            teams[team_name]['today_hours'] += hours
+    for (team_name,), hours in rollup.sums('team').items():
+        teams[team_name] = {'today_hours': 0.0, 'week_hours': float(hours)}
+    for (team_name, day), hours in rollup.sums('team_day').items():
+        if day == today:
+            teams[team_name]['today_hours'] = float(hours)
     return teams
 
 
-def get_timereport_layout(data, odesk_uid):
-    """Render text widged showing timereport data.
+def render_teams(teams, odesk_uid, stale_since=None):
+    """Render text showing hours worked for each team.
 
-    :data:        parsed json data returned from ``get_timereport()`` function
-    :odesk_uid:   oDesk user UID
+    :teams:        mapping returned by ``get_today_and_this_week_times()``
+    :odesk_uid:    oDesk user UID
+    :stale_since:  fetch time of the shown hours if they are not fresh
 
     """
     row_template = '{0}:\n\t{1:.2f} hrs today\n\t{2:.2f} hrs this week\n'
@@ -130,27 +153,173 @@ def get_timereport_layout(data, odesk_uid):
         [row_template.format(team_name,
                              team_data['today_hours'],
                              team_data['week_hours'])
-         for team_name, team_data
-         in get_today_and_this_week_times(data).items()]
+         for team_name, team_data in sorted(teams.items())]
     )
     if not rows_rendered:
         rows_rendered = "\nNo worked hours yet"
-    template = 'User: {odesk_uid}\n{rows}'
+    stale = ''
+    if stale_since:
+        stale = ' (stale, fetched {0})'.format(stale_since.replace('T', ' '))
+    template = 'User: {odesk_uid}{stale}\n{rows}'
     return template.format(
         odesk_uid=odesk_uid,
+        stale=stale,
         rows=rows_rendered
     )
 
 
+def get_timereport_layout(data, odesk_uid):
+    """Render text widged showing timereport data.
+
+    :data:        parsed json data returned from ``get_timereport()`` function
+    :odesk_uid:   oDesk user UID
+
+    """
+    return render_teams(get_today_and_this_week_times(data), odesk_uid)
+
+
+def get_timereport_summary(data, odesk_uid):
+    """Return timereport summary suitable for JSON output.
+
+    :data:        parsed json data returned from ``get_timereport()`` function
+    :odesk_uid:   oDesk user UID
+
+    """
+    teams = get_today_and_this_week_times(data)
+    return {
+        'user': odesk_uid,
+        'fetched_at': datetime.now().strftime(FETCHED_AT_FORMAT),
+        'teams': dict((team_name, {
+            'today_hours': round(team_data['today_hours'], 2),
+            'week_hours': round(team_data['week_hours'], 2)})
+            for team_name, team_data in teams.items()),
+    }
+
+
+def save_state(summary, path=STATE_FILE):
+    """Persist summary returned by ``get_timereport_summary()``."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(summary))
+    os.rename(tmp_path, path)
+
+
+def load_state(path=STATE_FILE):
+    """Return the persisted summary or ``None``.
+
+    Hours of a day or week which has passed since the fetch are zeroed.
+
+    """
+    try:
+        with open(path) as f:
+            state = json.loads(f.read())
+        fetched_at = datetime.strptime(state['fetched_at'], FETCHED_AT_FORMAT)
+    except (IOError, ValueError, KeyError, TypeError):
+        return None
+    today = datetime.now().date()
+    fetched_on = fetched_at.date()
+    for team_data in state['teams'].values():
+        if fetched_on != today:
+            team_data['today_hours'] = 0.0
+        if fetched_on < today - timedelta(days=today.weekday()):
+            team_data['week_hours'] = 0.0
+    return state
+
+
+def render_state(state):
+    return render_teams(state['teams'], state['user'],
+                        stale_since=state['fetched_at'])
+
+
+#=========================
+# odesk_meter headless code
+#=========================
+def render_update(previous_lines, lines):
+    """Return terminal output turning ``previous_lines`` into ``lines``,
+    only the lines from the first changed one are redrawn.
+
+    """
+    changed = 0
+    for old, new in zip(previous_lines, lines):
+        if old != new:
+            break
+        changed += 1
+    if changed == len(previous_lines) == len(lines):
+        return ''
+    output = ''
+    if len(previous_lines) > changed:
+        # Move cursor up to the first changed line and clear below
+        output = '\x1b[{0}A\x1b[J'.format(len(previous_lines) - changed)
+    return output + ''.join(line + '\n' for line in lines[changed:])
+
+
+def run_headless(client, as_json=False, watch=None, stream=sys.stdout):
+    """Print timereport summary, every ``watch`` seconds if given.
+
+    Failed refreshes of the watch mode are reported and retried with
+    the next one.
+
+    """
+    interactive = stream.isatty() and not as_json
+    previous = None
+    state = load_state() if interactive else None
+    if state is not None:
+        # Paint the last known hours until fresh ones arrive
+        previous = render_state(state).split('\n')
+        stream.write('\n'.join(previous) + '\n')
+        stream.flush()
+    odesk_uid = None
+    while True:
+        try:
+            if odesk_uid is None:
+                odesk_uid = get_auth_user_uid(client)
+            data = get_timereport(client, odesk_uid=odesk_uid)
+        except Exception, e:
+            if not watch:
+                raise
+            error = 'Refresh failed: {0}'.format(e)
+            if as_json:
+                stream.write(json.dumps({'error': str(e)}) + '\n')
+            elif interactive and previous is not None:
+                # Shown below the hours until the next refresh
+                lines = previous + [error]
+                stream.write(render_update(previous, lines))
+                previous = lines
+            else:
+                stream.write(error + '\n')
+            stream.flush()
+            time.sleep(watch)
+            continue
+        summary = get_timereport_summary(data, odesk_uid)
+        save_state(summary)
+        if as_json:
+            teams = summary['teams']
+            if previous is None or teams != previous:
+                stream.write(json.dumps(summary, sort_keys=True) + '\n')
+            previous = teams
+        else:
+            lines = get_timereport_layout(data, odesk_uid).split('\n')
+            if interactive and previous is not None:
+                stream.write(render_update(previous, lines))
+            elif lines != previous:
+                stream.write('\n'.join(lines) + '\n')
+            previous = lines
+        stream.flush()
+        if not watch:
+            return
+        time.sleep(watch)
+
+
 #=========================
 # odesk_meter GTK app code
 #=========================
 class Base(object):
     def __init__(self):
-        # Initialize oDesk API
-        self.client = get_client(authorize=(not os.path.exists(KEYS_FILE)))
-        self.odesk_uid = get_auth_user_uid(self.client)
-        self.timereport_data = get_timereport(self.client)
+        import_gtk()
+        # oDesk API is initialized in background by ``refresh()``
+        self.client = None
+        self.odesk_uid = None
+        self.timereport_data = None
 
         # Main window
         self.window = gtk.Window(gtk.WINDOW_TOPLEVEL)
@@ -167,8 +336,12 @@ class Base(object):
         self.main_text.set_property('editable', False)
         self.main_text.set_property('cursor-visible', False)
         self.main_text_buffer = self.main_text.get_buffer()
-        self.main_text_buffer.set_text(
-            get_timereport_layout(self.timereport_data, self.odesk_uid))
+        state = load_state()
+        if state is not None:
+            self.text = render_state(state)
+        else:
+            self.text = 'Loading...'
+        self.main_text_buffer.set_text(self.text)
 
         # Put buttons
         layout = gtk.Layout()
@@ -178,11 +351,40 @@ class Base(object):
         self.window.add(layout)
         self.window.show_all()
         self.window.connect('destroy', self.destroy)
+        self.refresh(None)
 
     def refresh(self, widget):
-        self.timereport_data = get_timereport(self.client)
-        self.main_text_buffer.set_text(
-            get_timereport_layout(self.timereport_data, self.odesk_uid))
+        """Fetch timereport in background, the window keeps
+        showing the current hours meanwhile.
+
+        """
+        self.button_refresh.set_sensitive(False)
+        thread = threading.Thread(target=self.fetch)
+        thread.daemon = True
+        thread.start()
+
+    def fetch(self):
+        try:
+            if self.client is None:
+                self.client = get_client()
+                self.odesk_uid = get_auth_user_uid(self.client)
+            data = get_timereport(self.client, odesk_uid=self.odesk_uid)
+            save_state(get_timereport_summary(data, self.odesk_uid))
+        except Exception, e:
+            gobject.idle_add(self.show, None, str(e))
+        else:
+            gobject.idle_add(self.show, data, None)
+
+    def show(self, data, error):
+        if data is not None:
+            self.timereport_data = data
+            self.text = get_timereport_layout(data, self.odesk_uid)
+            self.main_text_buffer.set_text(self.text)
+        else:
+            self.main_text_buffer.set_text(
+                '{0}\nRefresh failed: {1}'.format(self.text, error))
+        self.button_refresh.set_sensitive(True)
+        return False   # Don't repeat the idle callback
 
     def destroy(self, widget):
         """Close main window."""
@@ -192,13 +394,30 @@ class Base(object):
         gtk.main()
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--headless', action='store_true',
+                        help='print the summary instead of opening a window')
+    parser.add_argument('--json', action='store_true',
+                        help='print the summary as JSON, implies --headless')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='refresh every SECONDS, implies --headless')
+    options = parser.parse_args(argv)
+
+    if not os.path.exists(KEYS_FILE):
+        print 'Preparing to get access token...\n'
+        get_client(authorize=True)
+        print '\nNow as access token is obtained, you can run odesk meter ``python odesk_meter.py``'
+        exit(1)
+    if options.headless or options.json or options.watch is not None:
+        run_headless(get_client(), as_json=options.json,
+                     watch=options.watch)
+    else:
+        Base().main()
+
+
 if __name__ == '__main__':
     try:
-        if not os.path.exists(KEYS_FILE):
-            print 'Preparing to get access token...\n'
-            get_client(authorize=True)
-            print '\nNow as access token is obtained, you can run odesk meter ``python odesk_meter.py``'
-            exit(1)
-        Base().main()
+        main()
     except KeyboardInterrupt:
         exit(1)